@@ -1,6 +1,7 @@
 import { NextRequest, NextResponse } from "next/server";
 import { splitter } from "@/lib/rag/chunking";
 import { vectorStore } from "@/lib/rag/retrieval";
+import { ingestFromMlService, mlIngestEnabled } from "@/lib/rag/ml-ingest";
 import pdf from "pdf-parse";
 import * as XLSX from "xlsx";
 
@@ -23,6 +24,23 @@ export async function POST(req: NextRequest) {
       );
     }
 
+    // Con el servicio ML configurado, PDF y DOCX se extraen allí en streaming:
+    // los fragmentos se embeben mientras el resto del documento se procesa
+    const mlExtension = file?.name.split('.').pop()?.toLowerCase();
+    if (file && mlIngestEnabled() && (mlExtension === "pdf" || mlExtension === "docx")) {
+      const body = new FormData();
+      body.append("file", file, file.name);
+      const count = await ingestFromMlService(body, {
+        source: file.name,
+        uploadedAt: new Date().toISOString(),
+      });
+      return NextResponse.json({
+        success: true,
+        message: `Se ingestaron ${count} fragmentos desde ${file.name}`,
+        source: file.name,
+      });
+    }
+
     let content = "";
     let source = "entrada-texto";
 
@@ -0,0 +1,116 @@
+// @vitest-environment node
+import { describe, it, expect, vi, afterEach } from 'vitest'
+
+vi.mock('./retrieval', () => ({
+  vectorStore: { addDocuments: vi.fn(), deleteByMetadata: vi.fn() },
+}))
+
+import { vectorStore } from './retrieval'
+import { ingestFromMlService, readNdjson, streamMlChunks } from './ml-ingest'
+
+// Cuerpo que llega en los trozos dados, cortando líneas por la mitad
+function body(...pieces: string[]): ReadableStream<Uint8Array> {
+  const encoder = new TextEncoder()
+  return new ReadableStream({
+    start(controller) {
+      for (const piece of pieces) controller.enqueue(encoder.encode(piece))
+      controller.close()
+    },
+  })
+}
+
+async function collect<T>(events: AsyncIterable<T>): Promise<T[]> {
+  const items: T[] = []
+  for await (const event of events) items.push(event)
+  return items
+}
+
+function respondWith(...pieces: string[]) {
+  vi.stubGlobal('fetch', vi.fn(async () => new Response(body(...pieces))))
+}
+
+describe('readNdjson', () => {
+  it('parses lines split across reads', async () => {
+    const events = await collect(
+      readNdjson(body('{"type":"chunk","in', 'dex":0}\n\n{"type":', '"done"}\n'))
+    )
+    expect(events).toEqual([{ type: 'chunk', index: 0 }, { type: 'done' }])
+  })
+
+  it('keeps a last line without newline', async () => {
+    const events = await collect(readNdjson(body('{"a":1}\n{"b":"ñ"}')))
+    expect(events).toEqual([{ a: 1 }, { b: 'ñ' }])
+  })
+})
+
+describe('streamMlChunks', () => {
+  afterEach(() => {
+    vi.unstubAllGlobals()
+  })
+
+  it('yields chunks until the done line', async () => {
+    respondWith(
+      '{"type":"chunk","index":0,"text":"uno"}\n',
+      '{"type":"chunk","index":1,"text":"dos"}\n{"type":"done","chunks":2}\n'
+    )
+    const chunks = await collect(streamMlChunks(new FormData()))
+    expect(chunks.map((c) => c.text)).toEqual(['uno', 'dos'])
+  })
+
+  it('throws on an error line', async () => {
+    respondWith('{"type":"chunk","index":0,"text":"uno"}\n{"type":"error","error":"PDF roto"}\n')
+    await expect(collect(streamMlChunks(new FormData()))).rejects.toThrow('PDF roto')
+  })
+
+  it('throws when the stream ends without done', async () => {
+    respondWith('{"type":"chunk","index":0,"text":"uno"}\n')
+    await expect(collect(streamMlChunks(new FormData()))).rejects.toThrow(/antes de terminar/)
+  })
+
+  it('throws on an HTTP error', async () => {
+    vi.stubGlobal('fetch', vi.fn(async () => new Response('fallo', { status: 502 })))
+    await expect(collect(streamMlChunks(new FormData()))).rejects.toThrow('502')
+  })
+})
+
+describe('ingestFromMlService', () => {
+  const metadata = { source: 'doc.pdf', uploadedAt: '2026-01-01T00:00:00.000Z' }
+
+  afterEach(() => {
+    vi.unstubAllGlobals()
+    vi.mocked(vectorStore.addDocuments).mockReset()
+    vi.mocked(vectorStore.deleteByMetadata).mockReset()
+  })
+
+  it('stores every chunk in batches', async () => {
+    respondWith(
+      '{"type":"chunk","index":0,"text":"uno"}\n{"type":"chunk","index":1,"text":"dos"}\n',
+      '{"type":"chunk","index":2,"text":"tres"}\n{"type":"done","chunks":3}\n'
+    )
+    expect(await ingestFromMlService(new FormData(), metadata, 2)).toBe(3)
+    expect(vectorStore.addDocuments).toHaveBeenCalledTimes(2)
+    expect(vectorStore.deleteByMetadata).not.toHaveBeenCalled()
+  })
+
+  it('deletes stored batches when the stream fails', async () => {
+    respondWith(
+      '{"type":"chunk","index":0,"text":"uno"}\n{"type":"chunk","index":1,"text":"dos"}\n',
+      '{"type":"error","error":"PDF roto"}\n'
+    )
+    await expect(ingestFromMlService(new FormData(), metadata, 2)).rejects.toThrow('PDF roto')
+    expect(vectorStore.addDocuments).toHaveBeenCalledTimes(1)
+    expect(vectorStore.deleteByMetadata).toHaveBeenCalledWith(metadata)
+  })
+
+  it('deletes stored batches when a batch fails', async () => {
+    vi.mocked(vectorStore.addDocuments)
+      .mockResolvedValueOnce(undefined)
+      .mockRejectedValueOnce(new Error('sin conexión'))
+    respondWith(
+      '{"type":"chunk","index":0,"text":"uno"}\n{"type":"chunk","index":1,"text":"dos"}\n',
+      '{"type":"chunk","index":2,"text":"tres"}\n{"type":"done","chunks":3}\n'
+    )
+    await expect(ingestFromMlService(new FormData(), metadata, 1)).rejects.toThrow('sin conexión')
+    expect(vectorStore.deleteByMetadata).toHaveBeenCalledWith(metadata)
+  })
+})
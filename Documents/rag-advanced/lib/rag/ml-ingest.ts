@@ -0,0 +1,117 @@
+import { Document } from "langchain/document";
+import { vectorStore } from "./retrieval";
+
+interface ChunkEvent {
+  type: "chunk";
+  index: number;
+  text: string;
+}
+
+/**
+ * Indica si hay un servicio ML (FastAPI) configurado para extraer documentos.
+ */
+export function mlIngestEnabled(): boolean {
+  return Boolean(process.env.ML_API_URL);
+}
+
+/**
+ * Lee un cuerpo NDJSON y entrega cada línea ya parseada a medida que llega.
+ * Las líneas vacías se ignoran y la última puede venir sin salto de línea.
+ */
+export async function* readNdjson(
+  stream: ReadableStream<Uint8Array>
+): AsyncGenerator<Record<string, any>> {
+  const reader = stream.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    let newline;
+    while ((newline = buffer.indexOf("\n")) >= 0) {
+      const line = buffer.slice(0, newline).trim();
+      buffer = buffer.slice(newline + 1);
+      if (line) yield JSON.parse(line);
+    }
+  }
+  const rest = buffer.trim();
+  if (rest) yield JSON.parse(rest);
+}
+
+/**
+ * Envía el archivo (o URL) a `POST /ingest/stream` del servicio ML y entrega
+ * cada fragmento apenas llega en la respuesta NDJSON, sin esperar a que
+ * termine la extracción del documento. Si la respuesta se corta antes de la
+ * línea `{"type": "done"}` se lanza un error: el documento quedó incompleto.
+ *
+ * @param body - FormData con `file` o `url`.
+ */
+export async function* streamMlChunks(body: FormData): AsyncGenerator<ChunkEvent> {
+  const res = await fetch(`${process.env.ML_API_URL}/ingest/stream`, {
+    method: "POST",
+    body,
+  });
+  if (!res.ok || !res.body) {
+    throw new Error(`El servicio ML respondió ${res.status}`);
+  }
+
+  for await (const event of readNdjson(res.body)) {
+    if (event.type === "error") throw new Error(event.error);
+    if (event.type === "chunk") yield event as ChunkEvent;
+    if (event.type === "done") return;
+  }
+  throw new Error("El servicio ML cortó la respuesta antes de terminar");
+}
+
+/**
+ * Ingesta en streaming: los fragmentos se agrupan en lotes y cada lote se
+ * embebe y guarda mientras se sigue leyendo la respuesta (un lote en curso
+ * a la vez). Si la respuesta o un lote fallan se borran los lotes ya
+ * guardados (los documentos con `metadata`, que debe identificar esta
+ * ingesta) y se relanza el error: no quedan documentos a medias.
+ *
+ * @returns Número de fragmentos guardados.
+ */
+export async function ingestFromMlService(
+  body: FormData,
+  metadata: Record<string, unknown>,
+  batchSize: number = 20
+): Promise<number> {
+  let batch: Document[] = [];
+  let pending: Promise<void> = Promise.resolve();
+  let failure: unknown = null;
+  let count = 0;
+
+  // El error del lote en curso se guarda y se relanza al esperarlo
+  const settle = async () => {
+    await pending;
+    if (failure) throw failure;
+  };
+
+  try {
+    for await (const chunk of streamMlChunks(body)) {
+      batch.push(
+        new Document({ pageContent: chunk.text, metadata: { ...metadata, chunk: chunk.index } })
+      );
+      if (batch.length >= batchSize) {
+        await settle();
+        pending = vectorStore.addDocuments(batch).catch((error) => {
+          failure = error;
+        });
+        count += batch.length;
+        batch = [];
+      }
+    }
+    await settle();
+    if (batch.length > 0) {
+      await vectorStore.addDocuments(batch);
+      count += batch.length;
+    }
+  } catch (error) {
+    // Se espera el lote en curso antes de borrar lo que ya se guardó
+    await pending;
+    if (count > 0) await vectorStore.deleteByMetadata(metadata);
+    throw error;
+  }
+  return count;
+}
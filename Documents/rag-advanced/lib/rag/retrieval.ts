@@ -110,6 +110,21 @@ export class VectorStore {
       client.release();
     }
   }
+
+  /**
+   * Borra los documentos cuyos metadatos contienen `metadata` (operador @>
+   * de JSONB), p. ej. los de una ingesta que falló a mitad de camino.
+   *
+   * @param metadata - Pares clave/valor que deben tener los documentos.
+   * @returns Número de documentos borrados.
+   */
+  async deleteByMetadata(metadata: Record<string, unknown>): Promise<number> {
+    const { rowCount } = await pool.query(
+      `DELETE FROM ${this.tableName} WHERE metadata @> $1`,
+      [metadata]
+    );
+    return rowCount ?? 0;
+  }
 }
 
 export const vectorStore = new VectorStore();
@@ -1,9 +1,32 @@
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 import mlflow
 from mlflow.tracking import MlflowClient
 
+from routers import experiments, ingest
+from services import document_processor
+from services.mlflow_logger import feedback_logger
+
 app = FastAPI(title="API ML RAG Avanzado")
+app.include_router(ingest.router, prefix="/ingest")
+app.include_router(experiments.router, prefix="/experiments")
+
+
+@app.on_event("startup")
+def start_feedback_logger():
+    feedback_logger.start()
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    # Cierra las conexiones reutilizadas al descargar URLs
+    await document_processor.close()
+
+
+@app.on_event("shutdown")
+def flush_feedback():
+    # Vuelca en MLflow el feedback que quede en cola
+    feedback_logger.close()
 
 # Configurar MLflow
 MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5000")
@@ -26,15 +49,21 @@ def list_experiments():
 @app.post("/log-feedback")
 def log_feedback(query: str, response: str, rating: int):
     """
-    Registrar retroalimentación del usuario en MLflow para evaluación
+    Registrar retroalimentación del usuario en MLflow para evaluación.
+    Se encola y responde de inmediato; los ratings se agrupan en runs
+    periódicas (ver `BufferedMlflowLogger`).
     """
-    with mlflow.start_run(run_name="user_feedback"):
-        mlflow.log_param("query", query)
-        mlflow.log_param("response", response)
-        mlflow.log_metric("rating", rating)
-    
+    if not feedback_logger.log_feedback(query, response, rating):
+        raise HTTPException(status_code=503, detail="Cola de feedback llena")
     return {"status": "registrado"}
 
+@app.get("/log-feedback/stats")
+def feedback_stats():
+    """
+    Profundidad de la cola de feedback y latencia de los volcados a MLflow
+    """
+    return feedback_logger.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from services import document_processor
 
@@ -23,3 +24,27 @@ async def ingest_document(
         # Log error
         print(f"Error processing document: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/stream")
+async def ingest_document_stream(
+    file: Optional[UploadFile] = File(None),
+    url: Optional[str] = Form(None)
+):
+    """
+    Same input as POST /, but the chunks are returned as NDJSON while the
+    document is still being extracted: {"type": "chunk", "index", "text", ...}
+    per chunk and a final {"type": "done"} (or {"type": "error"}) line.
+    """
+    if not file and not url:
+        raise HTTPException(status_code=400, detail="No file or URL provided")
+
+    try:
+        if file:
+            spool = await document_processor.detach_upload(file)
+            lines = document_processor.stream_file(spool, file.filename)
+        else:
+            lines = document_processor.stream_url(url)
+    except document_processor.TooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    return StreamingResponse(lines, media_type="application/x-ndjson")
@@ -1,49 +1,261 @@
-import pypdf
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, Optional
+
 import docx
-import requests
+import httpx
+import pypdf
 from bs4 import BeautifulSoup
 from fastapi import UploadFile
-from io import BytesIO
+
+MAX_BYTES = int(os.getenv("INGEST_MAX_MB", "50")) * 1024 * 1024
+CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "200"))
+FETCH_TIMEOUT = float(os.getenv("INGEST_FETCH_TIMEOUT", "10"))
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+# PDF/DOCX/HTML parsing is CPU bound: it runs here, not on the event loop
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("INGEST_WORKERS", "4")))
+_client: Optional[httpx.AsyncClient] = None
+_DONE = object()
+
+
+class TooLarge(ValueError):
+    pass
+
+
+def get_client() -> httpx.AsyncClient:
+    # One client per process so connections to the same hosts are reused
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=FETCH_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _client
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _splitter():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=SEPARATORS
+    )
+
+
+def upload_size(file: UploadFile) -> int:
+    # Starlette spools uploads to disk; measure without reading into memory
+    f = file.file
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    return size
+
+
+def pdf_parts(f) -> Iterator[str]:
+    for page in pypdf.PdfReader(f).pages:
+        yield (page.extract_text() or "").replace("\x00", "")
+
+
+def docx_parts(f) -> Iterator[str]:
+    for para in docx.Document(f).paragraphs:
+        yield para.text.replace("\x00", "")
+
+
+def html_parts(content: bytes) -> Iterator[str]:
+    soup = BeautifulSoup(content, "html.parser")
+
+    # Remove scripts and styles
+    for script in soup(["script", "style", "nav", "footer", "header"]):
+        script.decompose()
+
+    for line in soup.get_text().splitlines():
+        for phrase in line.split("  "):
+            phrase = phrase.strip()
+            if phrase:
+                yield phrase
+
+
+def file_parts(f, filename: Optional[str]) -> Iterator[str]:
+    name = (filename or "").lower()
+    if name.endswith(".pdf"):
+        return pdf_parts(f)
+    if name.endswith(".docx"):
+        return docx_parts(f)
+    # Other types produce no text, as before
+    return iter(())
+
+
+async def detach_upload(file: UploadFile):
+    """
+    FastAPI closes uploads when the handler returns, before a streaming body
+    runs: copy it to a file owned by the stream (spooled to disk past 1 MB).
+    """
+    if upload_size(file) > MAX_BYTES:
+        raise TooLarge(f"File exceeds {MAX_BYTES} bytes")
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_executor, shutil.copyfileobj, file.file, spool)
+    spool.seek(0)
+    return spool
+
+
+async def iter_parts(parts: Iterator[str]) -> AsyncIterator[str]:
+    """
+    Runs a blocking parts generator in the worker pool and yields each page or
+    paragraph as soon as it is extracted.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            for part in parts:
+                if stopped.is_set():
+                    return
+                asyncio.run_coroutine_threadsafe(queue.put(part), loop).result()
+        except BaseException as e:
+            asyncio.run_coroutine_threadsafe(queue.put(e), loop).result()
+        else:
+            asyncio.run_coroutine_threadsafe(queue.put(_DONE), loop).result()
+
+    worker = loop.run_in_executor(_executor, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # If the consumer stops early, drain so the worker is not left blocked
+        stopped.set()
+        while not worker.done():
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                await asyncio.sleep(0.01)
+
+
+async def iter_chunks(parts: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Splits text while it is still being extracted: once the buffer holds a few
+    chunks, all but the last are emitted and the last one seeds the next
+    window, so memory stays bounded by the buffer and not the document.
+    """
+    splitter = _splitter()
+    buffer = []
+    size = 0
+    async for part in parts:
+        buffer.append(part)
+        size += len(part) + 1
+        if size >= 4 * CHUNK_SIZE:
+            chunks = splitter.split_text("\n".join(buffer))
+            for chunk in chunks[:-1]:
+                yield chunk
+            buffer = chunks[-1:]
+            size = sum(len(c) + 1 for c in buffer)
+    if buffer:
+        for chunk in splitter.split_text("\n".join(buffer)):
+            yield chunk
+
+
+async def fetch_url(url: str) -> bytes:
+    """
+    Async GET with a size cap: Content-Length is checked first and the body
+    is read in blocks until MAX_BYTES.
+    """
+    async with get_client().stream("GET", url) as response:
+        response.raise_for_status()
+        length = response.headers.get("content-length")
+        if length and int(length) > MAX_BYTES:
+            raise TooLarge(f"Response exceeds {MAX_BYTES} bytes")
+        blocks = []
+        total = 0
+        async for block in response.aiter_bytes():
+            total += len(block)
+            if total > MAX_BYTES:
+                raise TooLarge(f"Response exceeds {MAX_BYTES} bytes")
+            blocks.append(block)
+    return b"".join(blocks)
+
+
+async def ndjson(chunks: AsyncIterator[str], meta: dict) -> AsyncIterator[bytes]:
+    """
+    One JSON line per chunk, then a "done" line (or an "error" line).
+    """
+    count = 0
+    chars = 0
+    try:
+        async for chunk in chunks:
+            line = {"type": "chunk", "index": count, "text": chunk, **meta}
+            yield (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+            count += 1
+            chars += len(chunk)
+    except Exception as e:
+        error = {"type": "error", "error": str(e), **meta}
+        yield (json.dumps(error, ensure_ascii=False) + "\n").encode("utf-8")
+        return
+    done = {"type": "done", "chunks": count, "chars": chars, **meta}
+    yield (json.dumps(done, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def stream_file(f, filename: Optional[str]) -> AsyncIterator[bytes]:
+    try:
+        chunks = iter_chunks(iter_parts(file_parts(f, filename)))
+        async for line in ndjson(chunks, {"filename": filename}):
+            yield line
+    finally:
+        f.close()
+
+
+async def stream_url(url: str) -> AsyncIterator[bytes]:
+    async def chunks():
+        content = await fetch_url(url)
+        async for chunk in iter_chunks(iter_parts(html_parts(content))):
+            yield chunk
+
+    async for line in ndjson(chunks(), {"url": url}):
+        yield line
+
+
+async def _join(parts: Iterator[str]) -> str:
+    # Pages/paragraphs are collected and joined once
+    collected = [part async for part in iter_parts(parts)]
+    return "\n".join(collected)
+
 
 async def process_file(file: UploadFile):
-    content = await file.read()
     filename = file.filename
-    
-    text = ""
     try:
-        if filename.lower().endswith(".pdf"):
-            pdf_reader = pypdf.PdfReader(BytesIO(content))
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-                
-        elif filename.lower().endswith(".docx"):
-            doc = docx.Document(BytesIO(content))
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-        
-        # Normalize text
-        text = text.replace('\x00', '') # Remove null bytes
-        
-        return {"text": text, "filename": filename, "size": len(content), "status": "processed"}
+        size = upload_size(file)
+        if size > MAX_BYTES:
+            raise TooLarge(f"File exceeds {MAX_BYTES} bytes")
+        text = await _join(file_parts(file.file, filename))
+        return {"text": text, "filename": filename, "size": size, "status": "processed"}
     except Exception as e:
         return {"error": str(e), "filename": filename}
 
+
 async def process_url(url: str):
     try:
-        response = requests.get(url, timeout=10)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Remove scripts and styles
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
-            
-        text = soup.get_text()
-        
-        # Clean text
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = '\n'.join(chunk for chunk in chunks if chunk)
-        
+        content = await fetch_url(url)
+        text = await _join(html_parts(content))
         return {"text": text, "url": url, "status": "processed"}
     except Exception as e:
         return {"error": str(e), "url": url}
@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from mlflow.entities import Metric, Param
+from mlflow.tracking import MlflowClient
+
+# MLflow limits per log_batch call
+MAX_METRICS_PER_BATCH = 1000
+MAX_PARAMS_PER_BATCH = 100
+
+
+class BufferedMlflowLogger:
+    """
+    Logs feedback to MLflow without blocking requests: each rating is queued
+    in memory and a background thread flushes the queue, grouping many
+    ratings into a single "user_feedback" run with `log_batch`:
+    - `rating` as a stepped metric (one step per feedback, with its timestamp)
+    - `rating_mean` and `feedback_count` for the batch
+    - queries and responses in the `feedback.jsonl` artifact
+    A flush happens once `flush_size` ratings are queued, every
+    `flush_interval` seconds and on `close`. When the queue is full
+    (`max_queue`) feedback is dropped and counted in `dropped`.
+
+    A file store is enough for testing: `tracking_uri="file:///tmp/mlruns"`
+    plus `flush()` to flush synchronously without starting the thread.
+    """
+
+    def __init__(
+        self,
+        tracking_uri: Optional[str] = None,
+        experiment: Optional[str] = None,
+        flush_size: int = 200,
+        flush_interval: float = 30.0,
+        max_queue: int = 10000,
+    ):
+        self.tracking_uri = tracking_uri
+        self.experiment = experiment
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._client: Optional[MlflowClient] = None
+        self._experiment_ids: Dict[str, str] = {}
+        self._pending: deque = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.logged = 0
+        self.dropped = 0
+        self.runs = 0
+        self.errors = 0
+        self._flush_seconds: deque = deque(maxlen=100)
+
+    @classmethod
+    def from_env(cls) -> "BufferedMlflowLogger":
+        return cls(
+            tracking_uri=os.getenv("MLFLOW_TRACKING_URI", "http://localhost:5000"),
+            experiment=os.getenv("FEEDBACK_EXPERIMENT") or None,
+            flush_size=int(os.getenv("FEEDBACK_FLUSH_SIZE", "200")),
+            flush_interval=float(os.getenv("FEEDBACK_FLUSH_SECONDS", "30")),
+            max_queue=int(os.getenv("FEEDBACK_MAX_QUEUE", "10000")),
+        )
+
+    @property
+    def client(self) -> MlflowClient:
+        # One client: the global tracking URI is not changed on every request
+        if self._client is None:
+            self._client = MlflowClient(tracking_uri=self.tracking_uri)
+        return self._client
+
+    def experiment_id(self, name: Optional[str]) -> str:
+        """
+        Experiment id (created if missing), resolved once per name. Without
+        a name the default experiment ("0") is used.
+        """
+        if not name:
+            return "0"
+        if name not in self._experiment_ids:
+            experiment = self.client.get_experiment_by_name(name)
+            if experiment is not None:
+                self._experiment_ids[name] = experiment.experiment_id
+            else:
+                self._experiment_ids[name] = self.client.create_experiment(name)
+        return self._experiment_ids[name]
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._closed = False
+            self._thread = threading.Thread(
+                target=self._run, name="mlflow-feedback", daemon=True
+            )
+            self._thread.start()
+
+    def close(self) -> None:
+        """
+        Stops the thread and flushes whatever is pending.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def log_feedback(self, query: str, response: str, rating: int) -> bool:
+        """
+        Queues a rating and returns immediately. False if the queue was full.
+        """
+        record = {
+            "query": query,
+            "response": response,
+            "rating": rating,
+            "timestamp": int(time.time() * 1000),
+        }
+        with self._cond:
+            if len(self._pending) >= self.max_queue:
+                self.dropped += 1
+                return False
+            self._pending.append(record)
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify_all()
+        return True
+
+    def _run(self) -> None:
+        retry_at = 0.0
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                # After a failure, wait a full interval before retrying even
+                # if the queue is full
+                while not self._closed and (
+                    len(self._pending) < self.flush_size
+                    or time.monotonic() < retry_at
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+                errors = self.errors
+            self.flush()
+            if self.errors != errors:
+                retry_at = time.monotonic() + self.flush_interval
+
+    def flush(self) -> int:
+        """
+        Flushes pending ratings in runs of up to `flush_size`. Returns how
+        many were logged; if MLflow fails, the batch goes back to the queue.
+        """
+        logged = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = [
+                        self._pending.popleft()
+                        for _ in range(min(self.flush_size, len(self._pending)))
+                    ]
+                if not batch:
+                    return logged
+                start = time.perf_counter()
+                try:
+                    self._log_feedback_run(batch)
+                except Exception as e:
+                    print(f"MLflow feedback flush error: {e}")
+                    with self._cond:
+                        self.errors += 1
+                        # Retried on the next flush, without exceeding the queue
+                        kept = batch[: max(0, self.max_queue - len(self._pending))]
+                        self._pending.extendleft(reversed(kept))
+                        self.dropped += len(batch) - len(kept)
+                    return logged
+                with self._cond:
+                    self._flush_seconds.append(time.perf_counter() - start)
+                    self.runs += 1
+                    self.logged += len(batch)
+                logged += len(batch)
+
+    def _log_feedback_run(self, batch: List[Dict[str, Any]]) -> None:
+        ratings = [float(r["rating"]) for r in batch]
+        now = int(time.time() * 1000)
+        run = self.client.create_run(
+            self.experiment_id(self.experiment), run_name="user_feedback"
+        )
+        run_id = run.info.run_id
+        metrics = [
+            Metric("rating", value, r["timestamp"], step)
+            for step, (value, r) in enumerate(zip(ratings, batch))
+        ]
+        metrics += [
+            Metric("rating_mean", sum(ratings) / len(ratings), now, 0),
+            Metric("feedback_count", float(len(batch)), now, 0),
+        ]
+        try:
+            for i in range(0, len(metrics), MAX_METRICS_PER_BATCH):
+                self.client.log_batch(
+                    run_id, metrics=metrics[i : i + MAX_METRICS_PER_BATCH]
+                )
+            lines = "\n".join(json.dumps(r, ensure_ascii=False) for r in batch)
+            self.client.log_text(run_id, lines, "feedback.jsonl")
+        except Exception:
+            # The batch is retried in another run; this one is marked failed
+            self.client.set_terminated(run_id, status="FAILED")
+            raise
+        self.client.set_terminated(run_id)
+
+    def log_run(
+        self,
+        experiment: str,
+        run_name: str,
+        params: Optional[Dict[str, Any]] = None,
+        metrics: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Logs a complete run synchronously: params and metrics in a single
+        `log_batch` (split into chunks at MLflow's limits).
+        """
+        now = int(time.time() * 1000)
+        run = self.client.create_run(self.experiment_id(experiment), run_name=run_name)
+        run_id = run.info.run_id
+        param_list = [Param(k, str(v)) for k, v in (params or {}).items()]
+        metric_list = [Metric(k, float(v), now, 0) for k, v in (metrics or {}).items()]
+        try:
+            for i in range(0, max(len(param_list), 1), MAX_PARAMS_PER_BATCH):
+                self.client.log_batch(
+                    run_id,
+                    metrics=metric_list if i == 0 else [],
+                    params=param_list[i : i + MAX_PARAMS_PER_BATCH],
+                )
+        except Exception:
+            # Otherwise the run would stay RUNNING forever
+            self.client.set_terminated(run_id, status="FAILED")
+            raise
+        self.client.set_terminated(run_id)
+        return run
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Queue depth, counters and latency of the most recent flushes.
+        """
+        with self._cond:
+            samples = sorted(self._flush_seconds)
+            last = self._flush_seconds[-1] if samples else 0.0
+            stats = {
+                "queue_depth": len(self._pending),
+                "logged": self.logged,
+                "dropped": self.dropped,
+                "runs": self.runs,
+                "errors": self.errors,
+                "flush_size": self.flush_size,
+                "flush_interval_s": self.flush_interval,
+            }
+        if samples:
+            stats["flush_ms"] = {
+                "last": round(last * 1000, 1),
+                "p50": round(samples[len(samples) // 2] * 1000, 1),
+                "max": round(samples[-1] * 1000, 1),
+            }
+        return stats
+
+
+feedback_logger = BufferedMlflowLogger.from_env()
@@ -0,0 +1,104 @@
+import asyncio
+import random
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+for module in ("pypdf", "docx", "bs4"):
+    pytest.importorskip(module)
+
+from services import document_processor
+
+
+async def collect(items):
+    return [item async for item in items]
+
+
+def test_iter_parts_stops_producer_when_consumer_closes():
+    produced = []
+
+    def parts():
+        for i in range(1000):
+            produced.append(i)
+            yield f"página {i}"
+
+    async def run():
+        stream = document_processor.iter_parts(parts())
+        first = [await stream.__anext__() for _ in range(3)]
+        await stream.aclose()
+        return first
+
+    first = asyncio.run(run())
+    assert first == ["página 0", "página 1", "página 2"]
+    # El productor se detuvo en vez de quedarse bloqueado con la cola llena
+    assert len(produced) < 1000
+
+
+def test_iter_parts_raises_producer_errors():
+    def parts():
+        yield "uno"
+        raise ValueError("PDF roto")
+
+    seen = []
+
+    async def run():
+        async for part in document_processor.iter_parts(parts()):
+            seen.append(part)
+
+    with pytest.raises(ValueError, match="PDF roto"):
+        asyncio.run(run())
+    assert seen == ["uno"]
+
+
+def test_iter_chunks_matches_single_pass_split():
+    pytest.importorskip("langchain.text_splitter")
+    rng = random.Random(1)
+    words = "alfa beta gamma delta épsilon zeta eta theta iota kappa".split()
+    parts = [
+        ". ".join(
+            " ".join(rng.choice(words) for _ in range(rng.randint(5, 15)))
+            for _ in range(rng.randint(2, 8))
+        )
+        for _ in range(300)
+    ]
+
+    async def source():
+        for part in parts:
+            yield part
+
+    chunks = asyncio.run(collect(document_processor.iter_chunks(source())))
+    assert len(chunks) > 10
+    assert chunks == document_processor._splitter().split_text("\n".join(parts))
+
+
+def fetch(handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def run():
+        try:
+            return await document_processor.fetch_url("https://ejemplo.com/doc")
+        finally:
+            await client.aclose()
+
+    with patch.object(document_processor, "MAX_BYTES", 100), patch.object(
+        document_processor, "get_client", return_value=client
+    ):
+        return asyncio.run(run())
+
+
+def test_fetch_url_rejects_large_content_length():
+    with pytest.raises(document_processor.TooLarge):
+        fetch(lambda request: httpx.Response(200, content=b"x" * 101))
+
+
+def test_fetch_url_caps_streamed_body():
+    async def blocks():
+        for _ in range(10):
+            yield b"x" * 30
+
+    # Sin Content-Length: el límite se aplica al leer el cuerpo
+    with pytest.raises(document_processor.TooLarge):
+        fetch(lambda request: httpx.Response(200, content=blocks()))
+
+    assert fetch(lambda request: httpx.Response(200, content=b"x" * 100)) == b"x" * 100
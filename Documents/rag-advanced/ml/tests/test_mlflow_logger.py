@@ -0,0 +1,101 @@
+import time
+
+import pytest
+from unittest.mock import patch
+
+pytest.importorskip("mlflow")
+
+from mlflow.tracking import MlflowClient
+
+from services.mlflow_logger import BufferedMlflowLogger
+
+
+def make_logger(tmp_path, **kwargs):
+    return BufferedMlflowLogger(
+        tracking_uri=f"file://{tmp_path}", experiment="feedback", **kwargs
+    )
+
+
+def runs_of(logger, experiment="feedback"):
+    return logger.client.search_runs([logger.experiment_id(experiment)])
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timeout"
+        time.sleep(0.01)
+
+
+def test_thread_flushes_when_batch_is_full(tmp_path):
+    logger = make_logger(tmp_path, flush_size=3, flush_interval=60)
+    logger.start()
+    try:
+        for rating in (1, 4, 5):
+            assert logger.log_feedback("¿pregunta?", "respuesta", rating)
+        wait_for(lambda: logger.stats()["runs"] == 1)
+        assert logger.stats()["queue_depth"] == 0
+        assert logger.stats()["logged"] == 3
+    finally:
+        logger.close()
+
+    (run,) = runs_of(logger)
+    assert run.info.status == "FINISHED"
+    assert run.data.metrics["rating_mean"] == pytest.approx(10 / 3)
+    assert run.data.metrics["feedback_count"] == 3
+
+
+def test_close_flushes_pending_feedback(tmp_path):
+    logger = make_logger(tmp_path, flush_size=100, flush_interval=60)
+    logger.start()
+    logger.log_feedback("a", "b", 2)
+    logger.log_feedback("c", "d", 4)
+    assert logger.stats()["queue_depth"] == 2
+    assert logger.stats()["runs"] == 0
+
+    logger.close()
+
+    stats = logger.stats()
+    assert stats["queue_depth"] == 0 and stats["logged"] == 2 and stats["runs"] == 1
+    (run,) = runs_of(logger)
+    assert run.data.metrics["rating_mean"] == 3
+
+
+def test_failed_batch_is_requeued(tmp_path):
+    logger = make_logger(tmp_path, flush_size=10)
+    logger.log_feedback("a", "b", 5)
+    logger.log_feedback("c", "d", 3)
+
+    with patch.object(MlflowClient, "log_batch", side_effect=RuntimeError("down")):
+        assert logger.flush() == 0
+
+    stats = logger.stats()
+    assert stats["errors"] == 1 and stats["queue_depth"] == 2 and stats["logged"] == 0
+    (failed,) = runs_of(logger)
+    assert failed.info.status == "FAILED"
+
+    # The retry logs the same batch in a new run
+    assert logger.flush() == 2
+    assert logger.stats()["queue_depth"] == 0
+    assert sorted(r.info.status for r in runs_of(logger)) == ["FAILED", "FINISHED"]
+
+
+def test_full_queue_drops_feedback(tmp_path):
+    logger = make_logger(tmp_path, max_queue=2)
+    assert logger.log_feedback("a", "b", 1)
+    assert logger.log_feedback("c", "d", 2)
+    assert not logger.log_feedback("e", "f", 3)
+    assert logger.stats()["queue_depth"] == 2 and logger.stats()["dropped"] == 1
+
+
+def test_log_run_marks_failed_run(tmp_path):
+    logger = make_logger(tmp_path)
+    run = logger.log_run("evals", "ok", params={"k": 4}, metrics={"recall": 0.5})
+    assert logger.client.get_run(run.info.run_id).info.status == "FINISHED"
+
+    with patch.object(MlflowClient, "log_batch", side_effect=RuntimeError("down")):
+        with pytest.raises(RuntimeError):
+            logger.log_run("evals", "falla", metrics={"recall": 0.1})
+
+    statuses = {r.info.run_name: r.info.status for r in runs_of(logger, "evals")}
+    assert statuses == {"ok": "FINISHED", "falla": "FAILED"}
@@ -0,0 +1,97 @@
+"""
+Estrategias de índice vectorial (flat, HNSW, IVF-PQ, fp16, sq8): memoria,
+tiempo de construcción, recall@k frente a la búsqueda exacta y latencia p95.
+
+    python -m benchmarks.bench_ann --vectors 50000 --dim 384
+    python -m benchmarks.bench_ann --vectors 200000 --types flat hnsw ivfpq
+
+Los vectores son sintéticos pero, como los embeddings de un corpus real,
+están agrupados en clusters y su variación vive en pocas dimensiones
+(`--intrinsic-dim`); se normalizan a norma 1.
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from src.assistant.vector_index import (
+    FLAT,
+    build_vector_index,
+    index_nbytes,
+    resolve_index_type,
+)
+
+
+def clustered_vectors(
+    count: int, dim: int, clusters: int, intrinsic_dim: int, seed: int = 7
+):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    basis = rng.standard_normal((intrinsic_dim, dim)).astype(np.float32)
+    basis /= np.sqrt(intrinsic_dim)
+    labels = rng.integers(0, clusters, count)
+    noise = rng.standard_normal((count, intrinsic_dim)).astype(np.float32) @ basis
+    vectors = centers[labels] + 0.6 * noise
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int):
+    latencies = []
+    hits = 0
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        _, ids = index.search(q[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(ids[0]) & set(expected))
+    latencies.sort()
+    return {
+        "recall_at_k": hits / (len(queries) * k),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--intrinsic-dim", type=int, default=48)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument(
+        "--types", nargs="+", default=["flat", "hnsw", "ivfpq", "fp16", "sq8", "auto"]
+    )
+    args = parser.parse_args()
+
+    data = clustered_vectors(
+        args.vectors + args.queries, args.dim, args.clusters, args.intrinsic_dim
+    )
+    vectors, queries = data[: args.vectors], data[args.vectors :]
+
+    exact = build_vector_index(vectors, FLAT)
+    _, truth = exact.search(queries, args.k)
+    flat_bytes = index_nbytes(exact)
+
+    report = {"vectors": args.vectors, "dim": args.dim, "k": args.k, "types": {}}
+    for kind in args.types:
+        start = time.perf_counter()
+        index = build_vector_index(vectors, kind)
+        build_s = time.perf_counter() - start
+        nbytes = index_nbytes(index)
+        report["types"][kind] = {
+            "effective": resolve_index_type(kind, args.vectors),
+            "build_s": build_s,
+            "mbytes": nbytes / 2**20,
+            "memory_vs_flat": nbytes / flat_bytes,
+            **measure(index, queries, truth, args.k),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Rendimiento concurrente de /ask: camino síncrono anterior (threadpool de
+Starlette + cliente OpenAI nuevo por llamada) frente al camino asíncrono
+(AsyncOpenAI compartido + executor de recuperación), contra un servidor stub.
+
+    python -m benchmarks.bench_async_ask --concurrency 200 --delay 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+
+from src.assistant import llm as llm_module
+from src.assistant.rag_pipeline import (
+    RAGConfig,
+    answer_question,
+    answer_question_async,
+)
+
+from .common import synthetic_text
+from .stub_openai import create_app, running_stub
+
+
+def legacy_llm(prompt: str) -> str:
+    # Réplica del código anterior: un cliente (y una conexión) por llamada
+    from openai import OpenAI
+
+    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    res = client.chat.completions.create(
+        model="stub", messages=[{"role": "user", "content": prompt}]
+    )
+    return res.choices[0].message.content or ""
+
+
+def count_errors(results) -> int:
+    return sum(1 for r in results if str(r["answer"]).startswith(("Error", "Ocurrió")))
+
+
+async def run_legacy(cfg: RAGConfig, n: int) -> Tuple[float, int]:
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[
+            run_in_threadpool(answer_question, f"pregunta {i}", cfg, legacy_llm)
+            for i in range(n)
+        ]
+    )
+    return time.perf_counter() - start, count_errors(results)
+
+
+async def run_async(cfg: RAGConfig, n: int, workers: int) -> Tuple[float, int]:
+    executor = ThreadPoolExecutor(max_workers=workers)
+    llm_module.get_async_client()
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[
+            answer_question_async(f"pregunta {i}", cfg, executor=executor)
+            for i in range(n)
+        ]
+    )
+    elapsed = time.perf_counter() - start
+    await llm_module.aclose_clients()
+    executor.shutdown()
+    return elapsed, count_errors(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, running_stub(
+        create_app(delay=args.delay)
+    ) as base_url:
+        doc = Path(tmp) / "manual.txt"
+        doc.write_text(synthetic_text(50), encoding="utf-8")
+        os.environ.update(
+            {
+                "OPENAI_API_KEY": "stub",
+                "OPENAI_BASE_URL": base_url,
+                "OPENAI_MODEL": "stub",
+            }
+        )
+        cfg = RAGConfig(text_path=str(doc), use_embeddings=False)
+        # Calentar el registro de índices para medir solo el camino de la consulta
+        answer_question("calentamiento", cfg, llm=lambda p: "")
+
+        legacy, legacy_errors = asyncio.run(run_legacy(cfg, args.concurrency))
+        new, new_errors = asyncio.run(run_async(cfg, args.concurrency, args.workers))
+
+    report = {
+        "concurrency": args.concurrency,
+        "llm_delay_s": args.delay,
+        "legacy": {
+            "seconds": legacy,
+            "req_per_s": args.concurrency / legacy,
+            "errors": legacy_errors,
+        },
+        "async": {
+            "seconds": new,
+            "req_per_s": args.concurrency / new,
+            "errors": new_errors,
+        },
+        "speedup": legacy / new,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Chunking de documentos de varios MB: el splitter de langchain
+(RecursiveCharacterTextSplitter con `create_documents`, como antes de
+`chunk_text`) frente al chunker por offsets. Mide throughput (MB/s) y pico de
+memoria asignada (tracemalloc) y comprueba que los chunks sean los mismos.
+
+    python -m benchmarks.bench_chunker --sizes-mb 1 4 16
+    python -m benchmarks.bench_chunker --repeat 5 --chunk-size 800 --chunk-overlap 100
+"""
+
+import argparse
+import json
+import tracemalloc
+from typing import Callable, Dict
+
+from src.assistant.chunker import SEPARATORS, chunk_text
+
+from .common import synthetic_text, timeit
+
+
+def langchain_splits(text: str, chunk_size: int, chunk_overlap: int):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=list(SEPARATORS)
+    )
+    return [c.page_content for c in splitter.create_documents([text])]
+
+
+def peak_mb(fn: Callable[[], object]) -> float:
+    """
+    Pico de memoria asignada por `fn` (MB), conservando su resultado.
+    """
+    tracemalloc.start()
+    try:
+        result = fn()  # noqa: F841 — el resultado cuenta en el pico
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def bench_size(mb: float, args) -> Dict[str, object]:
+    text = synthetic_text(1)
+    paragraphs = max(1, int(mb * 1e6 / max(len(text.encode("utf-8")), 1)))
+    text = synthetic_text(paragraphs)
+    size_mb = len(text.encode("utf-8")) / 1e6
+    cs, co = args.chunk_size, args.chunk_overlap
+
+    variants = {
+        "langchain": lambda: langchain_splits(text, cs, co),
+        "records": lambda: chunk_text(text, cs, co),
+        "records_texts": lambda: chunk_text(text, cs, co).texts(),
+    }
+    report: Dict[str, object] = {"size_mb": round(size_mb, 2)}
+    for name, fn in variants.items():
+        timing = timeit(fn, args.repeat)
+        report[name] = {
+            **timing,
+            "mb_per_s": size_mb / max(timing["median_s"], 1e-9),
+            "peak_mb": peak_mb(fn),
+        }
+    reference = langchain_splits(text, cs, co)
+    report["chunks"] = len(reference)
+    report["same_chunks"] = chunk_text(text, cs, co).texts() == reference
+    report["speedup"] = report["langchain"]["median_s"] / max(
+        report["records"]["median_s"], 1e-9
+    )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=400)
+    parser.add_argument("--chunk-overlap", type=int, default=80)
+    args = parser.parse_args()
+
+    results = [bench_size(mb, args) for mb in args.sizes_mb]
+    print(json.dumps({"chunk_size": args.chunk_size, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Recuperación híbrida (BM25 disperso + FAISS con RRF) frente a BM25 de
+langchain y a cada recuperador por separado: latencia por consulta y recall@k.
+
+    python -m benchmarks.bench_hybrid --chunks 20000 --queries 200
+
+Las consultas toman palabras de un chunk y alteran algunas (erratas), de modo
+que BM25 solo acierta con las palabras exactas y los embeddings (n-gramas de
+caracteres) toleran las erratas; la fusión debería superar a ambos.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+import zlib
+from typing import Callable, Dict, List
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from src.assistant.hybrid_retriever import build_hybrid_retriever
+
+LETTERS = "abcdefghijlmnoprstuv"
+
+
+class NgramEmbeddings(Embeddings):
+    """
+    Embeddings por hashing de trigramas de caracteres: sin modelo ni red,
+    pero con similitud real entre textos (tolera erratas).
+    """
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        v = np.zeros(self.size, dtype=np.float32)
+        for word in text.lower().split():
+            w = f" {word} "
+            for i in range(len(w) - 2):
+                v[zlib.crc32(w[i : i + 3].encode()) % self.size] += 1.0
+        norm = np.linalg.norm(v)
+        return (v / norm if norm else v).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def corpus(n_chunks: int, vocab_size: int, seed: int = 7) -> List[str]:
+    rnd = random.Random(seed)
+    vocab = sorted(
+        {"".join(rnd.choices(LETTERS, k=rnd.randint(5, 10))) for _ in range(vocab_size)}
+    )
+    # Distribución tipo Zipf: pocas palabras muy frecuentes, muchas raras
+    weights = [1.0 / (i + 1) for i in range(len(vocab))]
+    return [" ".join(rnd.choices(vocab, weights, k=40)) for _ in range(n_chunks)]
+
+
+def typo(word: str, rnd: random.Random) -> str:
+    i = rnd.randrange(len(word))
+    return word[:i] + rnd.choice(LETTERS) + word[i + 1 :]
+
+
+def make_queries(chunks: List[str], n: int, typo_rate: float, seed: int = 11):
+    rnd = random.Random(seed)
+    out = []
+    for target in rnd.sample(range(len(chunks)), n):
+        words = rnd.sample(chunks[target].split(), 6)
+        words = [typo(w, rnd) if rnd.random() < typo_rate else w for w in words]
+        out.append((" ".join(words), target))
+    return out
+
+
+def per_query(fn: Callable[[str], List[int]], queries, k: int) -> Dict[str, float]:
+    latencies, hits = [], 0
+    for query, target in queries:
+        start = time.perf_counter()
+        ids = fn(query)
+        latencies.append(time.perf_counter() - start)
+        hits += target in ids[:k]
+    latencies.sort()
+    return {
+        "recall_at_k": hits / len(queries),
+        "median_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--typo-rate", type=float, default=0.5)
+    args = parser.parse_args()
+
+    chunks = corpus(args.chunks, args.vocab)
+    queries = make_queries(chunks, args.queries, args.typo_rate)
+    position = {c: i for i, c in enumerate(chunks)}
+    embedder = NgramEmbeddings()
+
+    start = time.perf_counter()
+    vs = FAISS.from_embeddings(
+        list(zip(chunks, embedder.embed_documents(chunks))), embedder
+    )
+    hybrid = build_hybrid_retriever(chunks, vs, k=args.k)
+    build_s = time.perf_counter() - start
+
+    report = {
+        "chunks": args.chunks,
+        "queries": args.queries,
+        "k": args.k,
+        "typo_rate": args.typo_rate,
+        "hybrid_build_s": build_s,
+        "sparse_bm25": per_query(lambda q: hybrid.bm25.top(q, args.k), queries, args.k),
+        "faiss": per_query(lambda q: hybrid.dense_top(q, args.k), queries, args.k),
+        "hybrid_rrf": per_query(hybrid.search_ids, queries, args.k),
+    }
+
+    batch = [q for q, _ in queries]
+    start = time.perf_counter()
+    hybrid.bm25.scores(batch)
+    report["sparse_bm25_batch_ms_per_query"] = (
+        (time.perf_counter() - start) * 1000 / len(batch)
+    )
+
+    try:
+        from langchain_community.retrievers import BM25Retriever
+
+        retr = BM25Retriever.from_texts(chunks)
+        retr.k = args.k
+        report["langchain_bm25"] = per_query(
+            lambda q: [position[d.page_content] for d in retr.invoke(q)],
+            queries,
+            args.k,
+        )
+    except ImportError:
+        report["langchain_bm25"] = "rank_bm25 no instalado"
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
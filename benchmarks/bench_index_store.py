@@ -0,0 +1,73 @@
+"""
+Arranque en frío: cargar un índice FAISS guardado (mmap) frente a reconstruirlo.
+
+    python -m benchmarks.bench_index_store --paragraphs 2000
+    python -m benchmarks.bench_index_store --fake-embeddings
+"""
+
+import argparse
+import json
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from src.assistant import rag_pipeline
+from src.assistant.index_registry import IndexRegistry
+from src.assistant.index_store import IndexStore
+from src.assistant.rag_pipeline import RAGConfig, build_index, index_key, load_index
+
+from .common import fake_embedder, synthetic_text, timeit
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--paragraphs", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fake-embeddings", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        doc = Path(tmp) / "manual.txt"
+        doc.write_text(synthetic_text(args.paragraphs), encoding="utf-8")
+        cfg = RAGConfig(text_path=str(doc))
+        patches = [patch.object(rag_pipeline, "store", IndexStore(f"{tmp}/idx"))]
+        if args.fake_embeddings:
+            embedder = fake_embedder()
+            patches += [
+                patch("src.assistant.rag_pipeline.get_embedder", return_value=embedder),
+                patch(
+                    "src.assistant.langchain_agent.get_embedder", return_value=embedder
+                ),
+            ]
+        for p in patches:
+            p.start()
+        try:
+            text = doc.read_text(encoding="utf-8")
+            key = index_key(cfg, rag_pipeline.file_sha256(str(doc)))
+            rebuild = timeit(lambda: build_index(text, cfg, key), args.repeat)
+
+            # Primera carga guarda el índice; las siguientes lo leen por mmap
+            with patch.object(rag_pipeline, "registry", IndexRegistry(1 << 30)):
+                chunks = len(load_index(cfg).chunks)
+
+            def cold_load():
+                with patch.object(rag_pipeline, "registry", IndexRegistry(1 << 30)):
+                    load_index(cfg)
+
+            from_disk = timeit(cold_load, args.repeat)
+        finally:
+            for p in patches:
+                p.stop()
+
+    report = {
+        "paragraphs": args.paragraphs,
+        "chunks": chunks,
+        "rebuild": rebuild,
+        "load_from_disk": from_disk,
+        "speedup": rebuild["median_s"] / max(from_disk["median_s"], 1e-9),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
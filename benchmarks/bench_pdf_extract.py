@@ -0,0 +1,58 @@
+"""
+Extracción de texto de un PDF sintético grande con 1, 2, 4, ... procesos.
+
+    python -m benchmarks.bench_pdf_extract --pages 400
+    python -m benchmarks.bench_pdf_extract --pages 800 --workers 1 2 4 8
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from src.assistant.loader import read_pdf_pages
+
+from .common import timeit, write_synthetic_pdf
+
+
+def default_workers():
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+", default=None)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = Path(tmp) / "manual.pdf"
+        write_synthetic_pdf(str(pdf), args.pages)
+        for workers in args.workers or default_workers():
+            results[workers] = timeit(
+                lambda: read_pdf_pages(str(pdf), workers=workers), args.repeat
+            )
+
+    base = results[min(results)]["median_s"]
+    report = {
+        "pages": args.pages,
+        "cpu_count": os.cpu_count(),
+        "workers": {
+            str(w): {**r, "speedup": base / max(r["median_s"], 1e-9)}
+            for w, r in results.items()
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
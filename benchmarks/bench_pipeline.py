@@ -0,0 +1,193 @@
+"""
+Suite de rendimiento del pipeline RAG por etapas, sobre documentos TXT y PDF
+sintéticos de varios tamaños: carga (`load_procedures_text`), chunking
+(`build_splits`), construcción del recuperador (BM25 y embeddings),
+`retrieve` y `answer_question` de punta a punta con un LLM falso.
+
+    python -m benchmarks.bench_pipeline --output baseline.json
+    python -m benchmarks.bench_pipeline --compare baseline.json --threshold 0.2
+
+Con `--compare` se marcan como regresión las etapas cuya mediana supera la
+de la línea base en más de `--threshold` (y en más de `--min-delta-ms`, para
+ignorar ruido en etapas muy rápidas); el proceso termina con código 1 si hay
+alguna. Por defecto se usan embeddings deterministas (sin red ni modelo);
+`--real-embeddings` mide con el modelo configurado.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, List
+from unittest.mock import patch
+
+from src.assistant import rag_pipeline
+from src.assistant.index_registry import IndexRegistry
+from src.assistant.langchain_agent import (
+    RetrievalConfig,
+    build_retriever,
+    build_splits,
+)
+from src.assistant.loader import load_procedures_text
+from src.assistant.rag_pipeline import RAGConfig, answer_question, retrieve
+
+from .common import fake_embedder, synthetic_text, timeit, write_synthetic_pdf
+
+QUERIES = [
+    "¿Cuál es el plazo de aprobación del crédito?",
+    "requisitos de garantía y póliza de seguro",
+    "¿Quién es el responsable de la auditoría de riesgo?",
+]
+
+
+def fake_llm(prompt: str) -> str:
+    return "Respuesta de prueba."
+
+
+def bench_document(
+    name: str, cfg: RAGConfig, repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Mide cada etapa del pipeline para un documento ya escrito en disco.
+    """
+    results: Dict[str, Dict[str, float]] = {}
+
+    def stage(label: str, fn) -> None:
+        results[f"{name}/{label}"] = timeit(fn, repeat)
+
+    stage("load", lambda: load_procedures_text(cfg.pdf_path, cfg.text_path))
+    text = load_procedures_text(cfg.pdf_path, cfg.text_path)
+    stage("build_splits", lambda: build_splits(text, cfg.chunk_size, cfg.chunk_overlap))
+    chunks = build_splits(text, cfg.chunk_size, cfg.chunk_overlap)
+
+    bm25_cfg = RetrievalConfig(use_embeddings=False, k=cfg.k)
+    dense_cfg = RetrievalConfig(
+        use_embeddings=True, embeddings_model=cfg.embeddings_model, k=cfg.k
+    )
+    stage("build_retriever_bm25", lambda: build_retriever(chunks, bm25_cfg))
+    stage("build_retriever_embeddings", lambda: build_retriever(chunks, dense_cfg))
+
+    bm25_rag = replace(cfg, use_embeddings=False)
+    stage("retrieve_bm25", lambda: [retrieve(text, q, bm25_rag) for q in QUERIES])
+    stage("retrieve_embeddings", lambda: [retrieve(text, q, cfg) for q in QUERIES])
+
+    def cold_answer() -> None:
+        # Registro vacío: incluye cargar e indexar el documento
+        with patch.object(rag_pipeline, "registry", IndexRegistry(1 << 30)):
+            answer_question(QUERIES[0], cfg, llm=fake_llm)
+
+    stage("answer_question_cold", cold_answer)
+    with patch.object(rag_pipeline, "registry", IndexRegistry(1 << 30)):
+        answer_question(QUERIES[0], cfg, llm=fake_llm)
+        stage(
+            "answer_question_warm",
+            lambda: [answer_question(q, cfg, llm=fake_llm) for q in QUERIES],
+        )
+    results[f"{name}/chunks"] = {"count": len(chunks)}
+    return results
+
+
+def run_suite(sizes: List[int], repeat: int, tmp: str) -> Dict[str, object]:
+    results: Dict[str, Dict[str, float]] = {}
+    for paragraphs in sizes:
+        txt = Path(tmp) / f"doc-{paragraphs}.txt"
+        txt.write_text(synthetic_text(paragraphs), encoding="utf-8")
+        cfg = RAGConfig(text_path=str(txt), persist_index=False, cache_embeddings=False)
+        results.update(bench_document(f"txt-{paragraphs}", cfg, repeat))
+
+        # ~5 párrafos por página para que ambos formatos tengan tamaño similar
+        pages = max(1, paragraphs // 5)
+        pdf = Path(tmp) / f"doc-{pages}.pdf"
+        write_synthetic_pdf(str(pdf), pages)
+        cfg = RAGConfig(pdf_path=str(pdf), persist_index=False, cache_embeddings=False)
+        results.update(bench_document(f"pdf-{pages}p", cfg, repeat))
+    return results
+
+
+def compare(
+    current: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+    min_delta_s: float,
+) -> List[Dict[str, object]]:
+    """
+    Etapas presentes en ambos informes cuya mediana empeoró más de `threshold`
+    (relativo) y más de `min_delta_s` (absoluto).
+    """
+    regressions = []
+    for key, stats in current.items():
+        base = baseline.get(key, {})
+        if "median_s" not in stats or "median_s" not in base:
+            continue
+        now, before = stats["median_s"], base["median_s"]
+        if now - before > min_delta_s and now > before * (1 + threshold):
+            regressions.append(
+                {
+                    "stage": key,
+                    "baseline_s": before,
+                    "current_s": now,
+                    "ratio": now / max(before, 1e-9),
+                }
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Guarda el informe JSON en este archivo")
+    parser.add_argument("--compare", help="Informe JSON de referencia")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=1.0)
+    parser.add_argument("--real-embeddings", action="store_true")
+    args = parser.parse_args()
+
+    patches = []
+    if not args.real_embeddings:
+        embedder = fake_embedder()
+        patches = [
+            patch("src.assistant.rag_pipeline.get_embedder", return_value=embedder),
+            patch("src.assistant.langchain_agent.get_embedder", return_value=embedder),
+        ]
+    for p in patches:
+        p.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = run_suite(args.sizes, args.repeat, tmp)
+    finally:
+        for p in patches:
+            p.stop()
+
+    report: Dict[str, object] = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "sizes": args.sizes,
+            "repeat": args.repeat,
+            "embeddings": "real" if args.real_embeddings else "fake",
+        },
+        "results": results,
+    }
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        report["regressions"] = compare(
+            results,
+            baseline.get("results", {}),
+            args.threshold,
+            args.min_delta_ms / 1000,
+        )
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
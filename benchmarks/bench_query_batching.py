@@ -0,0 +1,137 @@
+"""
+Embeddings de preguntas con varias peticiones concurrentes: cada hilo llama
+a `embed_query` del modelo (sin agrupar) frente a `QueryBatcher`, que junta
+las preguntas en curso en un solo `embed_documents`. Reporta throughput
+(preguntas/s) y latencias p50/p99 por nivel de concurrencia. Todas las
+preguntas son distintas y la caché LRU está apagada, así que la mejora viene
+solo de los lotes.
+
+Con `--fake-model` no se carga MiniLM: cada llamada cuesta `--overhead-ms`
+más `--per-query-ms` por pregunta y las llamadas se serializan, como un
+modelo que ya ocupa toda la CPU.
+
+    python -m benchmarks.bench_query_batching --concurrency 1 8 32 64
+    python -m benchmarks.bench_query_batching --fake-model --queries 2000
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from src.assistant.embeddings import get_embedder
+from src.assistant.query_batcher import QueryBatcher
+
+from .common import WORDS, fake_embedder
+
+
+class CostModel:
+    """
+    Embeddings falsos con el coste de un modelo real: fijo por llamada y
+    proporcional a las preguntas del lote, sin paralelismo entre llamadas.
+    """
+
+    def __init__(self, overhead: float, per_query: float):
+        self.inner = fake_embedder()
+        self.overhead = overhead
+        self.per_query = per_query
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            time.sleep(self.overhead + self.per_query * len(texts))
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def questions(n: int, offset: int) -> List[str]:
+    return [
+        f"¿{WORDS[i % len(WORDS)]} {WORDS[(i * 7) % len(WORDS)]} {offset + i}?"
+        for i in range(n)
+    ]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(embed, queries: List[str], concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+
+    def one(query: str) -> None:
+        start = time.perf_counter()
+        embed(query)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, queries))
+    elapsed = time.perf_counter() - start
+    return {
+        "qps": len(queries) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--wait-ms", type=float, default=2.0)
+    parser.add_argument("--fake-model", action="store_true")
+    parser.add_argument("--overhead-ms", type=float, default=8.0)
+    parser.add_argument("--per-query-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if args.fake_model:
+        model = CostModel(args.overhead_ms / 1000, args.per_query_ms / 1000)
+    else:
+        model = get_embedder()
+        model.embed_query("warm-up")
+
+    results = []
+    for i, concurrency in enumerate(args.concurrency):
+        batcher = QueryBatcher(
+            model,
+            max_batch=args.max_batch,
+            max_wait=args.wait_ms / 1000,
+            cache_size=0,
+        )
+        # Preguntas nuevas en cada variante para que ninguna reutilice vectores
+        base = 2 * i * args.queries
+        unbatched = run(model.embed_query, questions(args.queries, base), concurrency)
+        batched = run(
+            batcher.embed_query,
+            questions(args.queries, base + args.queries),
+            concurrency,
+        )
+        results.append(
+            {
+                "concurrency": concurrency,
+                "unbatched": unbatched,
+                "batched": batched,
+                "mean_batch": batcher.stats()["mean_batch"],
+                "speedup": batched["qps"] / max(unbatched["qps"], 1e-9),
+            }
+        )
+    print(
+        json.dumps(
+            {
+                "fake_model": args.fake_model,
+                "queries": args.queries,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
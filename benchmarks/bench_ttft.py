@@ -0,0 +1,79 @@
+"""
+Tiempo hasta el primer token: /ask (respuesta completa) frente a /ask/stream
+(SSE), con un servidor stub de OpenAI que genera tokens a ritmo fijo.
+
+    python -m benchmarks.bench_ttft --tokens 100 --token-delay 0.02
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from .common import synthetic_text
+from .stub_openai import create_app, running_stub
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    stub = create_app(
+        delay=args.delay, tokens=args.tokens, token_delay=args.token_delay
+    )
+    with tempfile.TemporaryDirectory() as tmp, running_stub(stub) as base_url:
+        doc = Path(tmp) / "manual.txt"
+        doc.write_text(synthetic_text(50), encoding="utf-8")
+        os.environ.update(
+            {
+                "OPENAI_API_KEY": "stub",
+                "OPENAI_BASE_URL": base_url,
+                "OPENAI_MODEL": "stub",
+                "PROCEDURES_TEXT_PATH": str(doc),
+                "USE_EMBEDDINGS": "false",
+                "DISABLE_LLM": "false",
+            }
+        )
+        from src.api.main import app
+
+        with running_stub(app) as api_url:
+            api = api_url[: -len("/v1")]
+            payload = {"question": "¿Cuál es el procedimiento de crédito?"}
+            full, ttft, stream_total = [], [], []
+            with httpx.Client(timeout=60) as client:
+                client.post(f"{api}/ask", json=payload)  # calentamiento
+                for _ in range(args.requests):
+                    start = time.perf_counter()
+                    client.post(f"{api}/ask", json=payload).raise_for_status()
+                    full.append(time.perf_counter() - start)
+
+                    start = time.perf_counter()
+                    first = None
+                    with client.stream("POST", f"{api}/ask/stream", json=payload) as r:
+                        for line in r.iter_lines():
+                            if first is None and line == "event: token":
+                                first = time.perf_counter() - start
+                    ttft.append(first)
+                    stream_total.append(time.perf_counter() - start)
+
+    report = {
+        "requests": args.requests,
+        "ask_full_response_median_s": statistics.median(full),
+        "ask_stream_ttft_median_s": statistics.median(ttft),
+        "ask_stream_total_median_s": statistics.median(stream_total),
+        "ttft_reduction": statistics.median(full) / statistics.median(ttft),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Presupuesto de tiempo de importación de la API, medido con `python -X importtime`.
+
+    python -m benchmarks.check_importtime
+    python -m benchmarks.check_importtime --budget-ms 600 --repeat 5
+
+Falla (código 1) si importar `src.api.main` tarda más que el presupuesto
+(mejor de `--repeat` ejecuciones, en procesos nuevos) o si carga alguno de
+los módulos pesados que deben importarse solo al usarlos.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict
+
+HEAVY = (
+    "langchain_community",
+    "langchain_text_splitters",
+    "langgraph",
+    "faiss",
+    "sentence_transformers",
+    "torch",
+    "scipy",
+    "pdfminer",
+    "PyPDF2",
+)
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """
+    Tiempo acumulado (microsegundos) de cada módulo importado por `module`
+    en un intérprete nuevo.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="src.api.main")
+    parser.add_argument(
+        "--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "800"))
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    best = min(runs, key=lambda t: t.get(args.module, 0))
+    total_ms = best.get(args.module, 0) / 1000
+    heavy = sorted(name for name in best if name in HEAVY)
+    slowest = sorted(best.items(), key=lambda kv: -kv[1])[:10]
+    report = {
+        "module": args.module,
+        "total_ms": total_ms,
+        "budget_ms": args.budget_ms,
+        "heavy_modules": heavy,
+        "slowest_ms": {name: us / 1000 for name, us in slowest},
+    }
+    print(json.dumps(report, indent=2))
+    if total_ms > args.budget_ms or heavy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
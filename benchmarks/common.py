@@ -0,0 +1,107 @@
+from typing import Callable, Dict, List
+import random
+import statistics
+import time
+
+WORDS = (
+    "procedimiento solicitud cliente crédito vehículo aprobación documento firma "
+    "plazo cuota tasa interés garantía seguro póliza pago mora asesor sucursal "
+    "validación identidad contrato desembolso cartera reporte área responsable "
+    "revisión formato registro sistema control auditoría riesgo cumplimiento"
+).split()
+
+
+def synthetic_text(paragraphs: int, seed: int = 7) -> str:
+    """
+    Genera un documento de procedimientos sintético y reproducible.
+    """
+    rnd = random.Random(seed)
+    out = []
+    for i in range(paragraphs):
+        sentences = []
+        for _ in range(rnd.randint(3, 6)):
+            words = rnd.choices(WORDS, k=rnd.randint(8, 16))
+            sentences.append(" ".join(words).capitalize() + ".")
+        out.append(f"Sección {i + 1}. " + " ".join(sentences))
+    return "\n\n".join(out)
+
+
+def fake_embedder(size: int = 384):
+    """
+    Embeddings deterministas sin descargar modelos (para correr sin red).
+    """
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    return DeterministicFakeEmbedding(size=size)
+
+
+def timeit(fn: Callable[[], object], repeat: int = 5) -> Dict[str, float]:
+    """
+    Ejecuta `fn` varias veces y devuelve mediana, mínimo y máximo en segundos.
+    """
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+        "max_s": max(samples),
+    }
+
+
+def write_synthetic_pdf(path: str, pages: int, lines_per_page: int = 40) -> None:
+    """
+    Escribe un PDF de texto simple (Helvetica) con `pages` páginas, sin
+    dependencias externas. Sirve para medir la extracción de texto.
+    """
+    rnd = random.Random(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages, se completa al final
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for n in range(pages):
+        lines = [f"Pagina {n + 1}"] + [
+            " ".join(rnd.choices(WORDS, k=10)) for _ in range(lines_per_page)
+        ]
+        # Solo ASCII en el stream para no depender de codificaciones de fuente
+        ascii_lines = [
+            ln.encode("ascii", "ignore").decode().replace("(", "").replace(")", "")
+            for ln in lines
+        ]
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        ops += [f"({ln}) Tj T*" for ln in ascii_lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        " ".join(f"{k} 0 R" for k in kids).encode(),
+        pages,
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    with open(path, "wb") as f:
+        f.write(bytes(out))
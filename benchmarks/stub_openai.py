@@ -0,0 +1,138 @@
+"""
+Servidor local compatible con la API de chat de OpenAI para benchmarks y tests.
+Responde tras `delay` segundos (latencia hasta el primer token) más
+`token_delay` por token; con `stream=True` envía los tokens por SSE.
+
+Para probar la resiliencia del cliente, `models` ajusta el comportamiento
+por modelo: {"lento": {"delay": 5.0}, "roto": {"fail": -1}} (`fail` = número
+de respuestas 500 antes de responder bien; -1 = siempre).
+"""
+
+from typing import Dict, Iterator, Optional
+import asyncio
+import contextlib
+import json
+import socket
+import threading
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(
+    delay: float = 0.1,
+    tokens: int = 20,
+    token_delay: float = 0.0,
+    models: Optional[Dict[str, Dict[str, float]]] = None,
+):
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.calls_by_model = {}
+    models = models or {}
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        model = body["model"]
+        n = app.state.calls_by_model.get(model, 0) + 1
+        app.state.calls_by_model[model] = n
+        behavior = models.get(model, {})
+        await asyncio.sleep(behavior.get("delay", delay))
+        fail = behavior.get("fail", 0)
+        if fail < 0 or n <= fail:
+            return JSONResponse(
+                {
+                    "error": {
+                        "message": f"{model} no disponible",
+                        "type": "server_error",
+                    }
+                },
+                status_code=500,
+            )
+        words = [f"tok{i} " for i in range(tokens)]
+        if body.get("stream"):
+
+            async def events():
+                for w in words:
+                    if token_delay:
+                        await asyncio.sleep(token_delay)
+                    chunk = {
+                        "id": "stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body["model"],
+                        "choices": [
+                            {"index": 0, "delta": {"content": w}, "finish_reason": None}
+                        ],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    usage = {
+                        "id": "stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body["model"],
+                        "choices": [],
+                        "usage": {
+                            "prompt_tokens": 10,
+                            "completion_tokens": tokens,
+                            "total_tokens": 10 + tokens,
+                        },
+                    }
+                    yield f"data: {json.dumps(usage)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+        await asyncio.sleep(token_delay * tokens)
+        return JSONResponse(
+            {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(words)},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 10,
+                    "completion_tokens": tokens,
+                    "total_tokens": 10 + tokens,
+                },
+            }
+        )
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def running_stub(app) -> Iterator[str]:
+    """
+    Levanta `app` con uvicorn en un hilo y devuelve su base_url (`.../v1`).
+    """
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}/v1"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
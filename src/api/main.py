@@ -1,21 +1,110 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-import shutil
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from uuid import uuid4
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from src.assistant.rag_pipeline import answer_question, RAGConfig
+from src.assistant.rag_pipeline import (
+    answer_question_async,
+    answer_questions_stream,
+    load_index,
+    prepare_answer,
+    prepare_answers,
+    stream_answer,
+    RAGConfig,
+)
+from src.assistant.index_registry import file_sha256, registry
+from src.assistant.answer_cache import BYPASS, answer_cache
+from src.assistant.indexer import indexer
+from src.assistant.document_store import UploadTooLarge, document_store
+from src.assistant import context_packing, embeddings, metrics
+from src.assistant.llm import aclose_clients, get_async_client
+from src.assistant.loader import shutdown_pdf_pool
 
 # Cargar variables de entorno
 load_dotenv()
 
+# Pool acotado para la parte CPU de /ask (recuperación), separado del
+# threadpool por defecto de Starlette
+retrieval_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RETRIEVAL_WORKERS", "4")),
+    thread_name_prefix="retrieval",
+)
+
+
+# Estado del calentamiento: /ready responde 200 solo cuando terminó
+readiness: Dict[str, Any] = {"ready": False, "warmup": {}}
+
+
+async def warm_up() -> None:
+    """
+    Calentamiento opcional en segundo plano: carga el tokenizador y el modelo
+    de embeddings y pre-indexa PROCEDURES_PDF_PATH/PROCEDURES_TEXT_PATH. Un paso que falla
+    se informa en /ready pero no impide marcar el servicio como listo.
+    """
+    steps = readiness["warmup"]
+    # Sin esto la primera petición descargaría el BPE de tiktoken
+    if os.getenv("TOKENIZER_WARMUP", "true").lower() == "true":
+        try:
+            await run_in_threadpool(context_packing.warm_up)
+            steps["tokenizer"] = "ok"
+        except Exception as e:
+            # Los tokens se cuentan con la aproximación (ver rag_token_counts_total)
+            steps["tokenizer"] = f"error: {e}"
+    # Precargar el modelo de embeddings para que la primera consulta no lo pague
+    if (
+        os.getenv("USE_EMBEDDINGS", "true").lower() == "true"
+        and os.getenv("EMBEDDINGS_WARMUP", "true").lower() == "true"
+    ):
+        try:
+            await run_in_threadpool(embeddings.warm_up, embeddings.DEFAULT_MODEL)
+            steps["model"] = "ok"
+        except Exception as e:
+            # Sin modelo disponible se usa BM25 como alternativa
+            steps["model"] = f"error: {e}"
+    pdf_path = os.getenv("PROCEDURES_PDF_PATH")
+    text_path = os.getenv("PROCEDURES_TEXT_PATH")
+    if (pdf_path or text_path) and os.getenv(
+        "PREINDEX_DOCUMENT", "true"
+    ).lower() == "true":
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                retrieval_executor, load_index, rag_config(pdf_path, text_path)
+            )
+            steps["index"] = "ok"
+        except Exception as e:
+            steps["index"] = f"error: {e}"
+    readiness["ready"] = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cliente OpenAI asíncrono único para toda la app (pool keep-alive)
+    get_async_client()
+    # El servidor acepta conexiones de inmediato; /ready indica cuándo terminó
+    # el calentamiento
+    warmup = asyncio.create_task(warm_up())
+    yield
+    warmup.cancel()
+    await aclose_clients()
+    indexer.shutdown()
+    retrieval_executor.shutdown(wait=False)
+    shutdown_pdf_pool()
+
+
 # Inicializar FastAPI
-app = FastAPI(title="Asistente Conversacional RAG API")
+app = FastAPI(title="Asistente Conversacional RAG API", lifespan=lifespan)
 
 # Montar carpeta estática para el frontend
 # Asegúrate de que la carpeta existe antes de montar
@@ -29,23 +118,101 @@ async def read_index():
     return FileResponse("src/api/static/index.html")
 
 
+def document_paths(file_path: Path) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Devuelve (pdf_path, text_path) según la extensión del archivo.
+    """
+    if file_path.suffix.lower() == ".pdf":
+        return str(file_path), None
+    if file_path.suffix.lower() == ".txt":
+        return None, str(file_path)
+    return None, None
+
+
+def rag_config(pdf_path: Optional[str], text_path: Optional[str]) -> RAGConfig:
+    """
+    Configuración del pipeline RAG a partir de las variables de entorno.
+    """
+    return RAGConfig(
+        pdf_path=pdf_path,
+        text_path=text_path,
+        chunk_size=int(os.getenv("CHUNK_SIZE", "400")),
+        chunk_overlap=int(os.getenv("CHUNK_OVERLAP", "80")),
+        use_embeddings=os.getenv("USE_EMBEDDINGS", "true").lower() == "true",
+        persist_index=os.getenv("PERSIST_INDEX", "true").lower() == "true",
+        cache_embeddings=os.getenv("EMBED_CACHE", "true").lower() == "true",
+        hybrid=os.getenv("HYBRID_RETRIEVAL", "false").lower() == "true",
+        index_type=os.getenv("VECTOR_INDEX", "auto"),
+        context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200")),
+    )
+
+
+def tokens_saved(result: Dict[str, Any]) -> int:
+    """
+    Tokens de contexto ahorrados al empaquetar los fragmentos de la respuesta.
+    """
+    return int(result.get("context_tokens", {}).get("saved", 0))
+
+
+def upload_max_bytes() -> int:
+    """
+    Tamaño máximo de un archivo subido (UPLOAD_MAX_MB, 0 = sin límite).
+    """
+    return int(float(os.getenv("UPLOAD_MAX_MB", "50")) * 2**20)
+
+
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
     """
-    Sube un archivo a la carpeta uploads para ser usado como contexto.
+    Guarda un archivo por contenido (SHA-256) y encola su indexación en segundo
+    plano. Devuelve de inmediato el `document_id` (el hash) para consultar el
+    estado. Un contenido ya subido, aunque sea con otro nombre, no se vuelve a
+    escribir ni a indexar (`duplicate: true`).
     """
     try:
-        uploads_dir = Path("uploads")
-        uploads_dir.mkdir(exist_ok=True)
-
-        file_location = uploads_dir / file.filename
-        with open(file_location, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-
-        return {"filename": file.filename, "status": "uploaded"}
+        # Copia por bloques y hash en un hilo: no bloquea el event loop
+        stored = await run_in_threadpool(
+            document_store.save, file.filename, file.file, upload_max_bytes()
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al subir archivo: {str(e)}")
 
+    result = {
+        "filename": stored.filename,
+        "status": "uploaded",
+        "size": stored.size,
+        "duplicate": stored.duplicate,
+    }
+    pdf_path, text_path = document_paths(stored.path)
+    if pdf_path or text_path:
+        previous_id = stored.previous if stored.previous != stored.digest else None
+        if previous_id:
+            # El documento cambió: sus respuestas ya no son válidas. Su índice
+            # se actualiza de forma incremental y luego se descarta.
+            answer_cache.invalidate(previous_id)
+        job = indexer.submit(
+            stored.digest,
+            stored.filename,
+            rag_config(pdf_path, text_path),
+            previous_id=previous_id,
+        )
+        result.update({"document_id": stored.digest, "index_status": job.status})
+    return result
+
+
+@app.get("/documents/{document_id}/status")
+def document_status(document_id: str) -> Dict[str, Any]:
+    """
+    Estado de indexación de un documento:
+    queued / extracting / embedding / ready / failed, con su progreso.
+    """
+    job = indexer.get(document_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+    return job.to_dict()
+
 
 # Configurar CORS
 app.add_middleware(
@@ -61,6 +228,23 @@ app.add_middleware(
 class AskRequest(BaseModel):
     question: str
     filename: Optional[str] = None
+    document_id: Optional[str] = None
+    # Modo corpus: busca en todos los documentos subidos (o solo en `filenames`)
+    corpus: bool = False
+    filenames: Optional[List[str]] = None
+    # Conversación con memoria: el historial y el último contexto se
+    # conservan por sesión
+    session_id: Optional[str] = None
+
+
+class BatchAskRequest(BaseModel):
+    questions: List[str]
+    filename: Optional[str] = None
+    document_id: Optional[str] = None
+    # Llamadas simultáneas al LLM (acotado por BATCH_LLM_CONCURRENCY)
+    concurrency: Optional[int] = None
+    # Solo /ask admite sesiones; se declara para rechazarlo en vez de ignorarlo
+    session_id: Optional[str] = None
 
 
 @app.get("/health")
@@ -72,68 +256,371 @@ def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready() -> JSONResponse:
+    """
+    Readiness: 503 mientras corre el calentamiento (modelo de embeddings y
+    pre-indexado del documento configurado), 200 cuando terminó.
+    `/health` solo indica que el proceso está vivo.
+    """
+    body = {
+        "status": "ready" if readiness["ready"] else "starting",
+        "warmup": dict(readiness["warmup"]),
+    }
+    return JSONResponse(body, status_code=200 if readiness["ready"] else 503)
+
+
+@app.get("/health/model")
+def health_model() -> Dict[str, Any]:
+    """
+    Estado del modelo de embeddings compartido: si está cargado y su configuración.
+    """
+    return {
+        "status": "ok",
+        "model": embeddings.DEFAULT_MODEL,
+        "loaded": embeddings.is_loaded(embeddings.DEFAULT_MODEL),
+        "batch_size": embeddings.embed_batch_size(),
+        "threads": embeddings.embed_threads(),
+    }
+
+
+@app.get("/index/stats")
+def index_stats() -> Dict[str, int]:
+    """
+    Estadísticas del registro de índices (aciertos, fallos, memoria usada).
+    """
+    return registry.stats()
+
+
+@app.get("/metrics")
+def metrics_endpoint() -> Response:
+    """
+    Métricas en formato de texto de Prometheus: duración por etapa del
+    pipeline, llamadas al LLM (modelo, respaldo, resultado) y tokens.
+    """
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+async def resolve_ask_config(body: AskRequest) -> RAGConfig:
+    """
+    Determina el documento de la pregunta y arma la configuración RAG.
+    Si el documento se está indexando, espera al índice en lugar de construir otro.
+    """
+    pdf_path = None
+    text_path = None
+    filename = body.filename
+    file_path = None
+
+    # Modo corpus: un solo índice compartido, filtrado por archivo
+    if body.corpus or body.filenames is not None:
+        await indexer.wait_pending_async(body.filenames)
+        cfg = rag_config(None, None)
+        cfg.corpus_dir = str(document_store.root)
+        cfg.filenames = body.filenames
+        return cfg
+
+    # Prioridad 1: documento subido, identificado por su document_id (hash)
+    if body.document_id:
+        file_path = document_store.path_for_digest(body.document_id)
+        job = indexer.get(body.document_id)
+        if file_path is None and job is None:
+            raise HTTPException(status_code=404, detail="Documento no encontrado")
+        filename = filename or (job.filename if job else None)
+
+    # Prioridad 2: Filename enviado explícitamente por el cliente
+    if file_path is None and filename:
+        file_path = document_store.resolve(filename)
+    if file_path is not None:
+        pdf_path, text_path = document_paths(file_path)
+        if pdf_path or text_path:
+            document_id = (
+                body.document_id
+                or document_store.digest_of(filename)
+                or await run_in_threadpool(file_sha256, str(file_path))
+            )
+            await indexer.wait_async(document_id)
+
+    # Prioridad 3: Variables de entorno (solo si no se envió filename explícito)
+    # Esto permite mantener retrocompatibilidad o configurar documentos fijos si se desea.
+    if not pdf_path and not text_path and not filename:
+        pdf_path = os.getenv("PROCEDURES_PDF_PATH")
+        text_path = os.getenv("PROCEDURES_TEXT_PATH")
+
+    # NOTA: Ya no buscamos automáticamente en "uploads/" al azar.
+    # Si no hay documento, pdf_path y text_path serán None.
+    # RAGConfig aceptará None, y answer_question manejará el modo "Charla General".
+    return rag_config(pdf_path, text_path)
+
+
+def llm_disabled() -> bool:
+    return os.getenv("DISABLE_LLM", "false").lower() == "true"
+
+
+DEMO_ANSWER = "Respuesta simulada (LLM deshabilitado)."
+
+
+def active_answer_cache():
+    """
+    Caché de respuestas, salvo que se desactive con ANSWER_CACHE=false.
+    """
+    if os.getenv("ANSWER_CACHE", "true").lower() != "true":
+        return None
+    return answer_cache
+
+
 @app.post("/ask")
-def ask(body: AskRequest) -> Dict[str, Any]:
+async def ask(body: AskRequest, response: Response) -> Dict[str, Any]:
     """
     Endpoint para realizar preguntas al asistente.
 
-    - Recibe: {"question": "...", "filename": "doc.pdf"}
+    - Recibe: {"question": "...", "filename": "doc.pdf"} o {"question": "...", "document_id": "..."}
+    - Modo corpus: {"question": "...", "corpus": true} busca en todos los documentos
+      subidos; {"question": "...", "filenames": ["a.pdf", "b.txt"]} solo en esos.
+      `sources` indica archivo y página de cada fragmento de `context`.
     - Si no se envía filename, se asume conversación general sin documento.
+    - La cabecera `X-Cache` indica si la respuesta vino de la caché
+      (HIT-EXACT / HIT-SEMANTIC / MISS / BYPASS).
+    - La cabecera `Server-Timing` desglosa el tiempo por etapa (extract,
+      split, embed, index, search, pack, cache, llm).
+    - La cabecera `X-Context-Tokens-Saved` indica cuántos tokens de contexto
+      se ahorraron al unir, deduplicar y recortar los fragmentos.
     """
-    try:
-        # 1. Determinar el documento a usar
-        pdf_path = None
-        text_path = None
-
-        # Prioridad 1: Filename enviado explícitamente por el cliente
-        if body.filename:
-            uploads_dir = Path("uploads")
-            file_path = uploads_dir / body.filename
-            if file_path.exists():
-                if file_path.suffix.lower() == ".pdf":
-                    pdf_path = str(file_path)
-                elif file_path.suffix.lower() == ".txt":
-                    text_path = str(file_path)
-
-        # Prioridad 2: Variables de entorno (solo si no se envió filename explícito)
-        # Esto permite mantener retrocompatibilidad o configurar documentos fijos si se desea.
-        if not pdf_path and not text_path and not body.filename:
-            pdf_path = os.getenv("PROCEDURES_PDF_PATH")
-            text_path = os.getenv("PROCEDURES_TEXT_PATH")
-
-        # NOTA: Ya no buscamos automáticamente en "uploads/" al azar.
-        # Si no hay documento, pdf_path y text_path serán None.
-        # RAGConfig aceptará None, y answer_question manejará el modo "Charla General".
-
-        # 2. Configurar el pipeline RAG
-        cfg = RAGConfig(
-            pdf_path=pdf_path,
-            text_path=text_path,
-            chunk_size=int(os.getenv("CHUNK_SIZE", "400")),
-            chunk_overlap=int(os.getenv("CHUNK_OVERLAP", "80")),
-            use_embeddings=os.getenv("USE_EMBEDDINGS", "true").lower() == "true",
+    start = time.perf_counter()
+    with metrics.collect_timings() as timings:
+        try:
+            result = await _ask(body)
+        except HTTPException:
+            raise
+        except Exception as e:
+            metrics.ERRORS.inc(stage="api")
+            raise HTTPException(
+                status_code=500, detail=f"Error interno del servidor: {str(e)}"
+            )
+        metrics.record("total", time.perf_counter() - start)
+    response.headers["X-Cache"] = str(result.get("cache", BYPASS))
+    response.headers["Server-Timing"] = metrics.server_timing(timings)
+    response.headers["X-Context-Tokens-Saved"] = str(tokens_saved(result))
+
+    # 4. Retornar respuesta formateada
+    payload = {
+        "answer": result.get("answer", "No se pudo generar respuesta."),
+        "context": result.get("context_used", []),
+        "sources": result.get("sources", []),
+    }
+    if body.session_id:
+        payload["session_id"] = body.session_id
+        payload["context_reused"] = bool(result.get("context_reused"))
+    return payload
+
+
+async def _ask(body: AskRequest) -> Dict[str, Any]:
+    # 1-2. Determinar el documento y configurar el pipeline RAG
+    cfg = await resolve_ask_config(body)
+    if body.session_id:
+        return await _ask_session(body, cfg)
+
+    # 3. Llamar a la lógica del agente
+    if llm_disabled():
+        # Modo demo
+        return await answer_question_async(
+            body.question,
+            cfg,
+            llm=lambda p: DEMO_ANSWER,
+            executor=retrieval_executor,
+            cache=active_answer_cache(),
         )
+    return await answer_question_async(
+        body.question,
+        cfg,
+        executor=retrieval_executor,
+        cache=active_answer_cache(),
+    )
+
+
+def session_history_tokens() -> int:
+    """
+    Tokens máximos del historial de una sesión (SESSION_HISTORY_TOKENS).
+    """
+    return int(os.getenv("SESSION_HISTORY_TOKENS", "1000"))
 
-        # 3. Llamar a la lógica del agente
-        if os.getenv("DISABLE_LLM", "false").lower() == "true":
-            # Modo demo
-            result = answer_question(
-                body.question,
-                cfg,
-                llm=lambda p: "Respuesta simulada (LLM deshabilitado).",
-            )
-        else:
-            result = answer_question(body.question, cfg)
 
-        # 4. Retornar respuesta formateada
-        return {
-            "answer": result.get("answer", "No se pudo generar respuesta."),
-            "context": result.get("context_used", []),
+async def _ask_session(body: AskRequest, cfg: RAGConfig) -> Dict[str, Any]:
+    """
+    Turno de una conversación: el grafo de LangGraph guarda el historial y el
+    último contexto recuperado de `session_id` en su checkpointer. Los turnos
+    de una misma sesión se ejecutan de a uno y la recuperación usa el
+    `retrieval_executor`, como en /ask sin sesión.
+    """
+    # langgraph solo se importa al usar sesiones
+    from langchain_core.messages import HumanMessage
+    from src.assistant.graph import ainvoke_session
+
+    if cfg.corpus_dir:
+        raise HTTPException(
+            status_code=400, detail="session_id no está disponible en modo corpus"
+        )
+    config = {
+        "configurable": {
+            "thread_id": body.session_id,
+            "rag_config": cfg,
+            "llm": (lambda p: DEMO_ANSWER) if llm_disabled() else None,
+            "cache": active_answer_cache(),
+            "history_tokens": session_history_tokens(),
+            "executor": retrieval_executor,
         }
+    }
+    state = await ainvoke_session(
+        {
+            "messages": [HumanMessage(content=body.question)],
+            "current_doc_path": cfg.pdf_path or cfg.text_path or "",
+        },
+        config,
+    )
+    return {"answer": state["messages"][-1].content, **state.get("result", {})}
 
-    except HTTPException:
-        raise
-    except Exception as e:
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str) -> Dict[str, str]:
+    """
+    Olvida el historial y el contexto de una sesión.
+    """
+    from src.assistant.sessions import session_checkpointer
+
+    await session_checkpointer.adelete_thread(session_id)
+    return {"session_id": session_id, "status": "deleted"}
+
+
+def reject_session(session_id: Optional[str], endpoint: str) -> None:
+    """
+    Las sesiones solo se mantienen en /ask: en otros endpoints se rechazan.
+    """
+    if session_id:
         raise HTTPException(
-            status_code=500, detail=f"Error interno del servidor: {str(e)}"
+            status_code=400,
+            detail=f"session_id no está disponible en {endpoint}; usa /ask",
+        )
+
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    Formatea un evento Server-Sent Events con datos JSON.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/ask/stream")
+async def ask_stream(body: AskRequest) -> StreamingResponse:
+    """
+    Igual que /ask pero responde por Server-Sent Events:
+    primero un evento `context` con los fragmentos usados, luego un evento
+    `token` por cada fragmento de texto del LLM y al final `done`
+    (o `error` si el modelo falla a mitad de la respuesta).
+    Sin sesiones: con `session_id` responde 400.
+    """
+    reject_session(body.session_id, "/ask/stream")
+    cfg = await resolve_ask_config(body)
+    cache = active_answer_cache()
+    # La recuperación se hace antes de responder para poder enviar X-Cache
+    # y Server-Timing (solo cubre las etapas previas al LLM)
+    loop = asyncio.get_running_loop()
+    with metrics.collect_timings() as timings:
+        prepared = await loop.run_in_executor(
+            retrieval_executor,
+            metrics.in_context(prepare_answer, body.question, cfg, cache),
+        )
+    llm_stream = None
+    if llm_disabled():
+
+        async def llm_stream(prompt: str):
+            yield DEMO_ANSWER
+
+    async def events():
+        try:
+            async for event, data in stream_answer(
+                body.question,
+                cfg,
+                llm_stream=llm_stream,
+                cache=cache,
+                prepared=prepared,
+            ):
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event("error", f"Error interno del servidor: {str(e)}")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Cache": str(prepared.get("cache", BYPASS)),
+            "Server-Timing": metrics.server_timing(timings),
+            "X-Context-Tokens-Saved": str(tokens_saved(prepared)),
+        },
+    )
+
+
+def batch_concurrency(requested: Optional[int]) -> int:
+    """
+    Llamadas simultáneas al LLM en /ask/batch: lo pedido por el cliente,
+    sin superar BATCH_LLM_CONCURRENCY.
+    """
+    limit = max(1, int(os.getenv("BATCH_LLM_CONCURRENCY", "8")))
+    return max(1, min(requested or limit, limit))
+
+
+@app.post("/ask/batch")
+async def ask_batch(body: BatchAskRequest) -> StreamingResponse:
+    """
+    Varias preguntas sobre el mismo documento en una sola petición.
+
+    - Recibe: {"questions": ["...", "..."], "filename": "doc.pdf"} (o document_id)
+    - El documento se carga e indexa una vez, las preguntas se embeben juntas
+      y las búsquedas se hacen en lote; las llamadas al LLM corren en paralelo.
+    - Responde NDJSON (una línea JSON por pregunta) en orden de finalización:
+      {"index", "question", "answer", "context", "sources", "cache",
+      "context_tokens_saved"}.
+    - Sin sesiones: con `session_id` responde 400.
+    """
+    reject_session(body.session_id, "/ask/batch")
+    cfg = await resolve_ask_config(
+        AskRequest(question="", filename=body.filename, document_id=body.document_id)
+    )
+    cache = active_answer_cache()
+    loop = asyncio.get_running_loop()
+    with metrics.collect_timings() as timings:
+        prepared = await loop.run_in_executor(
+            retrieval_executor,
+            metrics.in_context(prepare_answers, body.questions, cfg, cache),
         )
+    llm = (lambda p: DEMO_ANSWER) if llm_disabled() else None
+
+    async def lines():
+        async for result in answer_questions_stream(
+            body.questions,
+            cfg,
+            llm=llm,
+            cache=cache,
+            concurrency=batch_concurrency(body.concurrency),
+            prepared=prepared,
+        ):
+            line = {
+                "index": result["index"],
+                "question": result["question"],
+                "answer": result.get("answer", "No se pudo generar respuesta."),
+                "context": result.get("context_used", []),
+                "sources": result.get("sources", []),
+                "cache": str(result.get("cache", BYPASS)),
+                "context_tokens_saved": tokens_saved(result),
+            }
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Server-Timing": metrics.server_timing(timings),
+        },
+    )
@@ -0,0 +1,179 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+HIT_EXACT = "HIT-EXACT"
+HIT_SEMANTIC = "HIT-SEMANTIC"
+MISS = "MISS"
+BYPASS = "BYPASS"
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normaliza una pregunta: minúsculas, sin tildes, sin puntuación
+    y con espacios colapsados.
+    """
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def context_fingerprint(contexts: List[str]) -> str:
+    """
+    Huella de los fragmentos recuperados (en orden).
+    """
+    h = hashlib.sha256()
+    for c in contexts:
+        h.update(c.encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+@dataclass
+class CachedAnswer:
+    doc_hash: str
+    answer: str
+    vector: Optional[np.ndarray]
+    created: float
+
+
+@dataclass
+class CacheLookup:
+    """
+    Resultado de una consulta a la caché: respuesta (o None), estado para la
+    cabecera X-Cache y vector de la pregunta (para reutilizarlo al guardar).
+    """
+
+    answer: Optional[str]
+    status: str
+    vector: Optional[np.ndarray] = None
+
+
+class AnswerCache:
+    """
+    Caché de respuestas del LLM con dos niveles:
+    - exacto: hash del documento + huella del contexto + pregunta normalizada
+    - semántico: pregunta con similitud coseno >= `threshold` a una ya
+      respondida sobre el mismo documento
+    Con TTL y expulsión LRU por número de entradas.
+    """
+
+    def __init__(
+        self, max_entries: int = 1024, ttl: float = 3600, threshold: float = 0.95
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[Tuple[str, str, str], CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats_counts: Dict[str, int] = {HIT_EXACT: 0, HIT_SEMANTIC: 0, MISS: 0}
+
+    def _expired(self, entry: CachedAnswer, now: float) -> bool:
+        return self.ttl > 0 and now - entry.created > self.ttl
+
+    def _purge_expired(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if self._expired(e, now)]
+        for k in expired:
+            del self._entries[k]
+
+    def lookup(
+        self,
+        doc_hash: str,
+        contexts: List[str],
+        question: str,
+        embed: Optional[Callable[[str], List[float]]] = None,
+    ) -> CacheLookup:
+        """
+        Busca una respuesta primero por clave exacta y luego por similitud.
+        """
+        key = (doc_hash, context_fingerprint(contexts), normalize_question(question))
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats_counts[HIT_EXACT] += 1
+                return CacheLookup(entry.answer, HIT_EXACT, entry.vector)
+            candidates = [
+                (k, e)
+                for k, e in self._entries.items()
+                if e.doc_hash == doc_hash and e.vector is not None
+            ]
+
+        vector = None
+        if embed is not None:
+            vector = _unit(embed(question))
+        if vector is not None and candidates:
+            matrix = np.stack([e.vector for _, e in candidates])
+            sims = matrix @ vector
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                best_key, best_entry = candidates[best]
+                with self._lock:
+                    if best_key in self._entries:
+                        self._entries.move_to_end(best_key)
+                    self.stats_counts[HIT_SEMANTIC] += 1
+                return CacheLookup(best_entry.answer, HIT_SEMANTIC, vector)
+
+        with self._lock:
+            self.stats_counts[MISS] += 1
+        return CacheLookup(None, MISS, vector)
+
+    def store(
+        self,
+        doc_hash: str,
+        contexts: List[str],
+        question: str,
+        answer: str,
+        vector: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Guarda una respuesta expulsando las menos usadas si se supera el tamaño.
+        """
+        key = (doc_hash, context_fingerprint(contexts), normalize_question(question))
+        with self._lock:
+            self._entries[key] = CachedAnswer(doc_hash, answer, vector, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doc_hash: str) -> int:
+        """
+        Elimina las respuestas de un documento (p. ej. cuando cambia su contenido).
+        """
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if e.doc_hash == doc_hash]
+            for k in keys:
+                del self._entries[k]
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), **self.stats_counts}
+
+
+def _unit(vector: List[float]) -> Optional[np.ndarray]:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else None
+
+
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95")),
+)
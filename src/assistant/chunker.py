@@ -0,0 +1,313 @@
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+import re
+
+import numpy as np
+
+from .loader import PageSpan
+
+# Misma jerarquía que el RecursiveCharacterTextSplitter que se usaba antes
+SEPARATORS = ("\n\n", "\n", ". ", " ", "")
+
+# Pistas de chunking (sobre el texto en minúsculas) y del modo por tokens
+_SIZE = re.compile(
+    r"(chunk[_\s-]?size|tamañ[o]?\s+de\s+chunk|tamaño\s+del\s+bloque)\D?(\d{2,5})"
+)
+_OVERLAP = re.compile(r"(overlap|solapamiento)\D?(\d{1,4})")
+_TOKEN = re.compile("token", re.IGNORECASE)
+_WORD = re.compile(r"\w+|[^\w\s]")
+
+Spans = List[Tuple[int, int]]
+
+
+class ChunkRecords:
+    """
+    Chunks de un documento como offsets sobre un único texto compartido:
+    arreglos `starts`/`ends` (caracteres, fin exclusivo) y `pages` (página
+    1-based de cada chunk). El texto de un chunk se obtiene al pedirlo
+    (`records[i]`) en lugar de guardar una copia de cada uno. Un chunk que no
+    se pudo ubicar en el texto (`locate_chunks`) tiene start = end = -1.
+    """
+
+    def __init__(
+        self,
+        text: str,
+        starts: Sequence[int],
+        ends: Sequence[int],
+        pages: Optional[Sequence[int]] = None,
+    ):
+        self.text = text
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        if pages is None:
+            self.pages = np.ones(len(self.starts), dtype=np.int32)
+        else:
+            self.pages = np.asarray(pages, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.text[self.starts[i] : self.ends[i]]
+
+    def __iter__(self) -> Iterator[str]:
+        text = self.text
+        for start, end in zip(self.starts.tolist(), self.ends.tolist()):
+            yield text[start:end]
+
+    def span(self, i: int) -> Tuple[int, int]:
+        return int(self.starts[i]), int(self.ends[i])
+
+    def take(self, indices: Sequence[int]) -> "ChunkRecords":
+        """
+        Los chunks en `indices`, en ese orden (p. ej. el orden de un índice
+        FAISS actualizado), sobre el mismo texto.
+        """
+        idx = np.asarray(indices, dtype=np.int64)
+        return ChunkRecords(
+            self.text, self.starts[idx], self.ends[idx], self.pages[idx]
+        )
+
+    def texts(self) -> List[str]:
+        """
+        Materializa los chunks como cadenas (para recuperadores y embeddings).
+        """
+        return list(self)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memoria de los offsets (el texto es compartido con el documento).
+        """
+        return self.starts.nbytes + self.ends.nbytes + self.pages.nbytes
+
+
+def scan_hints(
+    text: str, sizes: bool = True
+) -> Tuple[Optional[int], Optional[int], bool]:
+    """
+    Busca pistas de chunking: (tamaño, solapamiento, modo por tokens). El
+    texto se pasa a minúsculas una sola vez y solo si se piden los tamaños;
+    el modo por tokens se detecta sin copiarlo.
+    """
+    if not sizes:
+        return None, None, _TOKEN.search(text) is not None
+    lowered = text.lower()
+    m_size = _SIZE.search(lowered)
+    m_overlap = _OVERLAP.search(lowered)
+    return (
+        int(m_size.group(2)) if m_size else None,
+        int(m_overlap.group(2)) if m_overlap else None,
+        "token" in lowered,
+    )
+
+
+def _strip(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _emit(text: str, start: int, end: int, out: Spans) -> None:
+    start, end = _strip(text, start, end)
+    if end > start:
+        out.append((start, end))
+
+
+def _pieces(text: str, start: int, end: int, separator: str) -> Spans:
+    """
+    Corta [start, end) antes de cada separador (que queda al inicio del trozo
+    siguiente), como `keep_separator=True` de langchain.
+    """
+    if not separator:
+        return [(i, i + 1) for i in range(start, end)]
+    out = []
+    pos = text.find(separator, start, end)
+    while pos >= 0:
+        if pos > start:
+            out.append((start, pos))
+        start = pos
+        pos = text.find(separator, pos + len(separator), end)
+    if end > start:
+        out.append((start, end))
+    return out
+
+
+def _merge(text: str, pieces: Spans, size: int, overlap: int, out: Spans) -> None:
+    """
+    Junta trozos contiguos en chunks de hasta `size` caracteres; cada chunk
+    nuevo arranca con los últimos trozos del anterior (hasta `overlap`).
+    """
+    total = 0
+    first = 0
+    for j, (start, end) in enumerate(pieces):
+        length = end - start
+        if total + length > size and j > first:
+            _emit(text, pieces[first][0], pieces[j - 1][1], out)
+            while total > overlap or (total + length > size and total > 0):
+                total -= pieces[first][1] - pieces[first][0]
+                first += 1
+        total += length
+    if first < len(pieces):
+        _emit(text, pieces[first][0], pieces[-1][1], out)
+
+
+def _split(
+    text: str,
+    start: int,
+    end: int,
+    separators: Sequence[str],
+    size: int,
+    overlap: int,
+    out: Spans,
+) -> None:
+    separator, rest = separators[-1], ()
+    for i, candidate in enumerate(separators):
+        if not candidate:
+            separator = candidate
+            break
+        if text.find(candidate, start, end) >= 0:
+            separator, rest = candidate, separators[i + 1 :]
+            break
+    good: Spans = []
+    for piece in _pieces(text, start, end, separator):
+        if piece[1] - piece[0] < size:
+            good.append(piece)
+            continue
+        if good:
+            _merge(text, good, size, overlap, out)
+            good = []
+        if rest:
+            _split(text, piece[0], piece[1], rest, size, overlap, out)
+        else:
+            out.append(piece)
+    if good:
+        _merge(text, good, size, overlap, out)
+
+
+def split_spans(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    separators: Sequence[str] = SEPARATORS,
+) -> Spans:
+    """
+    Offsets de los chunks por separadores en orden de preferencia (mismo
+    resultado que RecursiveCharacterTextSplitter, sin crear `Document`s).
+    """
+    if chunk_overlap > chunk_size:
+        raise ValueError("chunk_overlap no puede ser mayor que chunk_size")
+    out: Spans = []
+    _split(text, 0, len(text), tuple(separators), chunk_size, chunk_overlap, out)
+    return out
+
+
+def token_spans(text: str) -> Spans:
+    """
+    Offsets de cada token: con tiktoken si está disponible; si no, palabras
+    y signos (la misma aproximación que el empaquetado de contexto). Espera
+    a que termine de cargar la codificación: los mismos chunks en cada
+    ejecución, que la clave del índice identifica por `encoding_name()`.
+    """
+    from .context_packing import get_encoding
+
+    encoding = get_encoding(block=True)
+    if encoding is None:
+        return [m.span() for m in _WORD.finditer(text)]
+    tokens = encoding.encode(text, disallowed_special=())
+    _, starts = encoding.decode_with_offsets(tokens)
+    ends = starts[1:] + [len(text)]
+    return list(zip(starts, ends))
+
+
+def split_token_spans(text: str, chunk_size: int, chunk_overlap: int) -> Spans:
+    """
+    Ventanas de `chunk_size` tokens que avanzan `chunk_size - chunk_overlap`.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap debe ser menor que chunk_size")
+    tokens = token_spans(text)
+    out: Spans = []
+    for i in range(0, len(tokens), chunk_size - chunk_overlap):
+        last = min(i + chunk_size, len(tokens)) - 1
+        _emit(text, tokens[i][0], tokens[last][1], out)
+        if last == len(tokens) - 1:
+            break
+    return out
+
+
+def span_pages(spans: Spans, pages: Optional[List[PageSpan]]) -> np.ndarray:
+    """
+    Página de cada chunk según el offset donde empieza.
+    """
+    if not pages or not spans:
+        return np.ones(len(spans), dtype=np.int32)
+    page_starts = np.asarray([p.start for p in pages], dtype=np.int64)
+    numbers = np.asarray([p.page for p in pages], dtype=np.int32)
+    starts = np.fromiter((s for s, _ in spans), dtype=np.int64, count=len(spans))
+    idx = np.searchsorted(page_starts, starts, side="right") - 1
+    return numbers[np.clip(idx, 0, len(pages) - 1)]
+
+
+def locate_chunks(
+    text: str, chunks: Sequence[str], pages: Optional[List[PageSpan]] = None
+) -> ChunkRecords:
+    """
+    Offsets de chunks de los que solo se conoce el texto (índices guardados
+    sin offsets). Los chunks suelen estar en orden, así que cada búsqueda
+    continúa desde el anterior; uno que no aparece hereda la página previa.
+    """
+    starts = np.full(len(chunks), -1, dtype=np.int64)
+    ends = np.full(len(chunks), -1, dtype=np.int64)
+    cursor = 0
+    for i, chunk in enumerate(chunks):
+        pos = text.find(chunk, cursor) if chunk else -1
+        if pos < 0 and chunk:
+            # Tras una actualización incremental el orden puede no ser el del texto
+            pos = text.find(chunk)
+        if pos >= 0:
+            starts[i], ends[i] = pos, pos + len(chunk)
+            cursor = pos + 1
+    numbers = np.ones(len(chunks), dtype=np.int32)
+    found = np.flatnonzero(starts >= 0)
+    if pages:
+        numbers[:] = pages[0].page
+        if len(found):
+            numbers[found] = span_pages([(int(starts[i]), 0) for i in found], pages)
+            # Los no ubicados toman la página del último ubicado antes que ellos
+            last = np.full(len(chunks), -1, dtype=np.int64)
+            last[found] = found
+            last = np.maximum.accumulate(last)
+            numbers = np.where(last >= 0, numbers[np.maximum(last, 0)], numbers)
+    return ChunkRecords(text, starts, ends, numbers)
+
+
+def chunk_text(
+    text: str,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    pages: Optional[List[PageSpan]] = None,
+) -> ChunkRecords:
+    """
+    Divide el documento en chunks. Sin tamaño/solapamiento se usan las pistas
+    del texto (o 800/100); si el texto menciona "token" se corta por tokens,
+    si no por separadores.
+    """
+    detect = chunk_size is None or chunk_overlap is None
+    auto_size, auto_overlap, use_tokens = scan_hints(text, sizes=detect)
+    if detect:
+        chunk_size = chunk_size or auto_size or 800
+        chunk_overlap = chunk_overlap or auto_overlap or 100
+    if use_tokens:
+        spans = split_token_spans(text, chunk_size, chunk_overlap)
+    else:
+        spans = split_spans(text, chunk_size, chunk_overlap)
+    return ChunkRecords(
+        text,
+        [s for s, _ in spans],
+        [e for _, e in spans],
+        span_pages(spans, pages),
+    )
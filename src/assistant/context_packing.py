@@ -0,0 +1,315 @@
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+from . import metrics
+from .answer_cache import normalize_question
+
+DEFAULT_ENCODING = "o200k_base"
+# Solapamiento mínimo (caracteres) para unir dos fragmentos sin conocer su posición
+MIN_OVERLAP_CHARS = 20
+# Por debajo de estos tokens libres no se recorta un tramo para completar
+MIN_PARTIAL_TOKENS = 32
+# Aproximación cuando no hay tokenizador: palabras y signos sueltos
+_APPROX_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+_encodings: Dict[str, Any] = {}
+# Carga en curso por codificación: hilo y hasta cuándo se la espera
+_loads: Dict[str, Tuple[threading.Thread, float]] = {}
+_errors: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def load_timeout() -> float:
+    """
+    Segundos que se espera a tiktoken desde que empieza a cargar
+    (TOKENIZER_LOAD_TIMEOUT); la descarga del BPE no tiene timeout propio.
+    """
+    return float(os.getenv("TOKENIZER_LOAD_TIMEOUT", "5"))
+
+
+def _load(name: str) -> None:
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding(name)
+    except Exception as e:
+        encoding = None
+        _errors[name] = str(e) or type(e).__name__
+    _encodings[name] = encoding
+
+
+def encoding_name() -> str:
+    """
+    Codificación configurada (TOKENIZER_ENCODING, por defecto la de los
+    modelos gpt-4o/gpt-5).
+    """
+    return os.getenv("TOKENIZER_ENCODING", DEFAULT_ENCODING)
+
+
+def get_encoding(name: Optional[str] = None, block: bool = False) -> Any:
+    """
+    Tokenizador de tiktoken compartido (por defecto `encoding_name()`). Se
+    carga una sola vez por proceso en un hilo aparte: quien lo pide espera
+    como mucho hasta `load_timeout()` segundos después de iniciada la carga,
+    o hasta que termine con `block` (el chunking no puede depender de cuánto
+    tardó la descarga). None mientras sigue cargando pasado ese plazo, o si
+    tiktoken no está instalado o no puede cargar la codificación (sin red ni
+    TIKTOKEN_CACHE_DIR).
+    """
+    name = name or encoding_name()
+    if name in _encodings:
+        return _encodings[name]
+    with _lock:
+        if name not in _loads:
+            thread = threading.Thread(
+                target=_load, args=(name,), name=f"tiktoken-{name}", daemon=True
+            )
+            _loads[name] = (thread, time.monotonic() + load_timeout())
+            thread.start()
+        thread, deadline = _loads[name]
+    thread.join(None if block else max(0.0, deadline - time.monotonic()))
+    return _encodings.get(name)
+
+
+def warm_up(name: Optional[str] = None) -> float:
+    """
+    Carga la codificación para que la primera petición no la descargue.
+    Devuelve los segundos que tardó; RuntimeError si los tokens se contarán
+    con la aproximación.
+    """
+    start = time.perf_counter()
+    name = name or encoding_name()
+    if get_encoding(name) is None:
+        reason = _errors.get(name, f"sin cargar tras {load_timeout():g} s")
+        raise RuntimeError(f"{name}: {reason}; se usa una aproximación")
+    return time.perf_counter() - start
+
+
+def clear_encodings() -> None:
+    """
+    Olvida las codificaciones cargadas (la próxima llamada las vuelve a cargar).
+    """
+    with _lock:
+        _encodings.clear()
+        _loads.clear()
+        _errors.clear()
+
+
+def count_tokens(text: str) -> int:
+    """
+    Tokens de `text` según el tokenizador del modelo (o una aproximación).
+    """
+    enc = get_encoding()
+    metrics.TOKEN_COUNTS.inc(method="approx" if enc is None else "tiktoken")
+    if enc is None:
+        return len(_APPROX_TOKEN.findall(text))
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Prefijo de `text` con a lo sumo `max_tokens` tokens.
+    """
+    enc = get_encoding()
+    metrics.TOKEN_COUNTS.inc(method="approx" if enc is None else "tiktoken")
+    if enc is None:
+        ends = [m.end() for m in _APPROX_TOKEN.finditer(text)]
+        if len(ends) <= max_tokens:
+            return text
+        return text[: ends[max_tokens - 1]] if max_tokens > 0 else ""
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens])
+
+
+@dataclass
+class Span:
+    """
+    Tramo contiguo de contexto: `members` son las posiciones (en el orden de
+    relevancia) de los fragmentos recuperados que lo forman.
+    """
+
+    text: str
+    members: List[int]
+    group: Optional[str] = None
+    start: int = -1
+    end: int = -1
+
+    @property
+    def rank(self) -> int:
+        return min(self.members)
+
+
+@dataclass
+class PackedContext:
+    """
+    Resultado del empaquetado: tramos en orden de relevancia y tokens de los
+    fragmentos recuperados frente a los que llegan al prompt.
+    """
+
+    spans: List[Span] = field(default_factory=list)
+    retrieved_tokens: int = 0
+    packed_tokens: int = 0
+
+    @property
+    def texts(self) -> List[str]:
+        return [s.text for s in self.spans]
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.retrieved_tokens - self.packed_tokens)
+
+    def to_dict(self) -> dict:
+        return {
+            "retrieved": self.retrieved_tokens,
+            "packed": self.packed_tokens,
+            "saved": self.saved_tokens,
+        }
+
+
+def _overlap(a: str, b: str, min_chars: int = MIN_OVERLAP_CHARS) -> int:
+    """
+    Longitud del sufijo más largo de `a` que es prefijo de `b` (0 si es menor
+    que `min_chars`).
+    """
+    if len(a) < min_chars or len(b) < min_chars:
+        return 0
+    probe = b[:min_chars]
+    pos = a.find(probe)
+    while pos >= 0:
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        pos = a.find(probe, pos + 1)
+    return 0
+
+
+def _merge_located(text: str, spans: List[Span]) -> List[Span]:
+    """
+    Une los tramos que se solapan o solo están separados por espacios en
+    blanco, usando su posición en el texto del documento.
+    """
+    merged: List[Span] = []
+    for span in sorted(spans, key=lambda s: (s.start, s.end)):
+        last = merged[-1] if merged else None
+        # Solapados (tramo vacío entre ambos) o contiguos salvo espacios
+        if last and not text[last.end : span.start].strip():
+            last.end = max(last.end, span.end)
+            last.members += span.members
+            last.text = text[last.start : last.end]
+        else:
+            merged.append(span)
+    return merged
+
+
+def _merge_by_overlap(spans: List[Span]) -> List[Span]:
+    """
+    Une tramos del mismo grupo cuando el final de uno es el comienzo del otro
+    (el solapamiento que deja el chunking), sin conocer sus posiciones.
+    """
+    merged: List[Span] = []
+    pending = list(spans)
+    while pending:
+        span = pending.pop(0)
+        joined = True
+        while joined:
+            joined = False
+            for other in pending:
+                if other.group != span.group:
+                    continue
+                after = _overlap(span.text, other.text)
+                before = 0 if after else _overlap(other.text, span.text)
+                if after:
+                    span.text += other.text[after:]
+                elif before:
+                    span.text = other.text + span.text[before:]
+                else:
+                    continue
+                span.members += other.members
+                pending.remove(other)
+                joined = True
+                break
+        merged.append(span)
+    return merged
+
+
+def _shingles(text: str, n: int = 3) -> Set[Tuple[str, ...]]:
+    words = normalize_question(text).split()
+    if len(words) < n:
+        return {tuple(words)}
+    return {tuple(words[i : i + n]) for i in range(len(words) - n + 1)}
+
+
+def _drop_near_duplicates(spans: List[Span], threshold: float) -> List[Span]:
+    """
+    Descarta los tramos cuyos trigramas de palabras ya están (en proporción
+    `threshold` o más) en un tramo más relevante.
+    """
+    kept: List[Tuple[Span, Set[Tuple[str, ...]]]] = []
+    for span in spans:
+        grams = _shingles(span.text)
+        duplicate = any(
+            len(grams & other) >= threshold * len(grams) for _, other in kept
+        )
+        if not duplicate:
+            kept.append((span, grams))
+    return [span for span, _ in kept]
+
+
+def pack_contexts(
+    contexts: List[str],
+    text: Optional[str] = None,
+    budget: int = 0,
+    groups: Optional[Sequence[Optional[str]]] = None,
+    dedupe_threshold: float = 0.9,
+    positions: Optional[Sequence[Optional[Tuple[int, int]]]] = None,
+) -> PackedContext:
+    """
+    Etapa entre la recuperación y el prompt:
+    1. une los fragmentos adyacentes o solapados en tramos contiguos (por su
+       posición en `text` o, sin texto, por el solapamiento entre fragmentos
+       del mismo `groups[i]`, p. ej. el archivo en modo corpus). Con
+       `positions` (offsets de cada fragmento, p. ej. de los ChunkRecords
+       del índice) no se buscan en el texto;
+    2. descarta tramos casi duplicados;
+    3. llena `budget` tokens (0 = sin límite) en orden de relevancia,
+       recortando un tramo si no cabe entero y queda espacio suficiente.
+    `contexts` viene ordenado por relevancia.
+    """
+    groups = list(groups) if groups is not None else [None] * len(contexts)
+    spans: List[Span] = []
+    located: List[Span] = []
+    for i, chunk in enumerate(contexts):
+        span = Span(text=chunk, members=[i], group=groups[i])
+        if positions is not None:
+            bounds = positions[i] if text else None
+        else:
+            pos = text.find(chunk) if text and chunk else -1
+            bounds = (pos, pos + len(chunk)) if pos >= 0 else None
+        if bounds is not None:
+            span.start, span.end = bounds
+            located.append(span)
+        else:
+            spans.append(span)
+    spans = _merge_by_overlap(spans) + _merge_located(text or "", located)
+    spans = _drop_near_duplicates(sorted(spans, key=lambda s: s.rank), dedupe_threshold)
+
+    packed = PackedContext(retrieved_tokens=sum(count_tokens(c) for c in contexts))
+    remaining = budget
+    for span in spans:
+        tokens = count_tokens(span.text)
+        if budget > 0 and tokens > remaining:
+            if remaining < MIN_PARTIAL_TOKENS and packed.spans:
+                continue
+            span.text = truncate_tokens(span.text, remaining)
+            tokens = count_tokens(span.text)
+            if not span.text.strip():
+                continue
+        packed.spans.append(span)
+        packed.packed_tokens += tokens
+        remaining -= tokens
+    return packed
@@ -0,0 +1,180 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+import hashlib
+import threading
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+from .chunker import locate_chunks
+from .index_registry import DocumentIndex
+from .loader import PageSpan
+from .vector_index import FLAT, build_vector_index, index_nbytes, search_params
+
+
+@dataclass(frozen=True)
+class ChunkSource:
+    """
+    Origen de un chunk del corpus: archivo, hash del documento y página (1-based).
+    """
+
+    filename: str
+    document_id: str
+    page: int
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+def chunk_pages(text: str, chunks: List[str], pages: List[PageSpan]) -> List[int]:
+    """
+    Página de cada chunk ubicándolo en el texto (ver `locate_chunks`); los
+    índices construidos aquí ya traen las páginas en `DocumentIndex.records`.
+    """
+    return locate_chunks(text, chunks, pages).pages.tolist()
+
+
+class CorpusIndex:
+    """
+    Índice único sobre varios documentos: BM25 disperso y FAISS con todos los
+    chunks, fusionados con RRF. Cada chunk conserva su archivo y página, y el
+    filtro por archivos se aplica dentro de la búsqueda (máscara en BM25 y
+    selector de ids en FAISS) sin reconstruir nada.
+    """
+
+    def __init__(
+        self,
+        documents: Sequence[Tuple[str, DocumentIndex]],
+        fetch_k: int = 20,
+        rrf_k: int = 60,
+        index_type: str = FLAT,
+    ):
+        self.fetch_k = fetch_k
+        self.rrf_k = rrf_k
+        self.filenames = [name for name, _ in documents]
+        self.chunks: List[str] = []
+        self.sources: List[ChunkSource] = []
+        self.ranges: List[Tuple[int, int]] = []
+        self.embedder: Any = None
+        self.index: Any = None
+
+        h = hashlib.sha256()
+        dense: List[Tuple[int, np.ndarray]] = []
+        for name, doc in documents:
+            start = len(self.chunks)
+            doc_hash = doc.key.doc_hash if doc.key else ""
+            h.update(f"{name}\x1f{doc_hash}\x1e".encode("utf-8"))
+            pages = doc.chunk_records().pages.tolist()
+            self.chunks.extend(doc.chunks)
+            self.sources.extend(ChunkSource(name, doc_hash, p) for p in pages)
+            self.ranges.append((start, len(self.chunks)))
+            vs = getattr(doc.retriever, "vectorstore", None)
+            if vs is not None and vs.index.ntotal == len(doc.chunks):
+                # Se copian los vectores ya calculados: no se vuelve a embeber
+                dense.append((start, vs.index.reconstruct_n(0, vs.index.ntotal)))
+                self.embedder = self.embedder or vs.embeddings
+        self.fingerprint = h.hexdigest()
+        # Importado aquí: cargar este módulo no debe traer scipy ni langchain
+        from .hybrid_retriever import SparseBM25
+
+        self.bm25 = SparseBM25(self.chunks)
+        if dense and self.embedder is not None:
+            # Con ids explícitos un documento sin vectores no desalinea al resto
+            ids = np.concatenate(
+                [np.arange(s, s + len(v), dtype=np.int64) for s, v in dense]
+            )
+            vectors = np.concatenate([v for _, v in dense])
+            self.index = build_vector_index(vectors, index_type, ids=ids)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def nbytes(self) -> int:
+        size = sum(len(c) for c in self.chunks) + self.bm25.nbytes
+        if self.index is not None:
+            size += index_nbytes(self.index)
+        return size
+
+    def _allowed(self, filenames: Optional[List[str]]) -> Optional[np.ndarray]:
+        """
+        Posiciones de los chunks de los archivos pedidos (None = todos).
+        """
+        if filenames is None:
+            return None
+        wanted = set(filenames)
+        ids = [
+            np.arange(start, end, dtype=np.int64)
+            for name, (start, end) in zip(self.filenames, self.ranges)
+            if name in wanted
+        ]
+        return np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+
+    def _lexical(self, query: str, fetch: int, allowed: Optional[np.ndarray]):
+        from .hybrid_retriever import top_k
+
+        scores = self.bm25.scores([query])[0]
+        if allowed is not None:
+            masked = np.zeros_like(scores)
+            masked[allowed] = scores[allowed]
+            scores = masked
+        return top_k(scores, fetch)
+
+    def _dense(self, query: str, fetch: int, allowed: Optional[np.ndarray]):
+        if self.index is None:
+            return []
+        import faiss
+
+        params = None
+        if allowed is not None:
+            params = search_params(self.index, faiss.IDSelectorBatch(allowed))
+        vector = np.asarray([self.embedder.embed_query(query)], dtype=np.float32)
+        _, ids = self.index.search(vector, fetch, params=params)
+        return [int(i) for i in ids[0] if i >= 0]
+
+    def search(
+        self, query: str, k: int, filenames: Optional[List[str]] = None
+    ) -> List[Tuple[str, ChunkSource]]:
+        """
+        Devuelve los `k` chunks más relevantes con su origen, opcionalmente
+        solo de los archivos en `filenames`.
+        """
+        from .hybrid_retriever import reciprocal_rank_fusion
+
+        allowed = self._allowed(filenames)
+        if not self.chunks or (allowed is not None and not len(allowed)):
+            return []
+        fetch = max(self.fetch_k, k)
+        rankings = [
+            self._lexical(query, fetch, allowed),
+            self._dense(query, fetch, allowed),
+        ]
+        fused = reciprocal_rank_fusion([r for r in rankings if r], self.rrf_k)
+        return [(self.chunks[i], self.sources[i]) for i in fused[:k]]
+
+
+class CorpusCache:
+    """
+    Guarda el último índice de corpus construido. La clave incluye el hash de
+    cada documento, así que subir, cambiar o borrar un archivo lo invalida.
+    """
+
+    def __init__(self):
+        self._key: Optional[Hashable] = None
+        self._corpus: Optional[CorpusIndex] = None
+        self._lock = threading.Lock()
+
+    def get_or_build(
+        self, key: Hashable, builder: Callable[[], CorpusIndex]
+    ) -> CorpusIndex:
+        with self._lock:
+            if self._corpus is None or self._key != key:
+                self._corpus = builder()
+                self._key = key
+            return self._corpus
+
+    def clear(self) -> None:
+        with self._lock:
+            self._key = self._corpus = None
+
+
+corpus_cache = CorpusCache()
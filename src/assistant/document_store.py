@@ -0,0 +1,240 @@
+from typing import BinaryIO, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from .index_registry import file_sha256
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se sincronizan los hilos del proceso
+    fcntl = None
+
+COPY_CHUNK = 1 << 20
+DIGEST_RE = re.compile(r"[0-9a-f]{64}")
+# Archivos propios del almacén en la raíz
+RESERVED = {"names.json", "orphans.json", ".lock"}
+
+
+class UploadTooLarge(ValueError):
+    """
+    El archivo supera el tamaño máximo permitido.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"El archivo supera el máximo de {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class StoredFile:
+    """
+    Resultado de guardar un archivo:
+    - digest: SHA-256 del contenido (es el document_id)
+    - previous: digest que tenía antes ese nombre, si lo había
+    - duplicate: el contenido ya estaba guardado (no se escribió de nuevo)
+    """
+
+    filename: str
+    digest: str
+    path: Path
+    size: int
+    previous: Optional[str] = None
+    duplicate: bool = False
+
+
+class DocumentStore:
+    """
+    Archivos subidos guardados por contenido:
+    - blobs/<sha256><ext>: un único archivo por contenido
+    - names.json: nombre del cliente -> blob
+    - orphans.json: blobs a los que ya no apunta ningún nombre -> desde cuándo
+    Subir el mismo contenido con otro nombre no vuelve a escribirlo ni a
+    indexarlo. Los archivos sueltos en la raíz (subidas anteriores) se siguen
+    encontrando por nombre.
+
+    Un blob sin nombre se borra pasados `gc_grace` segundos (en un `save`
+    posterior), para no quitarle el archivo a una petición que aún usa su
+    document_id; con 0 se borra en el mismo `save`.
+    """
+
+    def __init__(self, root: str, gc_grace: float = 0.0):
+        self.root = Path(root)
+        self.gc_grace = gc_grace
+        self._lock = threading.Lock()
+
+    @property
+    def blobs(self) -> Path:
+        return self.root / "blobs"
+
+    @property
+    def _names_file(self) -> Path:
+        return self.root / "names.json"
+
+    def _names(self) -> Dict[str, str]:
+        try:
+            return json.loads(self._names_file.read_text("utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _write_names(self, names: Dict[str, str]) -> None:
+        self._write_json(self._names_file, names)
+
+    def _write_json(self, path: Path, data: Dict) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+
+    def _collect_orphans(self, names: Dict[str, str], dropped: Optional[str]) -> None:
+        """
+        Anota `dropped` si ya no tiene nombre y borra los blobs sin nombre
+        desde hace más de `gc_grace` segundos. Se llama con el lock tomado.
+        """
+        path = self.root / "orphans.json"
+        try:
+            orphans = json.loads(path.read_text("utf-8"))
+        except (OSError, ValueError):
+            orphans = {}
+        before = dict(orphans)
+        now = time.time()
+        referenced = set(names.values())
+        if dropped and dropped not in referenced:
+            orphans.setdefault(dropped, now)
+        for blob, since in list(orphans.items()):
+            if blob in referenced:
+                # Se volvió a subir el mismo contenido
+                del orphans[blob]
+            elif now - since >= self.gc_grace:
+                (self.blobs / blob).unlink(missing_ok=True)
+                del orphans[blob]
+        if orphans != before:
+            self._write_json(path, orphans)
+
+    def digest_of(self, filename: str) -> Optional[str]:
+        """
+        SHA-256 del contenido guardado con ese nombre (sin releer el archivo).
+        """
+        blob = self._names().get(filename)
+        return Path(blob).stem if blob else None
+
+    def path_for_digest(self, digest: str) -> Optional[Path]:
+        """
+        Blob con ese contenido, si está guardado.
+        """
+        if not DIGEST_RE.fullmatch(digest or "") or not self.blobs.is_dir():
+            return None
+        return next(iter(sorted(self.blobs.glob(digest + ".*"))), None)
+
+    def resolve(self, filename: str) -> Optional[Path]:
+        """
+        Ruta del archivo subido con ese nombre (blob o archivo suelto antiguo).
+        """
+        blob = self._names().get(filename)
+        if blob and (self.blobs / blob).is_file():
+            return self.blobs / blob
+        legacy = self.root / Path(filename).name
+        return legacy if legacy.is_file() else None
+
+    def documents(self) -> List[Tuple[str, Path]]:
+        """
+        (nombre, ruta) de todos los archivos subidos, ordenados por nombre.
+        """
+        docs = {
+            name: self.blobs / blob
+            for name, blob in self._names().items()
+            if (self.blobs / blob).is_file()
+        }
+        if self.root.is_dir():
+            for path in self.root.iterdir():
+                if (
+                    path.is_file()
+                    and path.name not in docs
+                    and path.name not in RESERVED
+                ):
+                    docs[path.name] = path
+        return sorted(docs.items())
+
+    def save(
+        self, filename: str, src: BinaryIO, max_bytes: Optional[int] = None
+    ) -> StoredFile:
+        """
+        Copia `src` por bloques calculando su SHA-256 a la vez y corta en cuanto
+        supera `max_bytes` (UploadTooLarge). Si el contenido ya existía solo se
+        actualiza el nombre. Bloqueante: se llama fuera del event loop.
+
+        La comprobación de duplicado, la escritura del blob y el cambio de
+        nombres van bajo el mismo lock que la limpieza de blobs sin nombre,
+        así un blob no se borra entre que otra subida lo da por existente y
+        le asigna su nombre.
+        """
+        filename = Path(filename).name
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.blobs, suffix=".part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = src.read(COPY_CHUNK)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise UploadTooLarge(max_bytes)
+                    digest.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        blob = digest.hexdigest() + Path(filename).suffix.lower()
+        path = self.blobs / blob
+
+        with self._lock:
+            lock_file = open(self.root / ".lock", "a")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                duplicate = path.exists()
+                if duplicate:
+                    os.unlink(tmp)
+                else:
+                    os.replace(tmp, path)
+                names = self._names()
+                previous = names.get(filename)
+                names[filename] = blob
+                self._write_names(names)
+                if previous != blob:
+                    self._collect_orphans(names, previous)
+                previous_digest = Path(previous).stem if previous else None
+                legacy = self.root / filename
+                if legacy.is_file() and filename not in RESERVED:
+                    # Subida anterior guardada por nombre: la reemplaza el blob
+                    previous_digest = previous_digest or file_sha256(str(legacy))
+                    legacy.unlink()
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+            finally:
+                lock_file.close()
+        return StoredFile(
+            filename=filename,
+            digest=Path(blob).stem,
+            path=path,
+            size=size,
+            previous=previous_digest,
+            duplicate=duplicate,
+        )
+
+
+document_store = DocumentStore(
+    os.getenv("UPLOAD_DIR", "uploads"),
+    gc_grace=float(os.getenv("UPLOAD_GC_SECONDS", "600")),
+)
@@ -0,0 +1,205 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se sincronizan los hilos del proceso
+    fcntl = None
+
+KEY_BYTES = 32
+
+
+def text_key(text: str) -> bytes:
+    """
+    Clave de un chunk: SHA-256 de su texto.
+    """
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class ModelEmbeddings:
+    """
+    Embeddings de un modelo en disco, solo de escritura al final:
+    - vectors.f32: matriz float32 (fila i = vector i) leída con mmap
+    - keys.bin: hash de 32 bytes del chunk de cada fila (índice hash -> fila)
+    - meta.json: modelo y dimensión
+    Varios procesos pueden añadir a la vez: cada escritura toma un flock y
+    antes relee lo que otros hayan añadido.
+    """
+
+    def __init__(self, path: Path, model: str):
+        self.path = path
+        self.model = model
+        self.dim: Optional[int] = None
+        self._rows: Dict[bytes, int] = {}
+        self._count = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._sync()
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path / "vectors.f32"
+
+    @property
+    def _keys_file(self) -> Path:
+        return self.path / "keys.bin"
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _sync(self) -> None:
+        """
+        Incorpora las filas que otros procesos hayan añadido desde la última lectura.
+        """
+        if self.dim is None:
+            try:
+                meta = json.loads((self.path / "meta.json").read_text("utf-8"))
+                self.dim = int(meta["dim"])
+            except (OSError, ValueError, KeyError):
+                return
+        try:
+            keys = self._keys_file.read_bytes()
+            vec_rows = self._vectors_file.stat().st_size // (4 * self.dim)
+        except OSError:
+            return
+        # Una escritura interrumpida puede dejar claves sin vector: se ignoran
+        rows = min(len(keys) // KEY_BYTES, vec_rows)
+        for i in range(self._count, rows):
+            self._rows.setdefault(keys[i * KEY_BYTES : (i + 1) * KEY_BYTES], i)
+        if rows != self._count:
+            self._count = rows
+            self._matrix = None
+
+    def _vectors(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.memmap(
+                self._vectors_file,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._count, self.dim),
+            )
+        return self._matrix
+
+    def get(self, keys: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """
+        Vector guardado de cada clave o None si no está.
+        """
+        with self._lock:
+            if any(k not in self._rows for k in keys):
+                self._sync()
+            if not self._count:
+                return [None] * len(keys)
+            matrix = self._vectors()
+            return [
+                np.array(matrix[self._rows[k]]) if k in self._rows else None
+                for k in keys
+            ]
+
+    def add(self, keys: Sequence[bytes], vectors: np.ndarray) -> None:
+        """
+        Añade vectores al final (las claves ya presentes se omiten).
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            lock_file = open(self.path / ".lock", "a")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._sync()
+                if self.dim is None:
+                    self.dim = int(vectors.shape[1])
+                    meta = {"model": self.model, "dim": self.dim}
+                    (self.path / "meta.json").write_text(json.dumps(meta), "utf-8")
+                new = {}
+                for k, v in zip(keys, vectors):
+                    if k not in self._rows and k not in new:
+                        new[k] = v
+                if not new:
+                    return
+                # Primero los vectores y luego las claves: una clave siempre
+                # apunta a un vector completo
+                with open(self._vectors_file, "ab") as f:
+                    f.write(np.stack(list(new.values())).tobytes())
+                with open(self._keys_file, "ab") as f:
+                    f.write(b"".join(new))
+                self._sync()
+            finally:
+                lock_file.close()
+
+
+class EmbeddingCache:
+    """
+    Caché persistente de embeddings por (modelo, hash del texto del chunk).
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._models: Dict[str, ModelEmbeddings] = {}
+        self._lock = threading.Lock()
+
+    def for_model(self, model: str) -> ModelEmbeddings:
+        with self._lock:
+            store = self._models.get(model)
+            if store is None:
+                name = hashlib.sha1(model.encode("utf-8")).hexdigest()[:12]
+                store = ModelEmbeddings(self.root / name, model)
+                self._models[model] = store
+            return store
+
+    def embed(
+        self,
+        model: str,
+        texts: List[str],
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        batch_size: int = 64,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Tuple[np.ndarray, int, int]:
+        """
+        Devuelve los vectores de `texts` embebiendo solo los que no estén en
+        caché. Resultado: (matriz, reutilizados, embebidos).
+        `progress(hechos, total)` cuenta también los reutilizados.
+        """
+        store = self.for_model(model)
+        keys = [text_key(t) for t in texts]
+        found = store.get(keys)
+        missing: Dict[bytes, List[int]] = {}
+        for i, (k, v) in enumerate(zip(keys, found)):
+            if v is None:
+                missing.setdefault(k, []).append(i)
+        reused = len(texts) - sum(len(rows) for rows in missing.values())
+        if progress:
+            progress(reused, len(texts))
+
+        pending = list(missing.items())
+        done = reused
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start : start + batch_size]
+            vectors = np.asarray(
+                embed_fn([texts[rows[0]] for _, rows in batch]), dtype=np.float32
+            )
+            store.add([k for k, _ in batch], vectors)
+            for (_, rows), v in zip(batch, vectors):
+                for i in rows:
+                    found[i] = v
+                done += len(rows)
+            if progress:
+                progress(done, len(texts))
+
+        matrix = np.stack(found) if found else np.zeros((0, 0), dtype=np.float32)
+        return matrix, reused, len(pending)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+
+embedding_cache = EmbeddingCache(
+    os.getenv("EMBED_CACHE_DIR", os.path.join("uploads", ".embeddings"))
+)
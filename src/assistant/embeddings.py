@@ -0,0 +1,131 @@
+from typing import Any, Dict, List
+import os
+import threading
+import time
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+_embedders: Dict[str, Any] = {}
+# id(modelo) -> (modelo, agrupador de sus consultas)
+_query_embedders: Dict[int, Any] = {}
+_lock = threading.Lock()
+
+
+def embed_batch_size() -> int:
+    """
+    Tamaño de lote para codificar con sentence-transformers (EMBED_BATCH_SIZE).
+    """
+    return int(os.getenv("EMBED_BATCH_SIZE", "32"))
+
+
+def embed_threads() -> int:
+    """
+    Hilos de torch para inferencia en CPU (EMBED_THREADS, 0 = valor por defecto).
+    """
+    return int(os.getenv("EMBED_THREADS", "0"))
+
+
+def query_batch_size() -> int:
+    """
+    Preguntas por lote al embeber consultas (EMBED_QUERY_BATCH, 0 = sin agrupar).
+    """
+    return int(os.getenv("EMBED_QUERY_BATCH", "32"))
+
+
+def query_batch_wait() -> float:
+    """
+    Espera del primer hilo de un lote, en segundos (EMBED_QUERY_WAIT_MS).
+    """
+    return float(os.getenv("EMBED_QUERY_WAIT_MS", "2")) / 1000
+
+
+def query_cache_size() -> int:
+    """
+    Vectores de preguntas recientes que se conservan (EMBED_QUERY_CACHE).
+    """
+    return int(os.getenv("EMBED_QUERY_CACHE", "1024"))
+
+
+def get_embedder(model_name: str = DEFAULT_MODEL):
+    """
+    Devuelve el modelo de embeddings compartido por todo el proceso.
+    Se carga una sola vez por nombre de modelo, aunque haya llamadas concurrentes.
+    """
+    embedder = _embedders.get(model_name)
+    if embedder is not None:
+        return embedder
+    with _lock:
+        embedder = _embedders.get(model_name)
+        if embedder is None:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+
+            threads = embed_threads()
+            if threads > 0:
+                import torch
+
+                torch.set_num_threads(threads)
+            embedder = HuggingFaceEmbeddings(
+                model_name=model_name,
+                encode_kwargs={"batch_size": embed_batch_size()},
+            )
+            _embedders[model_name] = embedder
+    return embedder
+
+
+def query_embedder(embedder):
+    """
+    Envuelve un modelo para que las consultas concurrentes se codifiquen en
+    lotes (ver `QueryBatcher`). Hay un solo agrupador por modelo, así que
+    todos los índices que lo usan comparten lotes y caché.
+    """
+    from .query_batcher import QueryBatcher
+
+    if isinstance(embedder, QueryBatcher) or query_batch_size() <= 0:
+        return embedder
+    entry = _query_embedders.get(id(embedder))
+    if entry is not None:
+        return entry[1]
+    with _lock:
+        entry = _query_embedders.get(id(embedder))
+        if entry is None:
+            batcher = QueryBatcher(
+                embedder,
+                max_batch=query_batch_size(),
+                max_wait=query_batch_wait(),
+                cache_size=query_cache_size(),
+            )
+            entry = _query_embedders[id(embedder)] = (embedder, batcher)
+    return entry[1]
+
+
+def warm_up(model_name: str = DEFAULT_MODEL) -> float:
+    """
+    Carga el modelo y ejecuta una codificación de prueba.
+    Devuelve los segundos que tardó.
+    """
+    start = time.perf_counter()
+    get_embedder(model_name).embed_query("warm-up")
+    return time.perf_counter() - start
+
+
+def is_loaded(model_name: str = DEFAULT_MODEL) -> bool:
+    """
+    Indica si el modelo ya está cargado en memoria.
+    """
+    return model_name in _embedders
+
+
+def loaded_models() -> List[str]:
+    """
+    Nombres de los modelos cargados en el proceso.
+    """
+    return list(_embedders)
+
+
+def clear_embedders() -> None:
+    """
+    Descarga todos los modelos (útil en tests).
+    """
+    with _lock:
+        _embedders.clear()
+        _query_embedders.clear()
@@ -1,14 +1,46 @@
-from typing import Dict, List, Annotated, TypedDict, Union
-import operator
-from langgraph.graph import StateGraph, END
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+from typing import Any, Dict, List, Annotated, Optional, TypedDict, Union
+import asyncio
+import inspect
+import threading
+import weakref
+from langchain_core.messages import (
+    HumanMessage,
+    AIMessage,
+    BaseMessage,
+    RemoveMessage,
+)
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from . import metrics
+from .answer_cache import BYPASS
+from .context_packing import count_tokens, truncate_tokens
+
+# Tokens máximos del historial de una sesión (mensajes + resumen)
+HISTORY_TOKENS = 1000
+
+
+def merge_messages(left: List[BaseMessage], right: List[BaseMessage]):
+    """
+    Reducer de `messages`: agrega mensajes y aplica los RemoveMessage con los
+    que se recorta el historial (langgraph se importa solo al usarlo).
+    """
+    from langgraph.graph.message import add_messages
+
+    return add_messages(left, right)
 
 
 # Definir el estado del grafo
-class AgentState(TypedDict):
-    messages: Annotated[List[BaseMessage], operator.add]
+class AgentState(TypedDict, total=False):
+    messages: Annotated[List[BaseMessage], merge_messages]
     context: str
     current_doc_path: str
+    # Sesiones: resumen de los turnos recortados y último contexto recuperado
+    summary: str
+    doc_hash: Optional[str]
+    retrieved: List[str]
+    contexts: List[str]
+    # Resultado del último turno (contexto usado, caché, tokens)
+    result: Dict
 
 
 # Nodo: Verificar Documento
@@ -22,7 +54,8 @@ def check_document(state: AgentState) -> Dict:
                 AIMessage(
                     content="⚠️ **Atención:** Para poder responder a tus preguntas, primero debes cargar un documento (PDF o TXT) en la barra lateral."
                 )
-            ]
+            ],
+            "result": {"context_used": []},
         }
 
     # Para evitar el error "Must write to at least one of...", actualizamos context con su mismo valor
@@ -31,63 +64,311 @@ def check_document(state: AgentState) -> Dict:
     return {"context": state.get("context", "")}
 
 
-# Nodo: Generar Respuesta RAG
-def generate_rag_response(state: AgentState) -> Dict:
-    """Genera respuesta usando RAG si hay documento."""
-    from src.assistant.rag_pipeline import answer_question, RAGConfig
+def history_text(messages: List[BaseMessage], summary: str = "") -> str:
+    """
+    Conversación previa de la sesión como texto para el prompt.
+    """
+    lines = [f"Preguntas anteriores:\n{summary}"] if summary else []
+    for m in messages:
+        who = "Usuario" if isinstance(m, HumanMessage) else "Asistente"
+        lines.append(f"{who}: {m.content}")
+    return "\n".join(lines)
 
-    last_message = state["messages"][-1]
-    if not isinstance(last_message, HumanMessage):
-        # Si el último mensaje no es humano, no generamos nada nuevo,
-        # pero retornamos un dict vacío para cumplir el contrato.
-        # Ojo: LangGraph puede quejarse si no hay updates.
-        # En este flujo lineal, siempre debería ser humano al llegar aquí.
-        return {"messages": []}
 
-    query = last_message.content
-    doc_path = state["current_doc_path"]
+def trim_history(
+    messages: List[BaseMessage], summary: str, reply: str, max_tokens: int
+) -> Dict:
+    """
+    Si el historial (con la respuesta nueva) supera `max_tokens`, quita los
+    mensajes más antiguos y conserva sus preguntas en `summary`, que a su vez
+    se acota a una cuarta parte del presupuesto (las preguntas más recientes).
+    Siempre se mantiene la última pregunta.
+    """
+    total = count_tokens(summary) + count_tokens(reply)
+    total += sum(count_tokens(m.content) for m in messages)
+    removed: List[BaseMessage] = []
+    lines = summary.splitlines() if summary else []
+    for m in messages[:-1]:
+        if total <= max_tokens:
+            break
+        total -= count_tokens(m.content)
+        removed.append(RemoveMessage(id=m.id))
+        if isinstance(m, HumanMessage):
+            lines.append(f"- {m.content}")
+    if not removed:
+        return {}
+    kept: List[str] = []
+    budget = max_tokens // 4
+    for line in reversed(lines):
+        budget -= count_tokens(line)
+        if budget < 0:
+            break
+        kept.insert(0, line)
+    if not kept and lines:
+        kept = [truncate_tokens(lines[-1], max_tokens // 4)]
+    return {"messages": removed, "summary": "\n".join(kept)}
+
+
+def _turn_inputs(state: AgentState, config: Optional[RunnableConfig]) -> Dict:
+    """
+    Pregunta, configuración RAG, opciones de la sesión, historial y contexto
+    del turno anterior (común al nodo síncrono y al asíncrono).
+    """
+    from src.assistant.rag_pipeline import RAGConfig
+
+    # En una sesión sin documento se conversa en modo general con el historial
+    doc_path = state.get("current_doc_path") or ""
+    options = (config or {}).get("configurable", {})
 
     is_pdf = doc_path.lower().endswith(".pdf")
-    cfg = RAGConfig(
+    cfg = options.get("rag_config") or RAGConfig(
         pdf_path=doc_path if is_pdf else None,
-        text_path=doc_path if not is_pdf else None,
+        text_path=doc_path if doc_path and not is_pdf else None,
         chunk_size=400,
         chunk_overlap=80,
         use_embeddings=True,
     )
+    return {
+        "query": state["messages"][-1].content,
+        "cfg": cfg,
+        "options": options,
+        "history": history_text(state["messages"][:-1], state.get("summary", "")),
+        "previous": {
+            "doc_hash": state.get("doc_hash"),
+            "retrieved": state.get("retrieved"),
+            "context_used": state.get("contexts"),
+        },
+    }
 
-    # Aquí podríamos inyectar el historial de mensajes en el prompt si quisiéramos
-    # Por ahora, usamos la pregunta directa
-    result = answer_question(query, cfg)
 
-    response_text = result.get("answer", "No se pudo generar una respuesta.")
-    context_used = result.get("context_used", [])
+def _turn_update(
+    state: AgentState, prepared: Dict, response_text: str, options: Dict
+) -> Dict:
+    """
+    Actualización del estado tras responder: resultado, contexto del turno
+    (para reutilizarlo en el siguiente) e historial recortado al presupuesto.
+    """
+    context_used = prepared.get("context_used", [])
+
+    update: Dict = {
+        "result": {
+            "context_used": context_used,
+            "cache": prepared.get("cache", BYPASS),
+            "context_tokens": prepared.get("context_tokens", {}),
+            "context_reused": prepared.get("context_reused", False),
+        }
+    }
+    if "retrieved" in prepared:
+        # Contexto del turno, para reutilizarlo en el siguiente
+        update.update(
+            doc_hash=prepared.get("doc_hash"),
+            retrieved=prepared["retrieved"],
+            contexts=context_used,
+        )
+    trimmed = trim_history(
+        state["messages"],
+        state.get("summary", ""),
+        response_text,
+        options.get("history_tokens", HISTORY_TOKENS),
+    )
+    update["messages"] = trimmed.get("messages", []) + [
+        AIMessage(content=response_text)
+    ]
+    if "summary" in trimmed:
+        update["summary"] = trimmed["summary"]
 
     # Formatear contexto para mostrarlo
     if context_used:
-        ctx_str = "\n\n".join([f"> {c}" for c in context_used])
         # Guardamos el contexto en el estado por si se necesita después
-        return {"messages": [AIMessage(content=response_text)], "context": ctx_str}
+        update["context"] = "\n\n".join([f"> {c}" for c in context_used])
+    return update
+
+
+# Nodo: Generar Respuesta RAG
+def generate_rag_response(state: AgentState, config: RunnableConfig = None) -> Dict:
+    """
+    Genera respuesta usando RAG si hay documento. En una sesión (`configurable`
+    con `rag_config`, `llm`, `cache` y `history_tokens`) el prompt incluye el
+    historial, se reutiliza el contexto del turno anterior si la pregunta
+    recupera los mismos chunks y el historial se recorta al presupuesto.
+    """
+    from src.assistant.rag_pipeline import (
+        call_llm_openai,
+        prepare_session_answer,
+        remember_answer,
+    )
+
+    last_message = state["messages"][-1]
+    if not isinstance(last_message, HumanMessage):
+        # Si el último mensaje no es humano, no generamos nada nuevo,
+        # pero retornamos un dict vacío para cumplir el contrato.
+        # Ojo: LangGraph puede quejarse si no hay updates.
+        # En este flujo lineal, siempre debería ser humano al llegar aquí.
+        return {"messages": []}
+
+    turn = _turn_inputs(state, config)
+    options = turn["options"]
+    llm = options.get("llm") or call_llm_openai
+    cache = options.get("cache")
+    prepared = prepare_session_answer(
+        turn["query"], turn["cfg"], turn["history"], turn["previous"], cache
+    )
+    if "answer" in prepared:
+        response_text = prepared["answer"]
+    else:
+        try:
+            response_text = llm(prepared["prompt"])
+            if not turn["history"]:
+                remember_answer(cache, prepared, turn["query"], response_text)
+        except Exception as e:
+            metrics.ERRORS.inc(stage="llm")
+            response_text = f"Ocurrió un error procesando la consulta: {str(e)}"
+    return _turn_update(state, prepared, response_text, options)
 
-    return {"messages": [AIMessage(content=response_text)]}
 
+async def agenerate_rag_response(
+    state: AgentState, config: RunnableConfig = None
+) -> Dict:
+    """
+    `generate_rag_response` para `ainvoke`: la recuperación corre en el
+    `executor` de `configurable` y, sin `llm`, la respuesta se pide con
+    `acall_llm_openai` (cliente asíncrono compartido, plazos, hedging y
+    circuito). `llm` puede devolver texto o un awaitable.
+    """
+    from src.assistant.rag_pipeline import (
+        acall_llm_openai,
+        prepare_session_answer,
+        remember_answer,
+    )
 
-# Construir el grafo
-workflow = StateGraph(AgentState)
+    if not isinstance(state["messages"][-1], HumanMessage):
+        return {"messages": []}
 
-workflow.add_node("check_doc", check_document)
-workflow.add_node("rag", generate_rag_response)
+    turn = _turn_inputs(state, config)
+    options = turn["options"]
+    llm = options.get("llm")
+    cache = options.get("cache")
+    loop = asyncio.get_running_loop()
+    prepared = await loop.run_in_executor(
+        options.get("executor"),
+        metrics.in_context(
+            prepare_session_answer,
+            turn["query"],
+            turn["cfg"],
+            turn["history"],
+            turn["previous"],
+            cache,
+        ),
+    )
+    if "answer" in prepared:
+        response_text = prepared["answer"]
+    else:
+        try:
+            prompt = prepared["prompt"]
+            response_text = llm(prompt) if llm else acall_llm_openai(prompt)
+            if inspect.isawaitable(response_text):
+                response_text = await response_text
+            if not turn["history"]:
+                remember_answer(cache, prepared, turn["query"], response_text)
+        except Exception as e:
+            metrics.ERRORS.inc(stage="llm")
+            response_text = f"Ocurrió un error procesando la consulta: {str(e)}"
+    return _turn_update(state, prepared, response_text, options)
 
 
 # Lógica condicional
 def route_check(state: AgentState):
+    from langgraph.graph import END
+
     if not state.get("current_doc_path"):
         return END
     return "rag"
 
 
-workflow.set_entry_point("check_doc")
-workflow.add_conditional_edges("check_doc", route_check, {END: END, "rag": "rag"})
-workflow.add_edge("rag", END)
+def build_graph(checkpointer=None, require_document: bool = True):
+    """
+    Construye y compila el grafo (langgraph se importa solo aquí).
+    Con `checkpointer` el estado se conserva por `thread_id` (sesión).
+    Sin `require_document` no se pide cargar un documento: las preguntas sin
+    documento van a `rag`, que responde en modo conversación general.
+    """
+    from langgraph.graph import StateGraph, END
+
+    workflow = StateGraph(AgentState)
+
+    # Un mismo nodo para invoke (síncrono) y ainvoke (asíncrono)
+    workflow.add_node(
+        "rag", RunnableLambda(generate_rag_response, afunc=agenerate_rag_response)
+    )
+    if require_document:
+        workflow.add_node("check_doc", check_document)
+        workflow.set_entry_point("check_doc")
+        workflow.add_conditional_edges(
+            "check_doc", route_check, {END: END, "rag": "rag"}
+        )
+    else:
+        workflow.set_entry_point("rag")
+    workflow.add_edge("rag", END)
+
+    return workflow.compile(checkpointer=checkpointer)
+
+
+_graph = None
+_session_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    """
+    Grafo compilado compartido; se compila en el primer uso y no al importar.
+    """
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = build_graph()
+    return _graph
+
+
+def get_session_graph():
+    """
+    Grafo con estado por sesión, respaldado por `session_checkpointer`
+    (LRU con TTL en memoria y, con SESSION_DB, SQLite). Sin documento la
+    sesión sigue en modo conversación general, con su historial.
+    """
+    global _session_graph
+    if _session_graph is None:
+        with _graph_lock:
+            if _session_graph is None:
+                from .sessions import session_checkpointer
+
+                _session_graph = build_graph(
+                    session_checkpointer, require_document=False
+                )
+    return _session_graph
+
+
+# Un turno a la vez por sesión (en este proceso): dos turnos concurrentes
+# leerían el mismo checkpoint y el segundo pisaría al primero
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+async def ainvoke_session(inputs: Dict, config: Dict) -> Dict[str, Any]:
+    """
+    Ejecuta un turno en el grafo de sesiones, serializado por `thread_id`.
+    """
+    thread_id = config["configurable"]["thread_id"]
+    lock = _session_locks.get(thread_id)
+    if lock is None:
+        lock = _session_locks[thread_id] = asyncio.Lock()
+    async with lock:
+        return await get_session_graph().ainvoke(inputs, config)
+
 
-graph = workflow.compile()
+def __getattr__(name: str):
+    # Compatibilidad con `from src.assistant.graph import graph`
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,202 @@
+from typing import Any, Dict, Iterable, List, Optional
+from collections import Counter, defaultdict
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from scipy import sparse
+
+from .answer_cache import normalize_question
+
+
+def bm25_tokens(text: str) -> List[str]:
+    """
+    Términos para BM25: minúsculas, sin tildes ni puntuación.
+    """
+    return normalize_question(text).split()
+
+
+class SparseBM25:
+    """
+    BM25 precalculado como matriz dispersa término-documento: los pesos
+    (idf y normalización por longitud) se calculan al construir, de modo que
+    puntuar una o varias consultas es un único producto de matrices dispersas.
+    """
+
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75):
+        self.vocab: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        tfs: List[int] = []
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+        for i, chunk in enumerate(chunks):
+            counts = Counter(bm25_tokens(chunk))
+            lengths[i] = sum(counts.values())
+            for term, tf in counts.items():
+                rows.append(i)
+                cols.append(self.vocab.setdefault(term, len(self.vocab)))
+                tfs.append(tf)
+
+        n_docs = len(chunks)
+        row = np.asarray(rows, dtype=np.int64)
+        col = np.asarray(cols, dtype=np.int64)
+        tf = np.asarray(tfs, dtype=np.float32)
+        df = np.bincount(col, minlength=len(self.vocab)).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        avgdl = float(lengths.mean()) if n_docs else 0.0
+        norm = k1 * (1 - b + b * lengths[row] / (avgdl or 1.0))
+        weights = idf[col] * tf * (k1 + 1) / (tf + norm)
+        # Filas = términos: una consulta solo toca las filas de sus términos
+        self.term_doc = sparse.csr_matrix(
+            (weights, (col, row)), shape=(len(self.vocab), n_docs), dtype=np.float32
+        )
+
+    @property
+    def nbytes(self) -> int:
+        m = self.term_doc
+        return int(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes)
+
+    def query_matrix(self, queries: Iterable[str]) -> sparse.csr_matrix:
+        """
+        Matriz dispersa consulta-término con la frecuencia de cada término.
+        """
+        rows: List[int] = []
+        cols: List[int] = []
+        n = 0
+        for n, query in enumerate(queries, start=1):
+            for term in bm25_tokens(query):
+                idx = self.vocab.get(term)
+                if idx is not None:
+                    rows.append(n - 1)
+                    cols.append(idx)
+        data = np.ones(len(rows), dtype=np.float32)
+        # Los términos repetidos se suman al convertir a CSR
+        return sparse.csr_matrix(
+            (data, (rows, cols)), shape=(n, len(self.vocab)), dtype=np.float32
+        )
+
+    def scores(self, queries: List[str]) -> np.ndarray:
+        """
+        Puntuaciones BM25 (consultas x documentos) con un solo producto disperso.
+        """
+        return (self.query_matrix(queries) @ self.term_doc).toarray()
+
+    def top(self, query: str, k: int) -> List[int]:
+        """
+        Índices de los `k` chunks con mayor puntuación (solo con puntuación > 0).
+        """
+        return top_k(self.scores([query])[0], k)
+
+
+def top_k(scores: np.ndarray, k: int) -> List[int]:
+    """
+    Posiciones de las `k` puntuaciones positivas más altas, en orden descendente.
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return []
+    idx = np.argpartition(-scores, k - 1)[:k]
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+    return [int(i) for i in idx if scores[i] > 0]
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[int]:
+    """
+    Fusiona rankings con RRF: cada documento suma 1 / (k + posición).
+    """
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            fused[doc] += 1.0 / (k + rank)
+    return sorted(fused, key=lambda d: (-fused[d], d))
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Recuperador híbrido: BM25 disperso + búsqueda vectorial en FAISS,
+    fusionados con reciprocal-rank fusion. Sin vectorstore usa solo BM25.
+    """
+
+    chunks: List[str]
+    bm25: Any
+    vectorstore: Any = None
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def dense_top(self, query: str, k: int) -> List[int]:
+        """
+        Posiciones de los `k` vecinos más cercanos en el índice FAISS.
+        Las filas del índice siguen el orden de `chunks`.
+        """
+        if self.vectorstore is None:
+            return []
+        vector = self.vectorstore.embeddings.embed_query(query)
+        query_vec = np.asarray([vector], dtype=np.float32)
+        _, ids = self.vectorstore.index.search(query_vec, min(k, len(self.chunks)))
+        return [int(i) for i in ids[0] if i >= 0]
+
+    def search_ids(self, query: str, k: Optional[int] = None) -> List[int]:
+        k = k or self.k
+        fetch = max(self.fetch_k, k)
+        rankings = [self.bm25.top(query, fetch), self.dense_top(query, fetch)]
+        fused = reciprocal_rank_fusion([r for r in rankings if r], self.rrf_k)
+        return fused[:k]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: Optional[int] = None,
+        vectors: Optional[np.ndarray] = None,
+    ) -> List[List[int]]:
+        """
+        `search_ids` para varias consultas a la vez: BM25 con un solo producto
+        disperso y FAISS con una sola búsqueda matricial. `vectors` permite
+        pasar los embeddings de las consultas ya calculados.
+        """
+        k = k or self.k
+        fetch = max(self.fetch_k, k)
+        lexical = [top_k(row, fetch) for row in self.bm25.scores(queries)]
+        dense: List[List[int]] = [[] for _ in queries]
+        if self.vectorstore is not None and queries:
+            if vectors is None:
+                vectors = self.vectorstore.embeddings.embed_documents(queries)
+            matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+            _, ids = self.vectorstore.index.search(matrix, min(fetch, len(self.chunks)))
+            dense = [[int(i) for i in row if i >= 0] for row in ids]
+        return [
+            reciprocal_rank_fusion([r for r in (lex, den) if r], self.rrf_k)[:k]
+            for lex, den in zip(lexical, dense)
+        ]
+
+    def search(self, query: str, k: Optional[int] = None) -> List[str]:
+        """
+        Devuelve el texto de los `k` chunks más relevantes.
+        """
+        return [self.chunks[i] for i in self.search_ids(query, k)]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [Document(page_content=c) for c in self.search(query)]
+
+
+def build_hybrid_retriever(
+    chunks: List[str],
+    vectorstore: Any = None,
+    k: int = 4,
+    fetch_k: int = 20,
+    rrf_k: int = 60,
+) -> HybridRetriever:
+    """
+    Construye el recuperador híbrido precalculando la matriz BM25 de los chunks.
+    """
+    return HybridRetriever(
+        chunks=chunks,
+        bm25=SparseBM25(chunks),
+        vectorstore=vectorstore,
+        k=k,
+        fetch_k=fetch_k,
+        rrf_k=rrf_k,
+    )
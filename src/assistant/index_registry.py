@@ -0,0 +1,248 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from . import metrics
+from .context_packing import DEFAULT_ENCODING
+from .loader import PageSpan
+from .singleflight import SingleFlight
+from .vector_index import index_nbytes
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Calcula el hash SHA-256 del contenido de un archivo leyendo por bloques.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+_hash_memo: Dict[str, Tuple[int, int, str]] = {}
+_hash_lock = threading.Lock()
+
+
+def cached_file_sha256(path: str) -> str:
+    """
+    Igual que `file_sha256`, pero reutiliza el hash mientras no cambien
+    la fecha de modificación ni el tamaño del archivo.
+    """
+    st = os.stat(path)
+    with _hash_lock:
+        memo = _hash_memo.get(path)
+    if memo is not None and memo[:2] == (st.st_mtime_ns, st.st_size):
+        return memo[2]
+    digest = file_sha256(path)
+    with _hash_lock:
+        _hash_memo[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+@dataclass(frozen=True)
+class IndexKey:
+    """
+    Clave de un índice: hash del contenido + parámetros de chunking + modelo
+    + tipo de índice vectorial (+ modo híbrido, que comparte en disco los
+    vectores del modo denso) + codificación de tiktoken con la que se corta
+    por tokens.
+    """
+
+    doc_hash: str
+    chunk_size: int
+    chunk_overlap: int
+    embeddings_model: str
+    hybrid: bool = False
+    index_type: str = "flat"
+    tokenizer: str = DEFAULT_ENCODING
+
+
+@dataclass
+class DocumentIndex:
+    """
+    Índice listo para consultas: texto extraído, chunks, recuperador construido
+    y tramos del texto por página. `records` (ChunkRecords) tiene el offset y
+    la página de cada chunk de `chunks`, en el mismo orden. `reused`/`embedded`
+    cuentan los chunks cuyo vector se reutilizó o se calculó al construirlo.
+    """
+
+    key: Optional[IndexKey]
+    text: str
+    chunks: List[str]
+    retriever: Any = None
+    nbytes: int = 0
+    pages: List[PageSpan] = field(default_factory=list)
+    reused: int = 0
+    embedded: int = 0
+    records: Any = None
+    _rows: Optional[Dict[str, int]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def chunk_records(self):
+        """
+        `records`, o si el índice no los trae (guardado sin offsets o armado
+        a mano) los calcula una vez ubicando los chunks en el texto.
+        """
+        if self.records is None or len(self.records) != len(self.chunks):
+            from .chunker import locate_chunks
+
+            self.records = locate_chunks(self.text, self.chunks, self.pages)
+        return self.records
+
+    def spans_of(self, contexts: List[str]) -> List[Optional[Tuple[int, int]]]:
+        """
+        Offsets en `text` de chunks recuperados (None si no es un chunk del índice).
+        """
+        records = self.chunk_records()
+        if self._rows is None:
+            rows: Dict[str, int] = {}
+            for i, chunk in enumerate(self.chunks):
+                rows.setdefault(chunk, i)
+            self._rows = rows
+        out: List[Optional[Tuple[int, int]]] = []
+        for chunk in contexts:
+            i = self._rows.get(chunk)
+            span = records.span(i) if i is not None else None
+            out.append(span if span and span[0] >= 0 else None)
+        return out
+
+
+def estimate_nbytes(text: str, chunks: List[str], retriever: Any) -> int:
+    """
+    Estima la memoria ocupada por un índice (texto, chunks y vectores).
+    """
+    size = len(text) + sum(len(c) for c in chunks)
+    bm25 = getattr(retriever, "bm25", None)
+    if bm25 is not None:
+        size += bm25.nbytes
+    vs = getattr(retriever, "vectorstore", None)
+    index = getattr(vs, "index", None)
+    if index is not None:
+        size += index_nbytes(index)
+    elif retriever is not None and bm25 is None:
+        # BM25 guarda una copia tokenizada de cada chunk
+        size += sum(len(c) for c in chunks) * 2
+    return size
+
+
+class IndexRegistry:
+    """
+    Registro en memoria de índices por documento con expulsión LRU
+    según un presupuesto de memoria.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[IndexKey, DocumentIndex]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._builds = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def get(self, key: IndexKey) -> Optional[DocumentIndex]:
+        """
+        Devuelve el índice para la clave (y lo marca como reciente) o None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, entry: DocumentIndex) -> None:
+        """
+        Guarda un índice expulsando los menos usados hasta respetar el presupuesto.
+        Un índice más grande que todo el presupuesto no se guarda.
+        """
+        if entry.key is None or entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(entry.key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            while self._entries and self._bytes + entry.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+            self._entries[entry.key] = entry
+            self._bytes += entry.nbytes
+
+    def get_or_build(
+        self, key: IndexKey, builder: Callable[[], DocumentIndex]
+    ) -> DocumentIndex:
+        """
+        Devuelve el índice cacheado o lo construye con `builder` y lo registra.
+        Las peticiones concurrentes que necesitan la misma clave esperan a una
+        única construcción en curso en lugar de repetirla.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        def build() -> DocumentIndex:
+            # Pudo terminar otra construcción entre el `get` y este punto
+            with self._lock:
+                done = self._entries.get(key)
+            if done is not None:
+                return done
+            built = builder()
+            self.put(built)
+            return built
+
+        entry, shared = self._builds.do(key, build)
+        if shared:
+            metrics.COALESCED.inc(kind="index")
+            with self._lock:
+                self.coalesced += 1
+        return entry
+
+    def invalidate(self, doc_hash: str) -> int:
+        """
+        Elimina todos los índices de un documento. Devuelve cuántos se eliminaron.
+        """
+        with self._lock:
+            keys = [k for k in self._entries if k.doc_hash == doc_hash]
+            for k in keys:
+                self._bytes -= self._entries.pop(k).nbytes
+            return len(keys)
+
+    def clear(self) -> None:
+        """
+        Vacía el registro y reinicia las estadísticas.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = self.coalesced = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Estadísticas de uso: entradas, memoria, aciertos, fallos, expulsiones
+        y construcciones compartidas entre peticiones concurrentes.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+            }
+
+
+registry = IndexRegistry(
+    max_bytes=int(os.getenv("INDEX_CACHE_MAX_MB", "512")) * 1024 * 1024
+)
@@ -0,0 +1,161 @@
+from typing import Any, List, Optional
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from .context_packing import DEFAULT_ENCODING
+from .index_registry import IndexKey
+from .loader import PageSpan
+
+# Cambiar al modificar el formato en disco: los índices viejos se reconstruyen
+FORMAT_VERSION = 3
+
+
+class IndexStore:
+    """
+    Almacén en disco de índices FAISS direccionado por contenido:
+    `<root>/<doc_hash>/<config>/` con vectores, chunks y metadatos.
+    Los vectores se leen con mmap para que varios workers compartan la page cache.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def path_for(self, key: IndexKey) -> Path:
+        model = hashlib.sha1(key.embeddings_model.encode("utf-8")).hexdigest()[:12]
+        name = f"{key.chunk_size}-{key.chunk_overlap}-{model}"
+        if key.index_type != "flat":
+            name += f"-{key.index_type}"
+        if key.tokenizer != DEFAULT_ENCODING:
+            name += f"-{key.tokenizer}"
+        return self.root / key.doc_hash / name
+
+    def exists(self, key: IndexKey) -> bool:
+        """
+        Indica si hay un índice en disco con el formato vigente.
+        """
+        return self._read_meta(self.path_for(key)) is not None
+
+    def _read_meta(self, path: Path) -> Optional[dict]:
+        try:
+            meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if meta.get("format_version") != FORMAT_VERSION:
+            return None
+        return meta
+
+    def save(
+        self,
+        key: IndexKey,
+        text: str,
+        chunks: List[str],
+        vectorstore,
+        pages: Optional[List[PageSpan]] = None,
+        records=None,
+    ) -> Path:
+        """
+        Escribe el índice en un directorio temporal y lo publica con un rename
+        atómico, de modo que otros workers nunca ven un índice a medio escribir.
+        Con `records` (ChunkRecords de `chunks`) se guardan también el offset
+        y la página de cada chunk.
+        """
+        import faiss
+
+        target = self.path_for(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=target.parent, prefix=".tmp-"))
+        try:
+            faiss.write_index(vectorstore.index, str(tmp / "index.faiss"))
+            (tmp / "text.txt").write_text(text, encoding="utf-8")
+            rows = [{"id": i, "text": c} for i, c in enumerate(chunks)]
+            if records is not None and len(records) == len(chunks):
+                for row, start, end, page in zip(
+                    rows,
+                    records.starts.tolist(),
+                    records.ends.tolist(),
+                    records.pages.tolist(),
+                ):
+                    row.update(start=start, end=end, page=page)
+            (tmp / "chunks.json").write_text(
+                json.dumps(rows, ensure_ascii=False), encoding="utf-8"
+            )
+            spans = [[s.page, s.start, s.end] for s in pages or []]
+            (tmp / "pages.json").write_text(json.dumps(spans), encoding="utf-8")
+            meta = {
+                "format_version": FORMAT_VERSION,
+                "doc_hash": key.doc_hash,
+                "chunk_size": key.chunk_size,
+                "chunk_overlap": key.chunk_overlap,
+                "embeddings_model": key.embeddings_model,
+                "tokenizer": key.tokenizer,
+                "count": int(vectorstore.index.ntotal),
+                "dim": int(vectorstore.index.d),
+            }
+            (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+            if target.exists():
+                # Formato viejo o escritura concurrente: se reemplaza
+                shutil.rmtree(target, ignore_errors=True)
+            try:
+                os.replace(tmp, target)
+            except OSError:
+                # Otro worker publicó el mismo índice primero
+                shutil.rmtree(tmp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return target
+
+    def load(self, key: IndexKey, embedder: Any, with_records: bool = False):
+        """
+        Carga (texto, chunks, vectorstore, páginas) desde disco o None si no existe
+        o su formato está obsoleto. El índice queda en solo lectura (mmap).
+        Con `with_records` se agrega el ChunkRecords guardado (None si el
+        índice se guardó sin offsets).
+        """
+        import faiss
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        from langchain_community.vectorstores import FAISS
+        from langchain_core.documents import Document
+
+        path = self.path_for(key)
+        meta = self._read_meta(path)
+        if meta is None:
+            return None
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        index = faiss.read_index(str(path / "index.faiss"), flags)
+        records = json.loads((path / "chunks.json").read_text(encoding="utf-8"))
+        text = (path / "text.txt").read_text(encoding="utf-8")
+        spans = json.loads((path / "pages.json").read_text(encoding="utf-8"))
+        pages = [PageSpan(page=p, start=s, end=e) for p, s, e in spans]
+        chunks = [r["text"] for r in records]
+        docstore = InMemoryDocstore(
+            {str(r["id"]): Document(page_content=r["text"]) for r in records}
+        )
+        index_to_docstore_id = {i: str(r["id"]) for i, r in enumerate(records)}
+        vs = FAISS(embedder, index, docstore, index_to_docstore_id)
+        if not with_records:
+            return text, chunks, vs, pages
+        chunk_records = None
+        if records and all("start" in r for r in records):
+            from .chunker import ChunkRecords
+
+            chunk_records = ChunkRecords(
+                text,
+                [r["start"] for r in records],
+                [r["end"] for r in records],
+                [r["page"] for r in records],
+            )
+        return text, chunks, vs, pages, chunk_records
+
+    def remove(self, doc_hash: str) -> None:
+        """
+        Elimina todos los índices en disco de un documento.
+        """
+        shutil.rmtree(self.root / doc_hash, ignore_errors=True)
+
+
+store = IndexStore(os.getenv("INDEX_STORE_DIR", os.path.join("uploads", ".index")))
@@ -0,0 +1,174 @@
+from typing import Dict, Iterable, Optional
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+
+from .index_registry import registry
+from .rag_pipeline import RAGConfig, load_index
+
+QUEUED = "queued"
+EXTRACTING = "extracting"
+EMBEDDING = "embedding"
+READY = "ready"
+FAILED = "failed"
+
+
+@dataclass
+class IndexJob:
+    """
+    Estado de la indexación en segundo plano de un documento.
+    - done/total: progreso de la etapa actual (páginas o chunks)
+    - reused/embedded: chunks cuyo vector se reutilizó o se tuvo que calcular
+    """
+
+    document_id: str
+    filename: str
+    status: str = QUEUED
+    done: int = 0
+    total: int = 0
+    chunks: int = 0
+    reused: int = 0
+    embedded: int = 0
+    error: Optional[str] = None
+    future: Optional[Future] = field(default=None, repr=False)
+    # Momento (monotónico) en que terminó, para expulsarlo pasado el TTL
+    finished_at: Optional[float] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.repr}
+
+
+class IndexingService:
+    """
+    Indexa documentos en un pool de hilos para que /ask encuentre el índice
+    ya construido en el registro. Los trabajos terminados se olvidan pasados
+    `ttl` segundos o, si hay más de `max_jobs`, desde el más antiguo (los que
+    están en curso nunca); el índice sigue en el registro y en disco.
+    """
+
+    def __init__(self, max_workers: int = 2, max_jobs: int = 1000, ttl: float = 3600):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="indexer"
+        )
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs: Dict[str, IndexJob] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        """
+        Expulsa los trabajos terminados vencidos y, por encima de `max_jobs`,
+        los terminados más antiguos (los trabajos están en orden de llegada).
+        """
+        excess = len(self._jobs) - self.max_jobs
+        for document_id, job in list(self._jobs.items()):
+            if job.finished_at is None:
+                continue
+            if excess > 0 or (self.ttl > 0 and now - job.finished_at > self.ttl):
+                del self._jobs[document_id]
+                excess -= 1
+
+    def submit(
+        self,
+        document_id: str,
+        filename: str,
+        cfg: RAGConfig,
+        previous_id: Optional[str] = None,
+    ) -> IndexJob:
+        """
+        Encola la indexación de un documento. Si ya está en curso o lista,
+        devuelve el trabajo existente. `previous_id` es el hash de la versión
+        anterior del archivo: su índice se actualiza en vez de reconstruirse.
+        """
+        with self._lock:
+            job = self._jobs.get(document_id)
+            if job is not None and job.status != FAILED:
+                return job
+            job = IndexJob(document_id=document_id, filename=filename)
+            # Al reintentar, el trabajo pasa al final del orden de llegada
+            self._jobs.pop(document_id, None)
+            self._jobs[document_id] = job
+            self._prune(time.monotonic())
+            job.future = self._executor.submit(self._run, job, cfg, previous_id)
+            return job
+
+    def _run(
+        self, job: IndexJob, cfg: RAGConfig, previous_id: Optional[str] = None
+    ) -> None:
+        def progress(stage: str, done: int, total: int) -> None:
+            job.status, job.done, job.total = stage, done, total
+
+        try:
+            index = load_index(
+                cfg,
+                progress=progress,
+                doc_hash=job.document_id,
+                previous_hash=previous_id,
+            )
+            job.chunks = len(index.chunks)
+            job.reused, job.embedded = index.reused, index.embedded
+            job.status = READY
+            if previous_id and previous_id != job.document_id:
+                # La versión anterior ya no se consulta
+                registry.invalidate(previous_id)
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.monotonic()
+
+    def get(self, document_id: str) -> Optional[IndexJob]:
+        """
+        Devuelve el trabajo de indexación de un documento, si existe.
+        """
+        with self._lock:
+            self._prune(time.monotonic())
+            return self._jobs.get(document_id)
+
+    def wait(self, document_id: str, timeout: Optional[float] = None) -> None:
+        """
+        Espera a que termine la indexación de un documento (si está en curso).
+        """
+        job = self.get(document_id)
+        if job is not None and job.future is not None:
+            job.future.result(timeout=timeout)
+
+    async def wait_async(self, document_id: str) -> None:
+        """
+        Igual que `wait`, pero sin bloquear el event loop.
+        """
+        job = self.get(document_id)
+        if job is not None and job.future is not None:
+            await asyncio.wrap_future(job.future)
+
+    async def wait_pending_async(self, filenames: Optional[Iterable[str]] = None):
+        """
+        Espera las indexaciones en curso (opcionalmente solo de esos archivos).
+        Los errores se ignoran: el documento fallido simplemente no se consulta.
+        """
+        wanted = set(filenames) if filenames is not None else None
+        with self._lock:
+            futures = [
+                job.future
+                for job in self._jobs.values()
+                if job.future is not None
+                and not job.future.done()
+                and (wanted is None or job.filename in wanted)
+            ]
+        if futures:
+            await asyncio.gather(
+                *(asyncio.wrap_future(f) for f in futures), return_exceptions=True
+            )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+indexer = IndexingService(
+    max_workers=int(os.getenv("INDEX_WORKERS", "2")),
+    max_jobs=int(os.getenv("INDEX_MAX_JOBS", "1000")),
+    ttl=float(os.getenv("INDEX_JOB_TTL", "3600")),
+)
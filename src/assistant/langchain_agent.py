@@ -1,34 +1,30 @@
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 import os
-import re
 from dataclasses import dataclass
-from langchain_text_splitters import RecursiveCharacterTextSplitter, TokenTextSplitter
-from langchain_community.retrievers import BM25Retriever
-from langchain_community.vectorstores import FAISS
+import numpy as np
+from .embeddings import DEFAULT_MODEL, get_embedder, query_embedder
+from .embedding_cache import embedding_cache
+from . import metrics
+from .chunker import chunk_text, scan_hints
+from .vector_index import (
+    FLAT,
+    build_vector_index,
+    drop_rows,
+    index_type_of,
+    resolve_index_type,
+)
+
+# langchain_community, los text splitters y el recuperador híbrido se importan
+# al usarlos: importar este módulo (y la API) no los carga
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
 
 
 def detect_chunk_params(procedures_text: str) -> Tuple[int, int]:
     """
     Detecta parámetros de chunking (size y overlap) buscando pistas en el texto.
     """
-    text = procedures_text.lower()
-    size = None
-    overlap = None
-    m_size = re.search(
-        r"(chunk[_\s-]?size|tamañ[o]?\s+de\s+chunk|tamaño\s+del\s+bloque)\D?(\d{2,5})",
-        text,
-    )
-    m_overlap = re.search(r"(overlap|solapamiento)\D?(\d{1,4})", text)
-    if m_size:
-        try:
-            size = int(m_size.group(2))
-        except Exception:
-            pass
-    if m_overlap:
-        try:
-            overlap = int(m_overlap.group(2))
-        except Exception:
-            pass
+    size, overlap, _ = scan_hints(procedures_text)
     return (size or 800, overlap or 100)
 
 
@@ -39,56 +35,149 @@ def build_splits(
 ) -> List[str]:
     """
     Genera chunks del documento usando tokenización o separación por caracteres.
+    Los offsets de cada chunk están en `chunk_text`; aquí se devuelven sus textos.
     """
-    if chunk_size is None or chunk_overlap is None:
-        auto_size, auto_overlap = detect_chunk_params(procedures_text)
-        chunk_size = chunk_size or auto_size
-        chunk_overlap = chunk_overlap or auto_overlap
-    use_tokens = "token" in procedures_text.lower()
-    if use_tokens:
-        splitter = TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    else:
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ". ", " ", ""],
-        )
-    return [c.page_content for c in splitter.create_documents([procedures_text])]
+    return chunk_text(procedures_text, chunk_size, chunk_overlap).texts()
 
 
 @dataclass
 class RetrievalConfig:
     """
     Configuración para el mecanismo de recuperación.
+    Con `hybrid`, BM25 (matriz dispersa) y FAISS se combinan con
+    reciprocal-rank fusion sobre los `fetch_k` mejores de cada uno.
+    Con `cache_embeddings`, los vectores se reutilizan entre ingestas
+    (caché en disco por modelo y hash del chunk).
+    `index_type`: flat (exacto), hnsw, ivfpq, fp16, sq8 o auto (según el
+    número de chunks).
     """
 
     use_embeddings: bool = False
-    embeddings_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embeddings_model: str = DEFAULT_MODEL
     k: int = 4
+    embed_batch_size: int = 64
+    hybrid: bool = False
+    fetch_k: int = 20
+    rrf_k: int = 60
+    cache_embeddings: bool = False
+    index_type: str = FLAT
+
+
+EmbedStats = Dict[str, int]
+
+
+def _count(stats: Optional[EmbedStats], reused: int, embedded: int) -> None:
+    if stats is not None:
+        stats["reused"] = stats.get("reused", 0) + reused
+        stats["embedded"] = stats.get("embedded", 0) + embedded
+
+
+def embed_chunks(
+    embs,
+    chunks: List[str],
+    config: RetrievalConfig,
+    progress: Optional[Callable[[int, int], None]] = None,
+    stats: Optional[EmbedStats] = None,
+) -> np.ndarray:
+    """
+    Codifica los chunks por lotes. Con `cache_embeddings` solo se embeben los
+    que no estén en la caché; `stats` acumula reutilizados y embebidos.
+    """
+    with metrics.stage("embed"):
+        return _embed_chunks(embs, chunks, config, progress, stats)
+
+
+def _embed_chunks(
+    embs,
+    chunks: List[str],
+    config: RetrievalConfig,
+    progress: Optional[Callable[[int, int], None]],
+    stats: Optional[EmbedStats],
+) -> np.ndarray:
+    if config.cache_embeddings:
+        vectors, reused, embedded = embedding_cache.embed(
+            config.embeddings_model,
+            chunks,
+            embs.embed_documents,
+            batch_size=config.embed_batch_size,
+            progress=progress,
+        )
+        _count(stats, reused, embedded)
+        return vectors
+    vectors: List[List[float]] = []
+    for start in range(0, len(chunks), config.embed_batch_size):
+        batch = chunks[start : start + config.embed_batch_size]
+        vectors.extend(embs.embed_documents(batch))
+        if progress:
+            progress(len(vectors), len(chunks))
+    _count(stats, 0, len(chunks))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def vectorstore_from_index(index, chunks: List[str], embs) -> "FAISS":
+    """
+    Envuelve un índice FAISS cuya fila i es el vector de `chunks[i]`.
+    """
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+
+    docstore = InMemoryDocstore(
+        {str(i): Document(page_content=c) for i, c in enumerate(chunks)}
+    )
+    return FAISS(embs, index, docstore, {i: str(i) for i in range(len(chunks))})
+
+
+def _vector_retriever(vs, chunks: List[str], config: RetrievalConfig):
+    from .hybrid_retriever import build_hybrid_retriever
+
+    if config.hybrid:
+        return build_hybrid_retriever(
+            chunks, vs, k=config.k, fetch_k=config.fetch_k, rrf_k=config.rrf_k
+        )
+    return vs.as_retriever(search_kwargs={"k": config.k})
 
 
-def build_retriever(chunks: List[str], config: Optional[RetrievalConfig] = None):
+def build_retriever(
+    chunks: List[str],
+    config: Optional[RetrievalConfig] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    stats: Optional[EmbedStats] = None,
+):
     """
-    Construye un recuperador BM25 o FAISS según configuración.
+    Construye un recuperador BM25, FAISS o híbrido según configuración.
+    Con embeddings, los chunks se codifican por lotes y `progress(hechos, total)`
+    informa cuántos van embebidos.
     """
     if not chunks:
         # Evitar división por cero o errores de índice vacío
         return None
 
     config = config or RetrievalConfig()
+    vs = None
     if config.use_embeddings:
         try:
-            from langchain_community.embeddings import HuggingFaceEmbeddings
-
-            embs = HuggingFaceEmbeddings(model_name=config.embeddings_model)
-            docs = [{"page_content": c} for c in chunks]
-            vs = FAISS.from_dicts(docs, embs, text_key="page_content")
-            return vs.as_retriever(search_kwargs={"k": config.k})
+            # Modelo compartido por el proceso: no se recarga en cada llamada
+            # y las consultas de peticiones concurrentes se embeben en lote
+            embs = query_embedder(get_embedder(config.embeddings_model))
+            vectors = embed_chunks(embs, chunks, config, progress, stats)
+            index = build_vector_index(vectors, config.index_type)
+            vs = vectorstore_from_index(index, chunks, embs)
+            return _vector_retriever(vs, chunks, config)
         except Exception:
             # Alternativa a BM25 si fallan los embeddings
-            pass
+            vs = None
+
+    if config.hybrid:
+        from .hybrid_retriever import build_hybrid_retriever
+
+        return build_hybrid_retriever(
+            chunks, vs, k=config.k, fetch_k=config.fetch_k, rrf_k=config.rrf_k
+        )
 
     try:
+        from langchain_community.retrievers import BM25Retriever
+
         retr = BM25Retriever.from_texts(chunks)
         retr.k = config.k
         return retr
@@ -96,6 +185,61 @@ def build_retriever(chunks: List[str], config: Optional[RetrievalConfig] = None)
         return None
 
 
+def update_retriever(
+    previous_chunks: List[str],
+    previous_vs,
+    chunks: List[str],
+    config: RetrievalConfig,
+    progress: Optional[Callable[[int, int], None]] = None,
+    stats: Optional[EmbedStats] = None,
+):
+    """
+    Actualiza el índice FAISS de una versión anterior del documento en vez de
+    reconstruirlo: elimina los vectores de los chunks que ya no están y añade
+    solo los nuevos. Devuelve (recuperador, chunks en el orden del índice).
+    """
+    import faiss
+
+    wanted = resolve_index_type(config.index_type, len(chunks))
+    if index_type_of(previous_vs.index) != wanted:
+        raise ValueError("El tipo de índice cambió: hay que reconstruirlo")
+    embs = query_embedder(get_embedder(config.embeddings_model))
+    rows: Dict[str, List[int]] = {}
+    for i, chunk in enumerate(previous_chunks):
+        rows.setdefault(chunk, []).append(i)
+    kept = set()
+    added = []
+    for chunk in chunks:
+        free = rows.get(chunk)
+        if free:
+            kept.add(free.pop(0))
+        else:
+            added.append(chunk)
+
+    # Copia escribible: el índice anterior puede estar mapeado en solo lectura
+    # (clone_index comparte el buffer mapeado y no admite remove_ids)
+    index = faiss.deserialize_index(faiss.serialize_index(previous_vs.index))
+    removed = [i for i in range(len(previous_chunks)) if i not in kept]
+    index = drop_rows(index, removed)
+    order = [c for i, c in enumerate(previous_chunks) if i in kept] + added
+    _count(stats, len(kept), 0)
+
+    if added:
+
+        def added_progress(done: int, total: int) -> None:
+            progress(len(kept) + done, len(chunks))
+
+        vectors = embed_chunks(
+            embs, added, config, added_progress if progress else None, stats
+        )
+        index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    elif progress:
+        progress(len(chunks), len(chunks))
+
+    vs = vectorstore_from_index(index, order, embs)
+    return _vector_retriever(vs, order, config), order
+
+
 def answer_query(
     procedures_text: str,
     query: str,
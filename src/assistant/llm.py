@@ -0,0 +1,101 @@
+from typing import Any
+import importlib
+import os
+import threading
+
+_client: Any = None
+_async_client: Any = None
+_lock = threading.Lock()
+
+
+def _http():
+    """
+    Módulo HTTP (httpx) sobre el que está construido el SDK de openai instalado.
+    """
+    from openai import DefaultAsyncHttpxClient
+
+    base = DefaultAsyncHttpxClient.__mro__[1]
+    return importlib.import_module(base.__module__.split(".")[0])
+
+
+def _limits():
+    return _http().Limits(
+        max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30")),
+    )
+
+
+def _timeout():
+    return _http().Timeout(
+        float(os.getenv("OPENAI_TIMEOUT", "60")),
+        connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")),
+    )
+
+
+def _max_retries() -> int:
+    # Los reintentos los hace la política de resilience.py dentro de su
+    # presupuesto; los del SDK (con backoff propio) lo excederían
+    return int(os.getenv("OPENAI_MAX_RETRIES", "0"))
+
+
+def get_client():
+    """
+    Cliente OpenAI síncrono compartido: reutiliza conexiones keep-alive y TLS.
+    Devuelve None si no hay clave configurada.
+    """
+    global _client
+    key = os.getenv("OPENAI_API_KEY", "")
+    if not key:
+        return None
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from openai import DefaultHttpxClient, OpenAI
+
+                _client = OpenAI(
+                    api_key=key,
+                    max_retries=_max_retries(),
+                    http_client=DefaultHttpxClient(
+                        limits=_limits(), timeout=_timeout()
+                    ),
+                )
+    return _client
+
+
+def get_async_client():
+    """
+    Cliente AsyncOpenAI compartido con pool de conexiones httpx ajustado.
+    Se crea al iniciar la app; devuelve None si no hay clave configurada.
+    """
+    global _async_client
+    key = os.getenv("OPENAI_API_KEY", "")
+    if not key:
+        return None
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+                _async_client = AsyncOpenAI(
+                    api_key=key,
+                    max_retries=_max_retries(),
+                    http_client=DefaultAsyncHttpxClient(
+                        limits=_limits(), timeout=_timeout()
+                    ),
+                )
+    return _async_client
+
+
+async def aclose_clients() -> None:
+    """
+    Cierra los clientes compartidos (al apagar la app).
+    """
+    global _client, _async_client
+    with _lock:
+        client, async_client = _client, _async_client
+        _client = _async_client = None
+    if async_client is not None:
+        await async_client.close()
+    if client is not None:
+        client.close()
@@ -1,7 +1,30 @@
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
 from pathlib import Path
 
+# Por debajo de este número de páginas no compensa repartir en procesos
+PARALLEL_MIN_PAGES = 32
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class PageSpan:
+    """
+    Tramo del texto extraído que pertenece a una página (1-based).
+    `start`/`end` son offsets de caracteres en el texto completo.
+    """
+
+    page: int
+    start: int
+    end: int
+
 
 def read_text_file(path: str) -> str:
     """
@@ -13,22 +36,166 @@ def read_text_file(path: str) -> str:
     return p.read_text(encoding="utf-8")
 
 
-def read_pdf_file(path: str) -> str:
+def _pdfminer_page(path: str, index: int) -> str:
+    from pdfminer.high_level import extract_text
+
+    try:
+        return extract_text(path, page_numbers=[index]) or ""
+    except Exception:
+        return ""
+
+
+def _extract_pages(
+    reader,
+    path: str,
+    start: int,
+    end: int,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> List[str]:
     """
-    Extrae texto de un PDF. Intenta PyPDF2 y, si falla o devuelve vacío,
-    usa pdfminer.six como alternativa.
+    Extrae las páginas [start, end) con PyPDF2 y aplica pdfminer.six solo a
+    las páginas que quedaron vacías.
+    """
+    pages = []
+    for i in range(start, end):
+        try:
+            text = reader.pages[i].extract_text() or ""
+        except Exception:
+            text = ""
+        if not text.strip():
+            text = _pdfminer_page(path, i)
+        pages.append(text)
+        if progress:
+            progress(len(pages), end - start)
+    return pages
+
+
+def _extract_page_range(path: str, start: int, end: int) -> List[str]:
+    # Corre dentro de un proceso del pool: cada uno abre su propio lector
+    from PyPDF2 import PdfReader
+
+    return _extract_pages(PdfReader(path), path, start, end)
+
+
+def pdf_workers() -> int:
+    """
+    Procesos para extraer PDFs (PDF_WORKERS, por defecto uno por núcleo).
+    """
+    return int(os.getenv("PDF_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido por todas las extracciones; se crea en el
+    primer PDF grande. Usa "spawn": al llegar aquí torch y los tokenizers ya
+    arrancaron hilos y un fork podría dejar a los hijos bloqueados.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=pdf_workers(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    # Un hijo murió: el próximo PDF usa un pool nuevo
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def shutdown_pdf_pool() -> None:
+    """
+    Cierra el pool de extracción (al apagar la API).
     """
-    # Intento con PyPDF2
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def read_pdf_pages(
+    path: str,
+    progress: Optional[Callable[[int, int], None]] = None,
+    workers: Optional[int] = None,
+) -> List[str]:
+    """
+    Extrae el texto de cada página de un PDF repartiendo rangos de páginas
+    en el pool de procesos compartido. Devuelve una lista con el texto por
+    página. `workers` acota cuántos rangos se reparten a la vez.
+    `progress(hechas, total)` se invoca a medida que terminan los rangos.
+    """
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    total = len(reader.pages)
+    workers = min(workers or pdf_workers(), total) or 1
+    if workers == 1 or total < PARALLEL_MIN_PAGES:
+        return _extract_pages(reader, path, 0, total, progress)
+
+    # Rangos pequeños para repartir bien la carga y reportar progreso
+    step = max(1, min(16, total // (workers * 4)))
+    ranges = [(s, min(s + step, total)) for s in range(0, total, step)]
+    results = {}
+    done = 0
+    pool = get_pdf_pool()
+    pending = list(ranges)
+    futures = {}
     try:
-        from PyPDF2 import PdfReader
+        # Como mucho `workers` rangos en vuelo: el pool lo comparten varios PDFs
+        while pending or futures:
+            while pending and len(futures) < workers:
+                s, e = pending.pop(0)
+                futures[pool.submit(_extract_page_range, path, s, e)] = (s, e)
+            fut = next(as_completed(futures))
+            s, e = futures.pop(fut)
+            results[s] = fut.result()
+            done += e - s
+            if progress:
+                progress(done, total)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        for fut in futures:
+            fut.cancel()
+    return [text for s, _ in ranges for text in results[s]]
+
+
+def join_pages(pages: List[str]) -> Tuple[str, List[PageSpan]]:
+    """
+    Une las páginas en un solo texto y devuelve el tramo de cada página.
+    """
+    joined = "\n\n".join(pages)
+    lead = len(joined) - len(joined.lstrip())
+    text = joined.strip()
+    spans = []
+    offset = 0
+    for n, page in enumerate(pages, start=1):
+        start = max(0, min(offset - lead, len(text)))
+        end = max(0, min(offset + len(page) - lead, len(text)))
+        spans.append(PageSpan(page=n, start=start, end=end))
+        offset += len(page) + 2
+    return text, spans
 
-        reader = PdfReader(path)
-        pages = []
-        for p in reader.pages:
-            pages.append(p.extract_text() or "")
-        text = "\n\n".join(pages).strip()
+
+def read_pdf_document(
+    path: str, progress: Optional[Callable[[int, int], None]] = None
+) -> Tuple[str, List[PageSpan]]:
+    """
+    Extrae texto y tramos por página de un PDF. Usa PyPDF2 por página (en
+    paralelo) con pdfminer.six solo en las páginas vacías; si PyPDF2 no puede
+    abrir el archivo, usa pdfminer.six sobre el documento completo.
+    """
+    try:
+        text, spans = join_pages(read_pdf_pages(path, progress=progress))
         if text:
-            return text
+            return text, spans
     except Exception:
         pass
     # Fallback con pdfminer.six
@@ -36,20 +203,46 @@ def read_pdf_file(path: str) -> str:
         from pdfminer.high_level import extract_text
 
         text = extract_text(path) or ""
-        return text
+        return text, [PageSpan(page=1, start=0, end=len(text))]
     except Exception as e:
         raise RuntimeError("No fue posible extraer texto del PDF") from e
 
 
-def load_procedures_text(
-    pdf_path: Optional[str] = None, text_path: Optional[str] = None
+def read_pdf_file(
+    path: str, progress: Optional[Callable[[int, int], None]] = None
 ) -> str:
     """
-    Carga el texto de procedimientos desde PDF o TXT según parámetros.
-    Prioriza `text_path` si está definido y existe; si no, intenta `pdf_path`.
+    Extrae texto de un PDF. Intenta PyPDF2 y, si falla o devuelve vacío,
+    usa pdfminer.six como alternativa.
+    `progress(hechas, total)` se invoca tras cada rango de páginas extraído.
+    """
+    return read_pdf_document(path, progress=progress)[0]
+
+
+def load_document(
+    pdf_path: Optional[str] = None,
+    text_path: Optional[str] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[str, List[PageSpan]]:
+    """
+    Igual que `load_procedures_text`, pero devuelve también los tramos por página
+    (un TXT se considera una sola página).
     """
     if text_path and os.path.exists(text_path):
-        return read_text_file(text_path)
+        text = read_text_file(text_path)
+        return text, [PageSpan(page=1, start=0, end=len(text))]
     if pdf_path and os.path.exists(pdf_path):
-        return read_pdf_file(pdf_path)
+        return read_pdf_document(pdf_path, progress=progress)
     raise FileNotFoundError("No se encontró archivo de procedimientos (PDF o texto).")
+
+
+def load_procedures_text(
+    pdf_path: Optional[str] = None,
+    text_path: Optional[str] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> str:
+    """
+    Carga el texto de procedimientos desde PDF o TXT según parámetros.
+    Prioriza `text_path` si está definido y existe; si no, intenta `pdf_path`.
+    """
+    return load_document(pdf_path, text_path, progress)[0]
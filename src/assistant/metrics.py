@@ -0,0 +1,303 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Segundos; cubren desde una búsqueda en memoria hasta una llamada lenta al LLM
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric(ABC):
+    """
+    Base de las métricas: cada tipo define `kind` y sus líneas en `samples`.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """
+        Líneas de la métrica en el formato de texto de Prometheus.
+        """
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+
+
+class Counter(_Metric):
+    """
+    Contador monótono con etiquetas.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items
+        ]
+
+
+class Histogram(_Metric):
+    """
+    Histograma acumulativo (buckets `le`, `_sum` y `_count`) con etiquetas.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por etiqueta: [conteo por bucket..., suma, total]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def count(self, **labels: object) -> int:
+        with self._lock:
+            row = self._values.get(self._key(labels))
+            return int(row[-1]) if row else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out = []
+        for key, row in items:
+            for bound, n in zip(self.buckets, row):
+                le = _labels(self.labelnames, key, f'le="{_number(bound)}"')
+                out.append(f"{self.name}_bucket{le} {_number(n)}")
+            inf = _labels(self.labelnames, key, 'le="+Inf"')
+            out.append(f"{self.name}_bucket{inf} {_number(row[-1])}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {row[-2]!r}")
+            out.append(
+                f"{self.name}_count{_labels(self.labelnames, key)} {_number(row[-1])}"
+            )
+        return out
+
+
+class MetricsRegistry:
+    """
+    Métricas del proceso, exportadas en formato de texto de Prometheus.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "rag_stage_seconds", "Duración de cada etapa del pipeline RAG", ("stage",)
+)
+ERRORS = registry.counter(
+    "rag_errors_total", "Errores devueltos como texto en la respuesta", ("stage",)
+)
+LLM_REQUESTS = registry.counter(
+    "rag_llm_requests_total",
+    "Llamadas al LLM por modelo, uso del modelo de respaldo y resultado",
+    ("model", "fallback", "outcome"),
+)
+LLM_TOKENS = registry.counter(
+    "rag_llm_tokens_total", "Tokens de prompt y de respuesta", ("model", "kind")
+)
+CONTEXT_TOKENS = registry.counter(
+    "rag_context_tokens_total",
+    "Tokens de contexto recuperados y los que llegan al prompt tras empaquetar",
+    ("kind",),
+)
+INDEX_UPDATES = registry.counter(
+    "rag_index_updates_total",
+    "Documentos re-indexados desde su versión anterior: incremental o "
+    "reconstrucción completa (type_changed, error)",
+    ("outcome",),
+)
+COALESCED = registry.counter(
+    "rag_coalesced_total",
+    "Peticiones que esperaron una ejecución idéntica en curso (index, answer)",
+    ("kind",),
+)
+TOKEN_COUNTS = registry.counter(
+    "rag_token_counts_total",
+    "Conteos de tokens con tiktoken o con la aproximación por palabras (approx)",
+    ("method",),
+)
+QUERY_EMBEDDINGS = registry.counter(
+    "rag_query_embeddings_total",
+    "Embeddings de preguntas servidos desde la caché LRU o por el modelo",
+    ("source",),
+)
+QUERY_BATCH_SIZE = registry.histogram(
+    "rag_query_embed_batch_size",
+    "Preguntas distintas codificadas juntas en cada lote",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+# Etapas medidas durante la petición actual (None = no se recolectan)
+_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = (
+    contextvars.ContextVar("rag_timings", default=None)
+)
+
+
+def record(name: str, seconds: float) -> None:
+    """
+    Registra la duración de una etapa en el histograma y, si hay una
+    recolección activa, en los tiempos de la petición.
+    """
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Mide el bloque como la etapa `name` (aunque termine con una excepción).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+@contextmanager
+def collect_timings() -> Iterator[List[Tuple[str, float]]]:
+    """
+    Recolecta las etapas medidas dentro del bloque, incluidas las que corren
+    en otros hilos mediante `in_context`.
+    """
+    timings: List[Tuple[str, float]] = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def in_context(fn: Callable, *args) -> Callable[[], object]:
+    """
+    `fn(*args)` ligada al contexto actual, para pasarla a `run_in_executor`
+    sin perder la recolección de tiempos de la petición.
+    """
+    return functools.partial(contextvars.copy_context().run, fn, *args)
+
+
+def server_timing(timings: List[Tuple[str, float]]) -> str:
+    """
+    Valor de la cabecera Server-Timing; las etapas repetidas se suman.
+    """
+    totals: Dict[str, float] = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={s * 1000:.1f}" for name, s in totals.items())
+
+
+def _tokens(usage: object, field: str) -> int:
+    value = getattr(usage, field, None)
+    return value if isinstance(value, int) else 0
+
+
+def record_llm(
+    model: str, fallback: bool, outcome: str, usage: Optional[object] = None
+) -> None:
+    """
+    Cuenta una llamada al LLM (`outcome` = ok / error / timeout / cancelled /
+    circuit_open) y sus tokens si la respuesta trae `usage`.
+    """
+    LLM_REQUESTS.inc(model=model, fallback=str(fallback).lower(), outcome=outcome)
+    record_tokens(model, usage)
+
+
+def record_tokens(model: str, usage: Optional[object]) -> None:
+    """
+    Suma los tokens de prompt y de respuesta de `usage` (si lo hay).
+    """
+    if usage is not None:
+        LLM_TOKENS.inc(_tokens(usage, "prompt_tokens"), model=model, kind="prompt")
+        LLM_TOKENS.inc(
+            _tokens(usage, "completion_tokens"), model=model, kind="completion"
+        )
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+import threading
+
+from langchain_core.embeddings import Embeddings
+
+from . import metrics
+
+
+class _Batch:
+    def __init__(self) -> None:
+        # Un futuro por texto distinto: preguntas repetidas comparten resultado
+        self.futures: Dict[str, Future] = {}
+        self.full = threading.Event()
+
+
+class QueryBatcher(Embeddings):
+    """
+    Embeddings de consultas agrupados entre peticiones concurrentes, delante
+    del modelo compartido. El primer hilo que llega abre un lote y es su
+    líder: espera hasta `max_wait` segundos (o a juntar `max_batch`
+    preguntas) y, cuando el modelo queda libre, codifica todo el lote con un
+    solo `embed_documents` y reparte los vectores. Los lotes se forman también
+    mientras el modelo está ocupado con el anterior, así que con carga baja
+    la espera es como mucho `max_wait`.
+
+    Los vectores recientes quedan en una caché LRU de `cache_size` preguntas.
+    `embed_documents` pasa directo al modelo.
+    """
+
+    def __init__(
+        self,
+        embedder: Any,
+        max_batch: int = 32,
+        max_wait: float = 0.002,
+        cache_size: int = 1024,
+    ):
+        self.embedder = embedder
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+        self._open: Optional[_Batch] = None
+        self.batches = 0
+        self.encoded = 0
+        self.queries = 0
+        self.cache_hits = 0
+
+    def __getattr__(self, name: str) -> Any:
+        # Atributos del modelo (model_name, client, ...) siguen accesibles
+        if name == "embedder":
+            raise AttributeError(name)
+        return getattr(self.embedder, name)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            self.queries += 1
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.cache_hits += 1
+            else:
+                batch = self._open
+                leader = batch is None
+                if leader:
+                    batch = self._open = _Batch()
+                future = batch.futures.get(text)
+                if future is None:
+                    future = batch.futures[text] = Future()
+                if len(batch.futures) >= self.max_batch:
+                    # Lote lleno: los siguientes abren otro
+                    self._open = None
+                    batch.full.set()
+        if vector is not None:
+            metrics.QUERY_EMBEDDINGS.inc(source="cache")
+            return list(vector)
+        metrics.QUERY_EMBEDDINGS.inc(source="model")
+        if leader:
+            self._run(batch)
+        return list(future.result())
+
+    def _run(self, batch: _Batch) -> None:
+        if self.max_wait > 0:
+            batch.full.wait(self.max_wait)
+        with self._encode_lock:
+            with self._lock:
+                # Se cierra al tener el modelo: hasta aquí aún sumaba preguntas
+                if self._open is batch:
+                    self._open = None
+                texts = list(batch.futures)
+            metrics.QUERY_BATCH_SIZE.observe(len(texts))
+            try:
+                vectors = self.embedder.embed_documents(texts)
+            except BaseException as e:
+                for future in batch.futures.values():
+                    future.set_exception(e)
+                return
+        with self._lock:
+            self.batches += 1
+            self.encoded += len(texts)
+            if self.cache_size > 0:
+                for text, vector in zip(texts, vectors):
+                    self._cache[text] = vector
+                    self._cache.move_to_end(text)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        for text, vector in zip(texts, vectors):
+            batch.futures[text].set_result(vector)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Preguntas, aciertos de caché, lotes codificados y tamaño medio del lote.
+        """
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "cache_hits": self.cache_hits,
+                "cached": len(self._cache),
+                "batches": self.batches,
+                "encoded": self.encoded,
+                "mean_batch": round(self.encoded / max(self.batches, 1), 2),
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+            }
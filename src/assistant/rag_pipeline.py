@@ -1,8 +1,59 @@
-from typing import List, Optional, Dict, Callable
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    List,
+    Optional,
+    Dict,
+    Callable,
+    Tuple,
+    Union,
+)
+import asyncio
+import hashlib
+import inspect
 import os
-from dataclasses import dataclass
-from .loader import load_procedures_text
-from .langchain_agent import build_splits, build_retriever, RetrievalConfig
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import numpy as np
+
+from .chunker import chunk_text
+from .loader import PageSpan, load_document
+from .langchain_agent import (
+    RetrievalConfig,
+    build_retriever,
+    build_splits,
+    update_retriever,
+)
+from .index_registry import (
+    DocumentIndex,
+    IndexKey,
+    cached_file_sha256,
+    estimate_nbytes,
+    file_sha256,
+    registry,
+)
+from .corpus import CorpusIndex, corpus_cache
+from .context_packing import PackedContext, encoding_name, pack_contexts
+from .document_store import DocumentStore
+from . import metrics
+from .index_store import store
+from .embeddings import get_embedder, query_embedder
+from .llm import get_async_client, get_client
+from .resilience import LLMUnavailable, acall_with_policy, call_with_policy
+from .answer_cache import (
+    BYPASS,
+    AnswerCache,
+    CacheLookup,
+    context_fingerprint,
+    normalize_question,
+)
+from .singleflight import AsyncSingleFlight, SingleFlight
+
+# Los módulos de recuperación (langchain, scipy, faiss) se importan dentro de
+# las funciones que los usan para que importar la API sea rápido
 
 
 @dataclass
@@ -11,18 +62,35 @@ class RAGConfig:
     Configuración del pipeline RAG:
     - chunk_size/overlap: parámetros de chunking
     - use_embeddings: activa FAISS/HuggingFace
+    - embeddings_model: modelo de embeddings (forma parte de la clave del índice)
     - k: número de documentos relevantes
+    - hybrid: combina BM25 y FAISS con reciprocal-rank fusion
+    - index_type: índice vectorial (flat, hnsw, ivfpq, fp16, sq8 o auto)
+    - persist_index: guarda/carga el índice FAISS en disco (INDEX_STORE_DIR)
+    - cache_embeddings: reutiliza vectores de chunks ya vistos (EMBED_CACHE_DIR)
     - min_signal_tokens: umbral mínimo de coincidencias para evitar alucinaciones
+    - context_token_budget: tokens máximos de contexto en el prompt (0 = sin
+      límite); los fragmentos se unen y deduplican antes de llenarlo
     - pdf_path/text_path: rutas del documento
+    - corpus_dir: busca en todos los documentos de la carpeta con un índice
+      compartido; `filenames` restringe la búsqueda a esos archivos
     """
 
     chunk_size: int = 400
     chunk_overlap: int = 80
     use_embeddings: bool = True
+    embeddings_model: str = RetrievalConfig.embeddings_model
     k: int = 4
+    hybrid: bool = False
+    index_type: str = "flat"
     min_signal_tokens: int = 1
+    context_token_budget: int = 0
+    persist_index: bool = True
+    cache_embeddings: bool = True
     pdf_path: Optional[str] = None
     text_path: Optional[str] = None
+    corpus_dir: Optional[str] = None
+    filenames: Optional[List[str]] = None
 
 
 def tokenize(s: str) -> List[str]:
@@ -60,127 +128,1009 @@ def build_contexts(text: str, cfg: RAGConfig) -> List[str]:
     return chunks
 
 
-def retrieve(text: str, query: str, cfg: RAGConfig) -> List[str]:
+ProgressFn = Callable[[str, int, int], None]
+
+
+def build_index(
+    text: str,
+    cfg: RAGConfig,
+    key: Optional[IndexKey] = None,
+    progress: Optional[ProgressFn] = None,
+    pages: Optional[List[PageSpan]] = None,
+    previous: Optional[DocumentIndex] = None,
+) -> DocumentIndex:
     """
-    Recupera los chunks más relevantes para una consulta dada.
+    Genera los chunks del texto y construye su recuperador.
+    `progress(etapa, hechos, total)` informa el avance del embedding.
+    Con `previous` (versión anterior del documento) se actualiza su índice
+    FAISS embebiendo solo los chunks nuevos o modificados. Los offsets y
+    páginas de los chunks quedan en `DocumentIndex.records`.
     """
-    chunks = build_splits(
-        text, chunk_size=cfg.chunk_size, chunk_overlap=cfg.chunk_overlap
+    with metrics.stage("split"):
+        records = chunk_text(text, cfg.chunk_size, cfg.chunk_overlap, pages)
+        chunks = records.texts()
+    retriever = None
+    stats: Dict[str, int] = {}
+    if chunks:
+        ret_cfg = RetrievalConfig(
+            use_embeddings=cfg.use_embeddings,
+            embeddings_model=cfg.embeddings_model,
+            k=cfg.k,
+            hybrid=cfg.hybrid,
+            cache_embeddings=cfg.cache_embeddings,
+            index_type=cfg.index_type,
+        )
+        embed_progress = None
+        if progress:
+
+            def embed_progress(done: int, total: int) -> None:
+                progress("embedding", done, total)
+
+            progress("embedding", 0, len(chunks))
+        previous_vs = getattr(getattr(previous, "retriever", None), "vectorstore", None)
+        with metrics.stage("index"):
+            if cfg.use_embeddings and previous_vs is not None:
+                try:
+                    retriever, order = update_retriever(
+                        previous.chunks,
+                        previous_vs,
+                        chunks,
+                        ret_cfg,
+                        embed_progress,
+                        stats,
+                    )
+                    # Los registros siguen el orden de las filas del índice
+                    records = records.take(reorder(chunks, order))
+                    chunks = order
+                    metrics.INDEX_UPDATES.inc(outcome="incremental")
+                except Exception as e:
+                    # Índice anterior incompatible: se construye desde cero
+                    stats = {}
+                    metrics.INDEX_UPDATES.inc(
+                        outcome="type_changed" if isinstance(e, ValueError) else "error"
+                    )
+            if retriever is None:
+                retriever = build_retriever(chunks, ret_cfg, embed_progress, stats)
+    return DocumentIndex(
+        key=key,
+        text=text,
+        chunks=chunks,
+        retriever=retriever,
+        nbytes=estimate_nbytes(text, chunks, retriever) + records.nbytes,
+        pages=pages or [],
+        reused=stats.get("reused", 0),
+        embedded=stats.get("embedded", 0),
+        records=records,
     )
-    if not chunks:
-        return []
 
-    ret_cfg = RetrievalConfig(use_embeddings=cfg.use_embeddings, k=cfg.k)
-    retriever = build_retriever(chunks, ret_cfg)
 
-    if not retriever:
-        # Alternativa si falla la creación del recuperador (ej. documentos vacíos)
-        return chunks[: cfg.k]
+def reorder(chunks: List[str], order: List[str]) -> List[int]:
+    """
+    Posición en `chunks` de cada chunk de `order` (los repetidos, en orden).
+    """
+    positions: Dict[str, List[int]] = {}
+    for i, chunk in enumerate(chunks):
+        positions.setdefault(chunk, []).append(i)
+    return [positions[chunk].pop(0) for chunk in order]
+
 
-    docs = retriever.get_relevant_documents(query)
+def search_index(index: DocumentIndex, query: str, k: int) -> List[str]:
+    """
+    Busca en un índice ya construido los `k` chunks más relevantes.
+    """
+    with metrics.stage("search"):
+        return _search_index(index, query, k)
+
+
+def _search_index(index: DocumentIndex, query: str, k: int) -> List[str]:
+    from .hybrid_retriever import HybridRetriever
+
+    if not index.chunks:
+        return []
+    if not index.retriever:
+        # Alternativa si falla la creación del recuperador (ej. documentos vacíos)
+        return index.chunks[:k]
+    if isinstance(index.retriever, HybridRetriever):
+        return index.retriever.search(query, k)
+    vs = getattr(index.retriever, "vectorstore", None)
+    if vs is not None:
+        docs = vs.similarity_search(query, k=k)
+    else:
+        docs = index.retriever.invoke(query)[:k]
     return [getattr(d, "page_content", str(d)) for d in docs]
 
 
-def build_prompt(contexts: List[str], question: str) -> str:
+def embed_queries(index: DocumentIndex, queries: List[str]) -> Optional[np.ndarray]:
+    """
+    Embeddings de varias preguntas en una sola llamada al modelo del índice
+    (None si el índice no es vectorial).
+    """
+    vs = getattr(index.retriever, "vectorstore", None)
+    if vs is None or not queries:
+        return None
+    return np.asarray(vs.embeddings.embed_documents(queries), dtype=np.float32)
+
+
+def search_index_batch(
+    index: DocumentIndex,
+    queries: List[str],
+    k: int,
+    vectors: Optional[np.ndarray] = None,
+) -> List[List[str]]:
+    """
+    `search_index` para varias preguntas: con FAISS las búsquedas se hacen
+    como una sola consulta matricial. `vectors` son los embeddings de las
+    preguntas si ya se calcularon.
+    """
+    with metrics.stage("search"):
+        return _search_index_batch(index, queries, k, vectors)
+
+
+def _search_index_batch(
+    index: DocumentIndex,
+    queries: List[str],
+    k: int,
+    vectors: Optional[np.ndarray],
+) -> List[List[str]]:
+    from .hybrid_retriever import HybridRetriever
+
+    if not index.chunks:
+        return [[] for _ in queries]
+    if not index.retriever:
+        return [index.chunks[:k] for _ in queries]
+    if isinstance(index.retriever, HybridRetriever):
+        ids = index.retriever.search_batch(queries, k, vectors)
+        return [[index.retriever.chunks[i] for i in row] for row in ids]
+    vs = getattr(index.retriever, "vectorstore", None)
+    if vs is None:
+        return [_search_index(index, q, k) for q in queries]
+    if vectors is None:
+        vectors = embed_queries(index, queries)
+    # Las filas del índice FAISS siguen el orden de `index.chunks`
+    _, ids = vs.index.search(
+        np.ascontiguousarray(vectors, dtype=np.float32), min(k, len(index.chunks))
+    )
+    return [[index.chunks[i] for i in row if i >= 0] for row in ids]
+
+
+def resolve_document_path(cfg: RAGConfig) -> Optional[str]:
+    """
+    Devuelve la ruta del documento a usar, con la misma prioridad que el loader.
+    """
+    if cfg.text_path and os.path.exists(cfg.text_path):
+        return cfg.text_path
+    if cfg.pdf_path and os.path.exists(cfg.pdf_path):
+        return cfg.pdf_path
+    return None
+
+
+def index_key(cfg: RAGConfig, doc_hash: str) -> IndexKey:
+    """
+    Clave del registro para un documento con la configuración dada.
+    """
+    return IndexKey(
+        doc_hash=doc_hash,
+        chunk_size=cfg.chunk_size,
+        chunk_overlap=cfg.chunk_overlap,
+        embeddings_model=cfg.embeddings_model if cfg.use_embeddings else "bm25",
+        hybrid=cfg.hybrid,
+        index_type=cfg.index_type if cfg.use_embeddings else "flat",
+        tokenizer=encoding_name(),
+    )
+
+
+def load_persisted_index(key: IndexKey, cfg: RAGConfig) -> Optional[DocumentIndex]:
+    """
+    Carga un índice FAISS guardado en disco (mmap) o None si no existe.
+    """
+    try:
+        loaded = store.load(
+            key, query_embedder(get_embedder(cfg.embeddings_model)), with_records=True
+        )
+    except Exception:
+        return None
+    if loaded is None:
+        return None
+    text, chunks, vs, pages, records = loaded
+    if cfg.hybrid:
+        from .hybrid_retriever import build_hybrid_retriever
+
+        retriever = build_hybrid_retriever(chunks, vs, k=cfg.k)
+    else:
+        retriever = vs.as_retriever(search_kwargs={"k": cfg.k})
+    return DocumentIndex(
+        key=key,
+        text=text,
+        chunks=chunks,
+        retriever=retriever,
+        nbytes=estimate_nbytes(text, chunks, retriever),
+        pages=pages,
+        records=records,
+    )
+
+
+def persist_index(index: DocumentIndex) -> None:
+    """
+    Guarda en disco el índice FAISS para reutilizarlo entre reinicios y workers.
+    """
+    vs = getattr(index.retriever, "vectorstore", None)
+    if index.key is None or vs is None:
+        return
+    try:
+        store.save(index.key, index.text, index.chunks, vs, index.pages, index.records)
+    except Exception:
+        # El índice en memoria sigue siendo válido aunque no se pueda guardar
+        pass
+
+
+def previous_index(key: IndexKey, cfg: RAGConfig) -> Optional[DocumentIndex]:
+    """
+    Índice de una versión anterior del documento: en memoria o en disco.
+    """
+    index = registry.get(key)
+    if index is None and cfg.use_embeddings:
+        index = load_persisted_index(key, cfg)
+    return index
+
+
+def load_index(
+    cfg: RAGConfig,
+    progress: Optional[ProgressFn] = None,
+    doc_hash: Optional[str] = None,
+    previous_hash: Optional[str] = None,
+) -> DocumentIndex:
+    """
+    Obtiene el índice del documento configurado desde el registro,
+    construyéndolo (extracción, chunking y embeddings) solo si no existe.
+    `doc_hash` evita recalcular el hash si el llamador ya lo conoce.
+    `previous_hash` identifica la versión anterior del archivo, cuyo índice
+    se actualiza en lugar de reconstruirlo.
+    """
+    path = resolve_document_path(cfg)
+    if path is None:
+        raise FileNotFoundError(
+            "No se encontró archivo de procedimientos (PDF o texto)."
+        )
+    key = index_key(cfg, doc_hash or file_sha256(path))
+
+    def _build() -> DocumentIndex:
+        if cfg.persist_index and cfg.use_embeddings:
+            persisted = load_persisted_index(key, cfg)
+            if persisted is not None:
+                return persisted
+
+        page_progress = None
+        if progress:
+
+            def page_progress(done: int, total: int) -> None:
+                progress("extracting", done, total)
+
+            progress("extracting", 0, 0)
+        with metrics.stage("extract"):
+            text, pages = load_document(
+                pdf_path=cfg.pdf_path, text_path=cfg.text_path, progress=page_progress
+            )
+        previous = None
+        if previous_hash and previous_hash != key.doc_hash:
+            previous = previous_index(replace(key, doc_hash=previous_hash), cfg)
+        index = build_index(
+            text, cfg, key, progress=progress, pages=pages, previous=previous
+        )
+        if cfg.persist_index:
+            persist_index(index)
+        return index
+
+    return registry.get_or_build(key, _build)
+
+
+CORPUS_SUFFIXES = {".pdf": "pdf_path", ".txt": "text_path"}
+
+
+def corpus_documents(cfg: RAGConfig) -> List[Tuple[str, RAGConfig]]:
+    """
+    Documentos (PDF/TXT) subidos a `corpus_dir`, cada uno con su configuración.
+    """
+    if not cfg.corpus_dir:
+        return []
+    docs = []
+    for name, path in DocumentStore(cfg.corpus_dir).documents():
+        field_name = CORPUS_SUFFIXES.get(path.suffix.lower())
+        if field_name:
+            doc_cfg = replace(
+                cfg, pdf_path=None, text_path=None, corpus_dir=None, filenames=None
+            )
+            docs.append((name, replace(doc_cfg, **{field_name: str(path)})))
+    return docs
+
+
+def load_corpus(cfg: RAGConfig) -> CorpusIndex:
+    """
+    Índice compartido de todos los documentos de `corpus_dir`. Se reconstruye
+    (reutilizando el índice de cada documento) solo si cambia algún archivo.
+    """
+    docs = corpus_documents(cfg)
+    if not docs:
+        raise FileNotFoundError("No hay documentos en el corpus.")
+    hashes = []
+    for name, doc_cfg in docs:
+        try:
+            path = resolve_document_path(doc_cfg)
+            hashes.append((name, cached_file_sha256(path), doc_cfg))
+        except OSError:
+            # Archivo borrado entre el listado y la lectura
+            continue
+    key = (
+        cfg.chunk_size,
+        cfg.chunk_overlap,
+        cfg.embeddings_model if cfg.use_embeddings else "bm25",
+        cfg.index_type,
+        tuple((name, doc_hash) for name, doc_hash, _ in hashes),
+    )
+
+    def _build() -> CorpusIndex:
+        indexes = []
+        for name, doc_hash, doc_cfg in hashes:
+            try:
+                indexes.append((name, load_index(doc_cfg, doc_hash=doc_hash)))
+            except Exception:
+                # Un documento ilegible no impide buscar en el resto
+                continue
+        return CorpusIndex(indexes, index_type=cfg.index_type)
+
+    return corpus_cache.get_or_build(key, _build)
+
+
+def retrieve(text: str, query: str, cfg: RAGConfig) -> List[str]:
+    """
+    Recupera los chunks más relevantes para una consulta dada.
+    """
+    return search_index(build_index(text, cfg), query, cfg.k)
+
+
+def build_prompt(contexts: List[str], question: str, history: str = "") -> str:
     """
     Construye un prompt con contexto y la pregunta, guiando al LLM.
+    `history` es la conversación previa de la sesión, si la hay.
     """
     head = "Responde usando solo el contexto y evita alucinaciones.\n\n"
     ctx = "\n\n---\n\n".join(contexts)
-    return f"{head}Contexto:\n{ctx}\n\nPregunta:\n{question}\n\nRespuesta:"
+    # El historial va después del contexto: si un turno reutiliza el contexto
+    # del anterior, el comienzo del prompt es idéntico (caché de prefijos)
+    past = f"Conversación previa:\n{history}\n\n" if history else ""
+    return f"{head}Contexto:\n{ctx}\n\n{past}Pregunta:\n{question}\n\nRespuesta:"
+
+
+def pack_prompt_contexts(
+    contexts: List[str],
+    cfg: RAGConfig,
+    text: Optional[str] = None,
+    groups: Optional[List[str]] = None,
+    positions: Optional[List[Optional[Tuple[int, int]]]] = None,
+) -> PackedContext:
+    """
+    Empaqueta los fragmentos recuperados para el prompt (ver `pack_contexts`)
+    y contabiliza los tokens recuperados y enviados.
+    """
+    with metrics.stage("pack"):
+        packed = pack_contexts(
+            contexts,
+            text,
+            cfg.context_token_budget,
+            groups,
+            positions=positions,
+        )
+    metrics.CONTEXT_TOKENS.inc(packed.retrieved_tokens, kind="retrieved")
+    metrics.CONTEXT_TOKENS.inc(packed.packed_tokens, kind="packed")
+    return packed
+
+
+def _fallback_error(e: Exception, e2: Exception) -> str:
+    demo = os.getenv("LLM_FALLBACK_DEMO", "false").lower() == "true"
+    return (
+        "Respuesta demo basada en contexto"
+        if demo
+        else f"Error al llamar al modelo: {str(e2) or str(e)}"
+    )
+
+
+def _llm_models(model: str) -> Tuple[str, str]:
+    """
+    Modelo principal (OPENAI_MODEL) y de respaldo (OPENAI_FALLBACK_MODEL).
+    """
+    return (
+        os.getenv("OPENAI_MODEL", model),
+        os.getenv("OPENAI_FALLBACK_MODEL", "gpt-4o-mini"),
+    )
+
+
+def _unavailable_error(e: LLMUnavailable) -> str:
+    errors = e.errors or [e]
+    return _fallback_error(errors[0], errors[-1])
 
 
 def call_llm_openai(prompt: str, model: str = "gpt-5-nano") -> str:
     """
     Invoca el modelo de OpenAI y devuelve el contenido textual de la respuesta.
+    Usa el cliente compartido para reutilizar conexiones entre llamadas.
+    Cada intento tiene plazo propio; con el circuito del principal abierto se
+    va directo al respaldo, y los reintentos respetan el presupuesto total
+    (ver `resilience.LLMPolicy`).
     """
-    key = os.getenv("OPENAI_API_KEY", "")
-    if not key:
+    client = get_client()
+    if client is None:
         return "No hay clave de OpenAI configurada."
+
+    def attempt(mdl: str, timeout: float):
+        return client.chat.completions.create(
+            model=mdl,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            timeout=timeout,
+        )
+
+    with metrics.stage("llm"):
+        try:
+            res, _ = call_with_policy(attempt, *_llm_models(model))
+            return res.choices[0].message.content or ""
+        except LLMUnavailable as e:
+            return _unavailable_error(e)
+        except Exception as e:
+            return f"Error al llamar al modelo: {str(e)}"
+
+
+async def acall_llm_openai(prompt: str, model: str = "gpt-5-nano") -> str:
+    """
+    Versión asíncrona de `call_llm_openai` sobre el cliente AsyncOpenAI
+    compartido. Con LLM_HEDGE=true, si el principal no respondió tras su p95
+    se lanza también el respaldo y se usa la primera respuesta.
+    """
+    client = get_async_client()
+    if client is None:
+        return "No hay clave de OpenAI configurada."
+
+    async def attempt(mdl: str, timeout: float):
+        return await client.chat.completions.create(
+            model=mdl,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            timeout=timeout,
+        )
+
+    with metrics.stage("llm"):
+        try:
+            res, _ = await acall_with_policy(attempt, *_llm_models(model))
+            return res.choices[0].message.content or ""
+        except LLMUnavailable as e:
+            return _unavailable_error(e)
+        except Exception as e:
+            return f"Error al llamar al modelo: {str(e)}"
+
+
+def _delta_text(chunk) -> str:
+    if not getattr(chunk, "choices", None):
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+async def astream_llm_openai(
+    prompt: str, model: str = "gpt-5-nano"
+) -> AsyncIterator[str]:
+    """
+    Transmite la respuesta del modelo token a token (`stream=True`).
+    El plazo, el hedging y los reintentos aplican hasta el primer token: si el
+    principal falla o tarda antes, se usa OPENAI_FALLBACK_MODEL; después del
+    primer token los errores se propagan.
+    """
+    client = get_async_client()
+    if client is None:
+        yield "No hay clave de OpenAI configurada."
+        return
+
+    async def attempt(mdl: str, timeout: float):
+        stream = await client.chat.completions.create(
+            model=mdl,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            stream=True,
+            # El último fragmento trae el conteo de tokens
+            stream_options={"include_usage": True},
+            timeout=timeout,
+        )
+        chunks = stream.__aiter__()
+        usage = None
+        async for chunk in chunks:
+            usage = getattr(chunk, "usage", None) or usage
+            first = _delta_text(chunk)
+            if first:
+                return first, chunks, usage
+        return "", chunks, usage
+
+    start = time.perf_counter()
     try:
-        from openai import OpenAI
+        (first, chunks, usage), mdl = await acall_with_policy(
+            attempt, *_llm_models(model)
+        )
+    except LLMUnavailable as e:
+        metrics.record("llm", time.perf_counter() - start)
+        yield _unavailable_error(e)
+        return
+    if first:
+        yield first
+    async for chunk in chunks:
+        usage = getattr(chunk, "usage", None) or usage
+        text = _delta_text(chunk)
+        if text:
+            yield text
+    metrics.record_tokens(mdl, usage)
+    metrics.record("llm", time.perf_counter() - start)
+
 
-        client = OpenAI(api_key=key)
-        mdl = os.getenv("OPENAI_MODEL", model)
+def general_chat_prompt(query: str, history: str = "") -> str:
+    """
+    Prompt de conversación general cuando no hay documento cargado.
+    """
+    past = f"Conversación previa:\n{history}\n\n" if history else ""
+    return (
+        f"Eres un asistente útil y amable. El usuario NO ha cargado ningún documento. "
+        f"Si te hace preguntas generales (saludos, chistes, conocimientos generales), respóndelas amablemente. "
+        f"Si te pregunta sobre un documento específico, dile cortésmente que por favor lo suba primero para poder ayudarle.\n\n"
+        f"{past}Pregunta del usuario: {query}"
+    )
+
+
+def is_error_answer(answer: str) -> bool:
+    """
+    Indica si el texto es un mensaje de error/alternativa en lugar de una respuesta.
+    """
+    return answer.startswith(
+        ("Error al llamar al modelo", "No hay clave de OpenAI", "Respuesta demo")
+    )
+
+
+def lookup_cached_answer(
+    cache: Optional[AnswerCache],
+    prepared: Dict[str, object],
+    query: str,
+    cfg: RAGConfig,
+    vector: Optional[np.ndarray] = None,
+) -> CacheLookup:
+    """
+    Consulta la caché de respuestas para un prompt ya preparado.
+    Solo aplica a preguntas sobre un documento. `vector` evita volver a
+    embeber la pregunta si ya se calculó.
+    """
+    if cache is None or "prompt" not in prepared or not prepared.get("doc_hash"):
+        return CacheLookup(None, BYPASS)
+    embed = None
+    if vector is not None:
+        embed = lambda _: vector  # noqa: E731
+    elif cfg.use_embeddings:
         try:
-            res = client.chat.completions.create(
-                model=mdl,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
+            embed = query_embedder(get_embedder(cfg.embeddings_model)).embed_query
+        except Exception:
+            embed = None
+    try:
+        with metrics.stage("cache"):
+            return cache.lookup(
+                prepared["doc_hash"], prepared["context_used"], query, embed=embed
             )
-        except Exception as e:
-            fb = os.getenv("OPENAI_FALLBACK_MODEL", "gpt-4o-mini")
-            try:
-                res = client.chat.completions.create(
-                    model=fb,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.2,
-                )
-            except Exception as e2:
-                demo = os.getenv("LLM_FALLBACK_DEMO", "false").lower() == "true"
-                return (
-                    "Respuesta demo basada en contexto"
-                    if demo
-                    else f"Error al llamar al modelo: {str(e2) or str(e)}"
-                )
-        return res.choices[0].message.content or ""
-    except Exception as e:
-        return f"Error al llamar al modelo: {str(e)}"
+    except Exception:
+        return CacheLookup(None, BYPASS)
 
 
-def answer_question(
+def remember_answer(
+    cache: Optional[AnswerCache], prepared: Dict[str, object], query: str, answer: str
+) -> None:
+    """
+    Guarda en la caché una respuesta generada por el LLM (nunca errores).
+    """
+    if cache is None or not prepared.get("doc_hash") or is_error_answer(answer):
+        return
+    cache.store(
+        prepared["doc_hash"],
+        prepared["context_used"],
+        query,
+        answer,
+        vector=prepared.get("question_vector"),
+    )
+
+
+# Preguntas idénticas en curso sobre el mismo documento comparten la llamada al LLM
+_answer_flights = SingleFlight()
+_async_answer_flights = AsyncSingleFlight()
+
+
+def answer_flight_key(prepared: Dict[str, object], query: str) -> Optional[Tuple]:
+    """
+    Clave para coalescer llamadas al LLM: documento, pregunta normalizada y
+    contexto del prompt. None si no hay documento (charla general).
+    """
+    if "prompt" not in prepared or not prepared.get("doc_hash"):
+        return None
+    return (
+        prepared["doc_hash"],
+        normalize_question(query),
+        context_fingerprint(prepared["context_used"]),
+    )
+
+
+def prepare_answer(
+    query: str, cfg: RAGConfig, cache: Optional[AnswerCache] = None
+) -> Dict[str, object]:
+    """
+    Parte CPU del pipeline: índice, recuperación, prompt y caché de respuestas.
+    Devuelve {"prompt", "context_used", ...} o, si no hace falta el LLM,
+    {"answer", "context_used"} con la respuesta final.
+    """
+    return _with_cached_answer(cache, _prepare_prompt(query, cfg), query, cfg)
+
+
+def prepare_session_answer(
     query: str,
-    cfg: Optional[RAGConfig] = None,
-    llm: Optional[Callable[[str], str]] = None,
+    cfg: RAGConfig,
+    history: str = "",
+    previous: Optional[Dict[str, object]] = None,
+    cache: Optional[AnswerCache] = None,
 ) -> Dict[str, object]:
     """
-    Orquesta el pipeline RAG completo y retorna respuesta y contexto usado.
+    `prepare_answer` para un turno de una sesión: el prompt incluye `history`
+    y, si la pregunta recupera los mismos chunks que el turno anterior
+    (`previous`: "doc_hash", "retrieved" y "context_used"), se reutiliza su
+    contexto empaquetado (`context_reused`).
     """
-    cfg = cfg or RAGConfig()
+    prepared = _prepare_prompt(query, cfg, history, previous)
+    if history and "prompt" in prepared:
+        # La caché no conoce la conversación: la respuesta depende del historial
+        prepared["cache"] = BYPASS
+        return prepared
+    return _with_cached_answer(cache, prepared, query, cfg)
+
+
+def _with_cached_answer(
+    cache: Optional[AnswerCache],
+    prepared: Dict[str, object],
+    query: str,
+    cfg: RAGConfig,
+    vector: Optional[np.ndarray] = None,
+) -> Dict[str, object]:
+    lookup = lookup_cached_answer(cache, prepared, query, cfg, vector)
+    prepared["cache"] = lookup.status
+    if lookup.answer is not None:
+        hit = {
+            "answer": lookup.answer,
+            "context_used": prepared["context_used"],
+            "cache": lookup.status,
+        }
+        for field in ("sources", "context_tokens"):
+            if field in prepared:
+                hit[field] = prepared[field]
+        return hit
+    prepared["question_vector"] = lookup.vector
+    return prepared
+
+
+def _prepare_corpus_prompt(query: str, cfg: RAGConfig) -> Dict[str, object]:
+    corpus = load_corpus(cfg)
+    with metrics.stage("search"):
+        hits = corpus.search(query, cfg.k, cfg.filenames)
+    if not hits:
+        return {
+            "answer": "No encontré información relevante en los documentos.",
+            "context_used": [],
+            "sources": [],
+        }
+    # Solo se unen fragmentos del mismo archivo; cada tramo conserva el
+    # origen de su fragmento más relevante
+    packed = pack_prompt_contexts(
+        [text for text, _ in hits], cfg, groups=[src.filename for _, src in hits]
+    )
+    scope = corpus.fingerprint
+    if cfg.filenames is not None:
+        scope += "|" + "|".join(sorted(cfg.filenames))
+    return {
+        "prompt": build_prompt(packed.texts, query),
+        "context_used": packed.texts,
+        "context_tokens": packed.to_dict(),
+        "sources": [hits[span.rank][1].to_dict() for span in packed.spans],
+        "doc_hash": "corpus:" + hashlib.sha256(scope.encode("utf-8")).hexdigest(),
+    }
+
+
+def _prepare_prompt(
+    query: str,
+    cfg: RAGConfig,
+    history: str = "",
+    previous: Optional[Dict[str, object]] = None,
+) -> Dict[str, object]:
     try:
-        text = load_procedures_text(pdf_path=cfg.pdf_path, text_path=cfg.text_path)
-        if not text.strip():
+        if cfg.corpus_dir:
+            return _prepare_corpus_prompt(query, cfg)
+        index = load_index(cfg)
+        if not index.text.strip():
             return {"answer": "El documento parece estar vacío.", "context_used": []}
 
-        contexts = retrieve(text, query, cfg)
-
-        # Si usamos embeddings, confiamos más en la recuperación semántica
-        # y relajamos el chequeo de tokens exactos.
-        sig = score_signal(query, contexts)
-        threshold = cfg.min_signal_tokens if not cfg.use_embeddings else 0
-
-        if not contexts or sig < threshold:
-            # Fallback: intentamos responder igual si hay contexto,
-            # dejando que el LLM juzgue, pero advertimos si está muy vacío.
-            if not contexts:
-                return {
-                    "answer": "No encontré información relevante en el documento.",
-                    "context_used": [],
-                }
-
-        prompt = build_prompt(contexts, query)
-        if llm:
-            ans = llm(prompt)
-        else:
-            ans = call_llm_openai(prompt)
-        return {"answer": ans, "context_used": contexts}
+        contexts = search_index(index, query, cfg.k)
+        return _document_prompt(index, query, contexts, cfg, history, previous)
 
     except FileNotFoundError:
         # Modo Conversación General (Sin Documento)
-        prompt = (
-            f"Eres un asistente útil y amable. El usuario NO ha cargado ningún documento. "
-            f"Si te hace preguntas generales (saludos, chistes, conocimientos generales), respóndelas amablemente. "
-            f"Si te pregunta sobre un documento específico, dile cortésmente que por favor lo suba primero para poder ayudarle.\n\n"
-            f"Pregunta del usuario: {query}"
-        )
-        if llm:
-            ans = llm(prompt)
-        else:
-            ans = call_llm_openai(prompt)
-        return {"answer": ans, "context_used": []}
+        return {"prompt": general_chat_prompt(query, history), "context_used": []}
 
     except Exception as e:
+        metrics.ERRORS.inc(stage="prepare")
+        return {
+            "answer": f"Ocurrió un error procesando la consulta: {str(e)}",
+            "context_used": [],
+        }
+
+
+def _document_prompt(
+    index: DocumentIndex,
+    query: str,
+    contexts: List[str],
+    cfg: RAGConfig,
+    history: str = "",
+    previous: Optional[Dict[str, object]] = None,
+) -> Dict[str, object]:
+    # Si usamos embeddings, confiamos más en la recuperación semántica
+    # y relajamos el chequeo de tokens exactos.
+    sig = score_signal(query, contexts)
+    threshold = cfg.min_signal_tokens if not cfg.use_embeddings else 0
+
+    if not contexts or sig < threshold:
+        # Fallback: intentamos responder igual si hay contexto,
+        # dejando que el LLM juzgue, pero advertimos si está muy vacío.
+        if not contexts:
+            return {
+                "answer": "No encontré información relevante en el documento.",
+                "context_used": [],
+            }
+
+    doc_hash = index.key.doc_hash if index.key else None
+    if (
+        previous
+        and previous.get("doc_hash") == doc_hash
+        and previous.get("context_used")
+        and set(contexts) == set(previous.get("retrieved") or [])
+    ):
+        # Seguimiento que recupera los mismos chunks: mismo contexto, sin
+        # volver a empaquetarlo
         return {
+            "prompt": build_prompt(previous["context_used"], query, history),
+            "context_used": previous["context_used"],
+            "retrieved": previous["retrieved"],
+            "context_reused": True,
+            "doc_hash": doc_hash,
+        }
+
+    # Offsets de los ChunkRecords del índice: no se buscan en el texto
+    packed = pack_prompt_contexts(
+        contexts, cfg, text=index.text, positions=index.spans_of(contexts)
+    )
+    return {
+        "prompt": build_prompt(packed.texts, query, history),
+        "context_used": packed.texts,
+        "context_tokens": packed.to_dict(),
+        "retrieved": contexts,
+        "doc_hash": doc_hash,
+    }
+
+
+def prepare_answers(
+    queries: List[str], cfg: RAGConfig, cache: Optional[AnswerCache] = None
+) -> List[Dict[str, object]]:
+    """
+    `prepare_answer` para un lote de preguntas sobre el mismo documento: el
+    índice se carga una vez, las preguntas se embeben en una sola llamada y
+    las búsquedas se hacen como una consulta matricial. Los vectores se
+    reutilizan para la búsqueda por similitud en la caché de respuestas.
+    """
+    try:
+        index = load_index(cfg)
+        if not index.text.strip():
+            empty = {"answer": "El documento parece estar vacío.", "context_used": []}
+            return [dict(empty) for _ in queries]
+        vectors = embed_queries(index, queries) if cfg.use_embeddings else None
+        results = search_index_batch(index, queries, cfg.k, vectors)
+    except FileNotFoundError:
+        return [prepare_answer(q, cfg, cache) for q in queries]
+    except Exception as e:
+        metrics.ERRORS.inc(stage="prepare")
+        error = {
             "answer": f"Ocurrió un error procesando la consulta: {str(e)}",
             "context_used": [],
         }
+        return [dict(error) for _ in queries]
+    return [
+        _with_cached_answer(
+            cache,
+            _document_prompt(index, query, contexts, cfg),
+            query,
+            cfg,
+            vectors[i] if vectors is not None else None,
+        )
+        for i, (query, contexts) in enumerate(zip(queries, results))
+    ]
+
+
+def _answer_result(prepared: Dict[str, object], answer: str) -> Dict[str, object]:
+    result = {
+        "answer": answer,
+        "context_used": prepared["context_used"],
+        "cache": prepared["cache"],
+    }
+    for field in ("sources", "context_tokens"):
+        if field in prepared:
+            result[field] = prepared[field]
+    return result
+
+
+def answer_question(
+    query: str,
+    cfg: Optional[RAGConfig] = None,
+    llm: Optional[Callable[[str], str]] = None,
+    cache: Optional[AnswerCache] = None,
+) -> Dict[str, object]:
+    """
+    Orquesta el pipeline RAG completo y retorna respuesta y contexto usado.
+    Con `cache`, reutiliza respuestas previas en lugar de llamar al LLM.
+    Las preguntas idénticas en curso sobre el mismo documento y contexto
+    comparten una sola llamada al LLM (`answer_flight_key`).
+    """
+    cfg = cfg or RAGConfig()
+    prepared = prepare_answer(query, cfg, cache)
+    if "answer" in prepared:
+        return prepared
+
+    def complete() -> Dict[str, object]:
+        try:
+            prompt = prepared["prompt"]
+            ans = llm(prompt) if llm else call_llm_openai(prompt)
+            remember_answer(cache, prepared, query, ans)
+            return _answer_result(prepared, ans)
+        except Exception as e:
+            metrics.ERRORS.inc(stage="llm")
+            return {
+                "answer": f"Ocurrió un error procesando la consulta: {str(e)}",
+                "context_used": [],
+            }
+
+    key = answer_flight_key(prepared, query)
+    if key is None:
+        return complete()
+    result, shared = _answer_flights.do(key, complete)
+    if shared:
+        metrics.COALESCED.inc(kind="answer")
+    return dict(result)
+
+
+async def stream_answer(
+    query: str,
+    cfg: Optional[RAGConfig] = None,
+    llm_stream: Optional[Callable[[str], AsyncIterator[str]]] = None,
+    executor: Optional[Executor] = None,
+    cache: Optional[AnswerCache] = None,
+    prepared: Optional[Dict[str, object]] = None,
+) -> AsyncIterator[Tuple[str, object]]:
+    """
+    Pipeline RAG en streaming: emite ("context", fragmentos) apenas termina
+    la recuperación (y ("sources", orígenes) en modo corpus), luego
+    ("token", texto) por cada fragmento del LLM y finalmente ("done", None).
+    `prepared` permite pasar el resultado de `prepare_answer` ya calculado.
+    """
+    cfg = cfg or RAGConfig()
+    if prepared is None:
+        loop = asyncio.get_running_loop()
+        prepared = await loop.run_in_executor(
+            executor, metrics.in_context(prepare_answer, query, cfg, cache)
+        )
+    yield "context", prepared["context_used"]
+    if "sources" in prepared:
+        yield "sources", prepared["sources"]
+    if "answer" in prepared:
+        yield "token", prepared["answer"]
+    else:
+        parts: List[str] = []
+        tokens = (llm_stream or astream_llm_openai)(prepared["prompt"])
+        async for text in tokens:
+            parts.append(text)
+            yield "token", text
+        remember_answer(cache, prepared, query, "".join(parts))
+    yield "done", None
+
+
+async def answer_question_async(
+    query: str,
+    cfg: Optional[RAGConfig] = None,
+    llm: Optional[Callable[[str], Union[str, Awaitable[str]]]] = None,
+    executor: Optional[Executor] = None,
+    cache: Optional[AnswerCache] = None,
+) -> Dict[str, object]:
+    """
+    Versión asíncrona de `answer_question`: la recuperación (CPU) corre en
+    `executor` y la llamada al LLM se espera sin bloquear el event loop.
+    """
+    cfg = cfg or RAGConfig()
+    loop = asyncio.get_running_loop()
+    prepared = await loop.run_in_executor(
+        executor, metrics.in_context(prepare_answer, query, cfg, cache)
+    )
+    return await _complete_async(prepared, query, llm, cache)
+
+
+async def _complete_async(
+    prepared: Dict[str, object],
+    query: str,
+    llm: Optional[Callable[[str], Union[str, Awaitable[str]]]],
+    cache: Optional[AnswerCache],
+) -> Dict[str, object]:
+    if "answer" in prepared:
+        return prepared
+
+    async def complete() -> Dict[str, object]:
+        try:
+            prompt = prepared["prompt"]
+            ans = llm(prompt) if llm else acall_llm_openai(prompt)
+            if inspect.isawaitable(ans):
+                ans = await ans
+            remember_answer(cache, prepared, query, ans)
+            return _answer_result(prepared, ans)
+        except Exception as e:
+            metrics.ERRORS.inc(stage="llm")
+            return {
+                "answer": f"Ocurrió un error procesando la consulta: {str(e)}",
+                "context_used": [],
+            }
+
+    key = answer_flight_key(prepared, query)
+    if key is None:
+        return await complete()
+    result, shared = await _async_answer_flights.do(key, complete)
+    if shared:
+        metrics.COALESCED.inc(kind="answer")
+    return dict(result)
+
+
+async def answer_questions_stream(
+    queries: List[str],
+    cfg: Optional[RAGConfig] = None,
+    llm: Optional[Callable[[str], Union[str, Awaitable[str]]]] = None,
+    executor: Optional[Executor] = None,
+    cache: Optional[AnswerCache] = None,
+    concurrency: int = 8,
+    prepared: Optional[List[Dict[str, object]]] = None,
+) -> AsyncIterator[Dict[str, object]]:
+    """
+    Responde un lote de preguntas sobre el mismo documento: la recuperación
+    se hace una vez para todas (`prepare_answers`) y las llamadas al LLM
+    corren en paralelo con a lo sumo `concurrency` a la vez. Emite cada
+    resultado apenas termina (orden de finalización) con su "index" en el lote.
+    """
+    cfg = cfg or RAGConfig()
+    if prepared is None:
+        loop = asyncio.get_running_loop()
+        prepared = await loop.run_in_executor(
+            executor, metrics.in_context(prepare_answers, queries, cfg, cache)
+        )
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(i: int, query: str, item: Dict[str, object]) -> Dict[str, object]:
+        if "answer" in item:
+            result = item
+        else:
+            async with semaphore:
+                result = await _complete_async(item, query, llm, cache)
+        return {"index": i, "question": query, **result}
+
+    tasks = [
+        asyncio.ensure_future(run(i, q, item))
+        for i, (q, item) in enumerate(zip(queries, prepared))
+    ]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield await done
+    finally:
+        # Cliente desconectado: se cancelan las llamadas al LLM que nadie más
+        # espera (AsyncSingleFlight cancela la ejecución sin interesados)
+        for task in tasks:
+            task.cancel()
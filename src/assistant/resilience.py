@@ -0,0 +1,335 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from . import metrics
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class LLMUnavailable(RuntimeError):
+    """
+    Ningún modelo respondió dentro del presupuesto de latencia.
+    """
+
+    def __init__(self, errors: List[BaseException]):
+        detail = str(errors[-1]) if errors else "sin intentos dentro del presupuesto"
+        super().__init__(detail or type(errors[-1]).__name__)
+        self.errors = errors
+
+
+class CircuitBreaker:
+    """
+    Circuito por modelo: tras `failures` fallos seguidos se abre y las
+    llamadas van directo al respaldo; pasados `reset_after` segundos deja
+    pasar una llamada de prueba (half-open) que lo cierra o lo vuelve a abrir.
+    Si la prueba se cancela sin resultado (`abandon`) vuelve a abrirse, y una
+    prueba que no informa en `reset_after` segundos se reemplaza por otra.
+    """
+
+    def __init__(self, failures: int = 5, reset_after: float = 30.0):
+        self.failures = failures
+        self.reset_after = reset_after
+        self._count = 0
+        self._opened_at = 0.0
+        self._state = CLOSED
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at >= self.reset_after:
+                # Una sola llamada de prueba hasta conocer su resultado
+                self._state = HALF_OPEN
+                self._opened_at = now
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self._count = 0
+            self._state = CLOSED
+
+    def abandon(self) -> None:
+        """
+        La llamada de prueba se canceló (perdió el hedging, sin presupuesto o
+        cliente desconectado): se vuelve a abrir y se prueba tras otro `reset_after`.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def failure(self) -> None:
+        with self._lock:
+            self._count += 1
+            if self._state == HALF_OPEN or self._count >= self.failures:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """
+    Latencias recientes de un modelo (ventana fija) para calcular percentiles.
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+@dataclass
+class LLMPolicy:
+    """
+    Política de llamadas al LLM:
+    - attempt_timeout: plazo de cada intento (segundos)
+    - budget: latencia total máxima, reintentos incluidos
+    - retries: rondas extra (principal y respaldo) si quedan presupuesto y errores
+    - backoff: espera antes de cada reintento (se duplica por ronda)
+    - hedge: si el principal no respondió tras su p95 (acotado entre
+      hedge_min_delay y attempt_timeout; hedge_initial_delay sin muestras
+      suficientes) se lanza también el respaldo y gana el primero
+    - breaker_failures/breaker_reset: umbral y enfriamiento del circuito
+    """
+
+    attempt_timeout: float = 20.0
+    budget: float = 45.0
+    retries: int = 1
+    backoff: float = 0.2
+    hedge: bool = False
+    hedge_min_delay: float = 0.5
+    hedge_initial_delay: float = 3.0
+    hedge_min_samples: int = 20
+    breaker_failures: int = 5
+    breaker_reset: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "LLMPolicy":
+        return cls(
+            attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT", "20")),
+            budget=float(os.getenv("LLM_LATENCY_BUDGET", "45")),
+            retries=int(os.getenv("LLM_RETRIES", "1")),
+            hedge=os.getenv("LLM_HEDGE", "false").lower() == "true",
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5")),
+            hedge_initial_delay=float(os.getenv("LLM_HEDGE_INITIAL_DELAY", "3")),
+            breaker_failures=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            breaker_reset=float(os.getenv("LLM_BREAKER_RESET", "30")),
+        )
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, LatencyTracker] = {}
+_registry_lock = threading.Lock()
+
+
+def breaker_for(model: str, policy: LLMPolicy) -> CircuitBreaker:
+    with _registry_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(policy.breaker_failures, policy.breaker_reset)
+            _breakers[model] = breaker
+        return breaker
+
+
+def latency_for(model: str) -> LatencyTracker:
+    with _registry_lock:
+        return _latencies.setdefault(model, LatencyTracker())
+
+
+def reset() -> None:
+    """
+    Olvida circuitos y latencias (tests).
+    """
+    with _registry_lock:
+        _breakers.clear()
+        _latencies.clear()
+
+
+def hedge_delay(model: str, policy: LLMPolicy) -> float:
+    """
+    Espera antes de lanzar el respaldo en paralelo: el p95 reciente del modelo.
+    """
+    tracker = latency_for(model)
+    p95 = tracker.percentile(0.95)
+    if p95 is None or len(tracker) < policy.hedge_min_samples:
+        p95 = policy.hedge_initial_delay
+    return min(max(p95, policy.hedge_min_delay), policy.attempt_timeout)
+
+
+def _plan(primary: str, fallback: str, policy: LLMPolicy) -> List[str]:
+    """
+    Modelos a intentar en una ronda: el principal se salta con el circuito
+    abierto (el respaldo siempre se intenta como último recurso).
+    """
+    if primary == fallback:
+        return [primary]
+    if breaker_for(primary, policy).allow():
+        return [primary, fallback]
+    metrics.record_llm(primary, False, "circuit_open")
+    return [fallback]
+
+
+def _settle(
+    model: str, primary: str, policy: LLMPolicy, started: float, result, error
+) -> None:
+    """
+    Registra el resultado de un intento en el circuito, las latencias y las métricas.
+    """
+    fallback = model != primary
+    if error is None:
+        breaker_for(model, policy).success()
+        latency_for(model).observe(time.monotonic() - started)
+        metrics.record_llm(model, fallback, "ok", getattr(result, "usage", None))
+        return
+    breaker_for(model, policy).failure()
+    # asyncio.TimeoutError (plazo del intento) o APITimeoutError del SDK
+    outcome = "timeout" if "Timeout" in type(error).__name__ else "error"
+    if outcome == "timeout":
+        # Cota inferior de la latencia real: sin ella el p95 queda sesgado a la baja
+        latency_for(model).observe(time.monotonic() - started)
+    metrics.record_llm(model, fallback, outcome)
+
+
+async def acall_with_policy(
+    attempt: Callable[[str, float], Awaitable[T]],
+    primary: str,
+    fallback: str,
+    policy: Optional[LLMPolicy] = None,
+) -> Tuple[T, str]:
+    """
+    Ejecuta `attempt(modelo, plazo)` con plazos por intento, hedging,
+    circuito y reintentos dentro de `policy.budget`. Devuelve (resultado,
+    modelo que respondió) o lanza LLMUnavailable.
+    """
+    policy = policy or LLMPolicy.from_env()
+    deadline = time.monotonic() + policy.budget
+    errors: List[BaseException] = []
+
+    for round_ in range(policy.retries + 1):
+        if round_:
+            pause = min(policy.backoff * 2 ** (round_ - 1), deadline - time.monotonic())
+            if pause > 0:
+                await asyncio.sleep(pause)
+        models = _plan(primary, fallback, policy)
+        running: Dict[asyncio.Task, Tuple[str, float]] = {}
+
+        def launch() -> None:
+            model = models.pop(0)
+            timeout = min(policy.attempt_timeout, deadline - time.monotonic())
+            task = asyncio.ensure_future(
+                asyncio.wait_for(attempt(model, timeout), timeout)
+            )
+            running[task] = (model, time.monotonic())
+
+        try:
+            if deadline - time.monotonic() > 0:
+                launch()
+            while running:
+                remaining = deadline - time.monotonic()
+                wait = remaining
+                if policy.hedge and models and len(running) == 1:
+                    wait = min(wait, hedge_delay(primary, policy))
+                done, _ = await asyncio.wait(
+                    running, timeout=max(wait, 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if deadline - time.monotonic() <= 0:
+                        break
+                    # Hedging: el principal tarda más que su p95
+                    launch()
+                    continue
+                for task in done:
+                    model, started = running.pop(task)
+                    error = task.exception()
+                    result = None if error else task.result()
+                    _settle(model, primary, policy, started, result, error)
+                    if error is None:
+                        return result, model
+                    errors.append(error)
+                if not running and models and deadline - time.monotonic() > 0:
+                    launch()
+        finally:
+            # Intentos que perdieron la carrera (hedging) o sin presupuesto
+            for task, (model, started) in running.items():
+                task.cancel()
+                metrics.record_llm(model, model != primary, "cancelled")
+                # Lo que tardó hasta cancelarse es una cota inferior de su
+                # latencia; sin estas muestras el p95 del hedging solo ve a
+                # los ganadores y sigue bajando
+                latency_for(model).observe(time.monotonic() - started)
+                if model == primary:
+                    # Si era la prueba del circuito, no puede quedar half-open
+                    breaker_for(model, policy).abandon()
+            if primary in models and primary != fallback:
+                # Prueba concedida pero sin lanzar por falta de presupuesto
+                breaker_for(primary, policy).abandon()
+        if deadline - time.monotonic() <= 0:
+            break
+    raise LLMUnavailable(errors)
+
+
+def call_with_policy(
+    attempt: Callable[[str, float], T],
+    primary: str,
+    fallback: str,
+    policy: Optional[LLMPolicy] = None,
+) -> Tuple[T, str]:
+    """
+    Versión síncrona de `acall_with_policy` (plazos, circuito, reintentos y
+    presupuesto; sin hedging: los intentos son secuenciales). `attempt` debe
+    respetar el plazo que recibe (p. ej. el `timeout` de la petición).
+    """
+    policy = policy or LLMPolicy.from_env()
+    deadline = time.monotonic() + policy.budget
+    errors: List[BaseException] = []
+    for round_ in range(policy.retries + 1):
+        if round_:
+            pause = min(policy.backoff * 2 ** (round_ - 1), deadline - time.monotonic())
+            if pause > 0:
+                time.sleep(pause)
+        for model in _plan(primary, fallback, policy):
+            timeout = min(policy.attempt_timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                if model == primary:
+                    breaker_for(model, policy).abandon()
+                break
+            started = time.monotonic()
+            try:
+                result = attempt(model, timeout)
+            except Exception as e:
+                _settle(model, primary, policy, started, None, e)
+                errors.append(e)
+                continue
+            _settle(model, primary, policy, started, result, None)
+            return result, model
+        if deadline - time.monotonic() <= 0:
+            break
+    raise LLMUnavailable(errors)
@@ -0,0 +1,239 @@
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langgraph.checkpoint.base import get_checkpoint_metadata
+from langgraph.checkpoint.memory import InMemorySaver
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    checkpoint_type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns)
+);
+CREATE INDEX IF NOT EXISTS checkpoints_updated ON checkpoints (updated_at);
+"""
+
+
+class SessionCheckpointer(InMemorySaver):
+    """
+    Checkpointer de LangGraph para las sesiones de conversación (thread_id):
+    - guarda solo el último checkpoint de cada sesión (el historial ya está
+      en el estado), así la memoria por sesión no crece con cada turno
+    - expulsa la sesión usada hace más tiempo al superar `max_sessions` y
+      descarta las inactivas más de `ttl` segundos
+    - con `path`, el último checkpoint también se guarda en SQLite y una
+      sesión expulsada de memoria (o de antes de un reinicio) se recupera
+    Los writes pendientes (ejecuciones interrumpidas) solo viven en memoria.
+    Con SQLite, los métodos asíncronos (`ainvoke`) corren en el executor por
+    defecto para no bloquear el event loop con la base de datos.
+    """
+
+    def __init__(
+        self, max_sessions: int = 1000, ttl: float = 3600, path: Optional[str] = None
+    ):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.RLock()
+        # thread_id -> último uso, del más antiguo al más reciente
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        # (thread_id, ns) -> (checkpoint_id, versiones de sus canales)
+        self._latest: Dict[Tuple[str, str], Tuple[str, Dict[str, Any]]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript(SCHEMA)
+
+    @property
+    def sessions(self) -> int:
+        """
+        Sesiones en memoria. (Sin `__len__`: LangGraph evalúa el checkpointer
+        como booleano y una instancia vacía se tomaría como "sin checkpointer".)
+        """
+        return len(self._seen)
+
+    def _expired(self, last_seen: float, now: float) -> bool:
+        return self.ttl > 0 and now - last_seen > self.ttl
+
+    def _touch(self, thread_id: str, now: float) -> None:
+        self._seen[thread_id] = now
+        self._seen.move_to_end(thread_id)
+        self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """
+        Las sesiones están ordenadas por último uso: las expiradas y las que
+        sobran están al principio.
+        """
+        while self._seen:
+            oldest, last_seen = next(iter(self._seen.items()))
+            if len(self._seen) <= self.max_sessions and not self._expired(
+                last_seen, now
+            ):
+                break
+            # Por TTL la sesión termina; por LRU solo sale de memoria
+            self._forget(oldest, persisted=self._expired(last_seen, now))
+
+    def _drop_checkpoint(self, thread_id: str, ns: str, keep: Dict[str, Any]) -> None:
+        """
+        Borra de memoria el último checkpoint de la sesión, salvo los valores
+        de canal cuya versión siga en `keep`.
+        """
+        latest = self._latest.pop((thread_id, ns), None)
+        if latest is None:
+            return
+        checkpoint_id, versions = latest
+        self.storage.get(thread_id, {}).get(ns, {}).pop(checkpoint_id, None)
+        self.writes.pop((thread_id, ns, checkpoint_id), None)
+        for channel, version in versions.items():
+            if keep.get(channel) != version:
+                self.blobs.pop((thread_id, ns, channel, version), None)
+
+    def _forget(self, thread_id: str, persisted: bool = False) -> None:
+        self._seen.pop(thread_id, None)
+        for ns in list(self.storage.get(thread_id, {})):
+            self._drop_checkpoint(thread_id, ns, {})
+        self.storage.pop(thread_id, None)
+        if persisted and self._db is not None:
+            with self._db:
+                self._db.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,)
+                )
+
+    def _restore(self, thread_id: str, ns: str, now: float) -> None:
+        """
+        Carga desde SQLite el último checkpoint de una sesión que no está en
+        memoria (si no expiró).
+        """
+        if self._db is None or (thread_id, ns) in self._latest:
+            return
+        row = self._db.execute(
+            "SELECT checkpoint_id, parent_id, checkpoint_type, checkpoint,"
+            " metadata_type, metadata, updated_at FROM checkpoints"
+            " WHERE thread_id = ? AND checkpoint_ns = ?",
+            (thread_id, ns),
+        ).fetchone()
+        if row is None:
+            return
+        checkpoint_id, parent_id, ctype, cblob, mtype, mblob, updated_at = row
+        if self._expired(updated_at, now):
+            self._forget(thread_id, persisted=True)
+            return
+        checkpoint = self.serde.loads_typed((ctype, cblob))
+        metadata = self.serde.loads_typed((mtype, mblob))
+        parent = {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": ns,
+                "checkpoint_id": parent_id,
+            }
+        }
+        InMemorySaver.put(
+            self, parent, checkpoint, metadata, checkpoint["channel_versions"]
+        )
+        self._latest[(thread_id, ns)] = (
+            checkpoint_id,
+            dict(checkpoint["channel_versions"]),
+        )
+        self._seen[thread_id] = updated_at
+
+    def _persist(self, config, checkpoint, metadata, now: float) -> None:
+        if self._db is None:
+            return
+        configurable = config["configurable"]
+        ctype, cblob = self.serde.dumps_typed(checkpoint)
+        mtype, mblob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    configurable["thread_id"],
+                    configurable.get("checkpoint_ns", ""),
+                    checkpoint["id"],
+                    configurable.get("checkpoint_id"),
+                    ctype,
+                    cblob,
+                    mtype,
+                    mblob,
+                    now,
+                ),
+            )
+            if self.ttl > 0:
+                self._db.execute(
+                    "DELETE FROM checkpoints WHERE updated_at < ?", (now - self.ttl,)
+                )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            self._restore(thread_id, ns, now)
+            if thread_id not in self._seen:
+                # Sesión nueva: no se crean entradas vacías en memoria
+                return None
+            self._touch(thread_id, now)
+            return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        now = time.time()
+        with self._lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            versions = dict(checkpoint["channel_versions"])
+            previous = self._latest.get((thread_id, ns))
+            if previous is not None and previous[0] != checkpoint["id"]:
+                self._drop_checkpoint(thread_id, ns, versions)
+            self._latest[(thread_id, ns)] = (checkpoint["id"], versions)
+            self._persist(config, checkpoint, metadata, now)
+            self._touch(thread_id, now)
+            return saved
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._forget(thread_id, persisted=True)
+            super().delete_thread(thread_id)
+
+    async def _offload(self, fn, *args):
+        if self._db is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def aget_tuple(self, config):
+        return await self._offload(self.get_tuple, config)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await self._offload(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await self._offload(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await self._offload(self.delete_thread, thread_id)
+
+
+session_checkpointer = SessionCheckpointer(
+    max_sessions=int(os.getenv("SESSION_MAX", "1000")),
+    ttl=float(os.getenv("SESSION_TTL", "3600")),
+    path=os.getenv("SESSION_DB") or None,
+)
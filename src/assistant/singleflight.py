@@ -0,0 +1,106 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+import asyncio
+import threading
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas entre hilos: mientras hay una ejecución en curso
+    para una clave, las demás llamadas con esa clave esperan su resultado (o
+    su excepción) en lugar de repetir el trabajo. No guarda nada al terminar.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Ejecuta `fn` una sola vez por clave en vuelo. Devuelve (resultado,
+        compartido), con compartido=True si se reutilizó otra ejecución.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Future) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """
+    Igual que `SingleFlight` para corrutinas de un mismo event loop. La
+    ejecución compartida corre como tarea propia: si uno de los que esperan
+    se cancela (cliente desconectado) los demás siguen recibiendo el
+    resultado; si se cancela el último, la ejecución también se cancela (no
+    sigue, p. ej., una llamada al LLM que nadie va a leer).
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Tuple[int, Hashable], _Flight] = {}
+
+    async def do(
+        self, key: Hashable, factory: Callable[[], Awaitable[T]]
+    ) -> Tuple[T, bool]:
+        slot = (id(asyncio.get_running_loop()), key)
+        flight = self._calls.get(slot)
+        shared = flight is not None
+        if flight is None:
+            flight = self._calls[slot] = _Flight(asyncio.ensure_future(factory()))
+            flight.task.add_done_callback(lambda t: self._finish(slot, t))
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # Nadie más espera: las llamadas nuevas empiezan otra ejecución
+                if self._calls.get(slot) is flight:
+                    del self._calls[slot]
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _finish(self, slot: Tuple[int, Hashable], task: asyncio.Future) -> None:
+        flight = self._calls.get(slot)
+        if flight is not None and flight.task is task:
+            del self._calls[slot]
+        if not task.cancelled():
+            # Evita el aviso de excepción no recuperada si nadie la esperó
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,219 @@
+from typing import Any, Optional, Sequence
+import math
+
+import numpy as np
+
+FLAT = "flat"
+HNSW = "hnsw"
+IVFPQ = "ivfpq"
+FP16 = "fp16"
+SQ8 = "sq8"
+AUTO = "auto"
+INDEX_TYPES = (FLAT, HNSW, IVFPQ, FP16, SQ8, AUTO)
+
+# Umbrales del modo `auto` (número de chunks)
+AUTO_FLAT_MAX = 20_000
+AUTO_HNSW_MAX = 200_000
+# IVF-PQ necesita suficientes vectores para entrenar los centroides
+IVFPQ_MIN = 10_000
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+
+def resolve_index_type(index_type: str, count: int) -> str:
+    """
+    Tipo de índice efectivo para `count` vectores:
+    - auto: exacto (flat) para colecciones pequeñas, HNSW para medianas e
+      IVF-PQ para grandes
+    - ivfpq con muy pocos vectores usa sq8 (no hay datos para entrenar PQ)
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice desconocido: {index_type}")
+    if index_type == AUTO:
+        if count <= AUTO_FLAT_MAX:
+            return FLAT
+        return HNSW if count <= AUTO_HNSW_MAX else IVFPQ
+    if index_type == IVFPQ and count < IVFPQ_MIN:
+        return SQ8
+    return index_type
+
+
+def _pq_subquantizers(dim: int) -> int:
+    # ~4 dimensiones por subcuantizador (8 bits): 384 dims -> 96 bytes por vector
+    for m in range(max(1, dim // 4), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def new_index(index_type: str, dim: int, count: int):
+    """
+    Índice FAISS vacío (sin entrenar) del tipo pedido, con métrica L2 como
+    el FAISS de langchain.
+    """
+    import faiss
+
+    index_type = resolve_index_type(index_type, count)
+    if index_type == HNSW:
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+    if index_type == IVFPQ:
+        nlist = max(16, min(int(4 * math.sqrt(count)), count // 39))
+        index = faiss.IndexIVFPQ(
+            faiss.IndexFlatL2(dim), dim, nlist, _pq_subquantizers(dim), 8
+        )
+        index.nprobe = max(1, nlist // 16)
+        return index
+    if index_type == FP16:
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16)
+    if index_type == SQ8:
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+    return faiss.IndexFlatL2(dim)
+
+
+def build_vector_index(
+    vectors: np.ndarray, index_type: str = FLAT, ids: Optional[np.ndarray] = None
+):
+    """
+    Entrena (si hace falta) y llena un índice con `vectors`. Con `ids` el
+    índice se envuelve en un IndexIDMap2 con esos identificadores.
+    """
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    index = new_index(index_type, dim, count)
+    if not index.is_trained:
+        index.train(vectors)
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    else:
+        index.add(vectors)
+    ivf = _ivf(index)
+    if ivf is not None:
+        # Permite reconstruir vectores (p. ej. para el índice de corpus)
+        ivf.make_direct_map()
+    return index
+
+
+def drop_rows(index, rows: Sequence[int]) -> Any:
+    """
+    Quita las filas `rows` de un índice y renumera las demás desde 0 sin
+    cambiar su orden (la fila i debe seguir siendo el chunk i). Flat y los
+    cuantizados escalares lo hacen con `remove_ids`. En IVF los ids no se
+    compactan: se quitan de las listas invertidas y se renumeran ahí, sin
+    tocar los códigos PQ. HNSW no implementa `remove_ids`: se recuperan los
+    vectores que quedan (exactos en HNSWFlat) y se vuelve a armar el grafo.
+    Modifica y devuelve `index`.
+    """
+    import faiss
+
+    if not len(rows):
+        return index
+    kind = index_type_of(index)
+    removed = np.unique(np.asarray(rows, dtype=np.int64))
+    if kind in (FLAT, FP16, SQ8):
+        index.remove_ids(removed)
+        return index
+    if kind == IVFPQ:
+        ivf = _ivf(index)
+        # El mapa directo en forma de arreglo no admite borrar
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+        ivf.remove_ids(faiss.IDSelectorBatch(removed))
+        invlists = ivf.invlists
+        for list_no in range(ivf.nlist):
+            size = invlists.list_size(list_no)
+            if not size:
+                continue
+            ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+            new_ids = np.ascontiguousarray(ids - np.searchsorted(removed, ids))
+            codes = faiss.rev_swig_ptr(
+                invlists.get_codes(list_no), size * invlists.code_size
+            ).copy()
+            invlists.update_entries(
+                list_no, 0, size, faiss.swig_ptr(new_ids), faiss.swig_ptr(codes)
+            )
+        ivf.make_direct_map()
+        return index
+    dropped = set(removed.tolist())
+    kept = np.asarray(
+        [i for i in range(index.ntotal) if i not in dropped], dtype=np.int64
+    )
+    vectors = index.reconstruct_batch(kept) if len(kept) else None
+    index.reset()
+    if vectors is not None:
+        index.add(vectors)
+    return index
+
+
+def _ivf(index) -> Any:
+    import faiss
+
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def index_type_of(index) -> str:
+    """
+    Tipo (según INDEX_TYPES) de un índice FAISS ya construido.
+    """
+    import faiss
+
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap2):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexHNSW):
+        return HNSW
+    if isinstance(index, faiss.IndexIVFPQ):
+        return IVFPQ
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        qtype = index.sq.qtype
+        return FP16 if qtype == faiss.ScalarQuantizer.QT_fp16 else SQ8
+    return FLAT
+
+
+def search_params(index, selector=None):
+    """
+    Parámetros de búsqueda adecuados al tipo de índice, con un filtro de ids
+    opcional (IVF y HNSW exigen su propia clase de parámetros).
+    """
+    import faiss
+
+    if selector is None:
+        return None
+    kind = index_type_of(index)
+    if kind == IVFPQ:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=_ivf(index).nprobe)
+    if kind == HNSW:
+        inner = faiss.downcast_index(getattr(index, "index", index))
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def index_nbytes(index) -> int:
+    """
+    Memoria aproximada de un índice: códigos de los vectores, enlaces de HNSW
+    y mapa directo de IVF.
+    """
+    import faiss
+
+    count = int(index.ntotal)
+    try:
+        size = count * int(index.sa_code_size())
+    except RuntimeError:
+        size = count * int(index.d) * 4
+    kind = index_type_of(index)
+    if kind == HNSW:
+        size += count * 2 * HNSW_M * 4
+    elif kind == IVFPQ:
+        size += count * 8 * 2  # ids en las listas + mapa directo
+    if isinstance(faiss.downcast_index(index), faiss.IndexIDMap2):
+        size += count * 8 * 2
+    return size
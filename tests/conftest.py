@@ -0,0 +1,92 @@
+import random
+
+import pytest
+from src.assistant.embedding_cache import embedding_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_embedding_cache(tmp_path, monkeypatch):
+    # Los tests usan embeddings falsos: no deben escribir en la caché real
+    monkeypatch.setattr(embedding_cache, "root", tmp_path / "embeddings")
+    embedding_cache.clear()
+    yield
+    embedding_cache.clear()
+
+
+# Vocabulario de los PDFs sintéticos
+WORDS = (
+    "procedimiento solicitud cliente crédito vehículo aprobación documento firma "
+    "plazo cuota tasa interés garantía seguro póliza pago mora asesor sucursal "
+    "validación identidad contrato desembolso cartera reporte área responsable "
+    "revisión formato registro sistema control auditoría riesgo cumplimiento"
+).split()
+
+
+def write_synthetic_pdf(path: str, pages: int, lines_per_page: int = 40) -> None:
+    """
+    Escribe un PDF de texto simple (Helvetica) con `pages` páginas, sin
+    dependencias externas, para probar la extracción de texto.
+    """
+    rnd = random.Random(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages, se completa al final
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for n in range(pages):
+        lines = [f"Pagina {n + 1}"] + [
+            " ".join(rnd.choices(WORDS, k=10)) for _ in range(lines_per_page)
+        ]
+        # Solo ASCII en el stream para no depender de codificaciones de fuente
+        ascii_lines = [
+            ln.encode("ascii", "ignore").decode().replace("(", "").replace(")", "")
+            for ln in lines
+        ]
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        ops += [f"({ln}) Tj T*" for ln in ascii_lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        " ".join(f"{k} 0 R" for k in kids).encode(),
+        pages,
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    with open(path, "wb") as f:
+        f.write(bytes(out))
+
+
+@pytest.fixture
+def synthetic_pdf(tmp_path):
+    """
+    Fábrica de PDFs sintéticos en `tmp_path`: `synthetic_pdf(páginas)`.
+    """
+
+    def make(pages: int, lines_per_page: int = 5):
+        path = tmp_path / "manual.pdf"
+        write_synthetic_pdf(str(path), pages, lines_per_page)
+        return path
+
+    return make
@@ -0,0 +1,57 @@
+from unittest.mock import patch
+from src.assistant.answer_cache import (
+    HIT_EXACT,
+    HIT_SEMANTIC,
+    MISS,
+    AnswerCache,
+    normalize_question,
+)
+
+VOCAB = ["plazo", "credito", "cuota", "tasa", "seguro"]
+
+
+def bow_embed(text):
+    words = normalize_question(text).split()
+    return [float(sum(w.startswith(v) for w in words)) for v in VOCAB]
+
+
+def test_normalize_question():
+    assert normalize_question("  ¿Cuál es el PLAZO del crédito? ") == (
+        "cual es el plazo del credito"
+    )
+
+
+def test_exact_hit_requires_same_context():
+    cache = AnswerCache()
+    cache.store("doc", ["ctx"], "¿Cuál es el plazo?", "30 días")
+
+    assert cache.lookup("doc", ["ctx"], "cual es el plazo").status == HIT_EXACT
+    assert cache.lookup("doc", ["otro ctx"], "cual es el plazo").status == MISS
+    assert cache.lookup("otro-doc", ["ctx"], "cual es el plazo").status == MISS
+
+
+def test_semantic_hit_within_threshold_same_document():
+    cache = AnswerCache(threshold=0.9)
+    vector = cache.lookup("doc", ["a"], "plazo del credito", embed=bow_embed).vector
+    cache.store("doc", ["a"], "plazo del credito", "30 días", vector=vector)
+
+    hit = cache.lookup("doc", ["b"], "el credito y su plazo", embed=bow_embed)
+    assert (hit.status, hit.answer) == (HIT_SEMANTIC, "30 días")
+    assert cache.lookup("doc", ["b"], "tasa del seguro", embed=bow_embed).status == MISS
+    assert cache.lookup("doc2", ["b"], "plazo credito", embed=bow_embed).status == MISS
+
+
+def test_ttl_eviction_and_invalidation():
+    cache = AnswerCache(max_entries=2, ttl=10)
+    with patch("src.assistant.answer_cache.time.time", return_value=0):
+        cache.store("doc", [], "uno", "1")
+        cache.store("doc", [], "dos", "2")
+        cache.store("doc", [], "tres", "3")
+        assert cache.lookup("doc", [], "uno").status == MISS
+        assert cache.lookup("doc", [], "tres").status == HIT_EXACT
+    with patch("src.assistant.answer_cache.time.time", return_value=11):
+        assert cache.lookup("doc", [], "tres").status == MISS
+
+    cache.store("doc", [], "cuatro", "4")
+    assert cache.invalidate("doc") == 1
+    assert cache.stats()["entries"] == 0
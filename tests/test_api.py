@@ -1,6 +1,9 @@
+import json
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from src.api.main import app
+from src.assistant.indexer import indexer
+from src.assistant.answer_cache import answer_cache
 
 client = TestClient(app)
 
@@ -11,7 +14,15 @@ def test_health():
     assert response.json() == {"status": "ok"}
 
 
-@patch("src.api.main.answer_question")
+def test_health_model():
+    response = client.get("/health/model")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["model"] == "sentence-transformers/all-MiniLM-L6-v2"
+    assert isinstance(data["loaded"], bool)
+
+
+@patch("src.api.main.answer_question_async", new_callable=AsyncMock)
 @patch("pathlib.Path.exists")
 def test_ask_endpoint(mock_exists, mock_answer_question):
     # Simular comprobaciones de existencia de archivos
@@ -32,7 +43,7 @@ def test_ask_endpoint(mock_exists, mock_answer_question):
     assert data["context"] == ["ctx1", "ctx2"]
 
 
-@patch("src.api.main.answer_question")
+@patch("src.api.main.answer_question_async", new_callable=AsyncMock)
 @patch("pathlib.Path.exists")
 def test_ask_endpoint_error(mock_exists, mock_answer_question):
     mock_exists.return_value = True
@@ -43,3 +54,180 @@ def test_ask_endpoint_error(mock_exists, mock_answer_question):
 
     assert response.status_code == 500
     assert "Fallo interno" in response.json()["detail"]
+
+
+def test_upload_indexes_in_background(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("USE_EMBEDDINGS", "false")
+    files = {"file": ("manual.txt", b"La luna es un satelite natural.", "text/plain")}
+    response = client.post("/upload", files=files)
+
+    assert response.status_code == 200
+    document_id = response.json()["document_id"]
+    indexer.wait(document_id, timeout=10)
+
+    status = client.get(f"/documents/{document_id}/status").json()
+    assert status["status"] == "ready"
+    assert status["chunks"] >= 1
+
+
+def test_document_status_not_found():
+    response = client.get("/documents/desconocido/status")
+    assert response.status_code == 404
+
+
+def test_ask_stream_sends_context_then_tokens(monkeypatch):
+    monkeypatch.setenv("DISABLE_LLM", "true")
+    payload = {"question": "Hola"}
+    with client.stream("POST", "/ask/stream", json=payload) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = "".join(response.iter_text())
+
+    events = [
+        line[len("event: ") :]
+        for line in body.splitlines()
+        if line.startswith("event: ")
+    ]
+    assert events == ["context", "token", "done"]
+    assert "Respuesta simulada" in body
+
+
+def test_ask_sets_cache_header(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("USE_EMBEDDINGS", "false")
+    monkeypatch.setenv("DISABLE_LLM", "true")
+    answer_cache.clear()
+    files = {"file": ("faq.txt", b"El plazo del credito es de 30 dias.", "text/plain")}
+    document_id = client.post("/upload", files=files).json()["document_id"]
+
+    payload = {"question": "¿Cuál es el plazo?", "document_id": document_id}
+    first = client.post("/ask", json=payload)
+    second = client.post("/ask", json={**payload, "question": "cual es el PLAZO"})
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT-EXACT"
+    assert second.json()["answer"] == first.json()["answer"]
+
+
+@patch("src.api.main.answer_question_async", new_callable=AsyncMock)
+def test_ask_corpus_mode_filters_and_returns_sources(mock_answer_question):
+    mock_answer_question.return_value = {
+        "answer": "ok",
+        "context_used": ["ctx"],
+        "sources": [{"filename": "a.pdf", "document_id": "h", "page": 3}],
+    }
+    payload = {"question": "¿Dónde?", "filenames": ["a.pdf"]}
+    response = client.post("/ask", json=payload)
+
+    assert response.status_code == 200
+    assert response.json()["sources"][0]["page"] == 3
+    cfg = mock_answer_question.call_args.args[1]
+    assert cfg.corpus_dir == "uploads"
+    assert cfg.filenames == ["a.pdf"]
+
+
+def test_ask_batch_streams_ndjson(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("USE_EMBEDDINGS", "false")
+    monkeypatch.setenv("DISABLE_LLM", "true")
+    answer_cache.clear()
+    text = b"El plazo del credito es de 30 dias. La tasa es fija."
+    files = {"file": ("faq.txt", text, "text/plain")}
+    document_id = client.post("/upload", files=files).json()["document_id"]
+
+    payload = {
+        "questions": ["¿Cuál es el plazo?", "¿La tasa?"],
+        "document_id": document_id,
+    }
+    response = client.post("/ask/batch", json=payload)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1]
+    assert all(
+        line["answer"] == "Respuesta simulada (LLM deshabilitado)." for line in lines
+    )
+    assert all(line["context"] for line in lines)
+
+
+def test_ask_reports_server_timing_and_metrics(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("USE_EMBEDDINGS", "false")
+    monkeypatch.setenv("DISABLE_LLM", "true")
+    monkeypatch.setenv("ANSWER_CACHE", "false")
+    files = {"file": ("manual.txt", b"El plazo de entrega es de 5 dias.", "text/plain")}
+    document_id = client.post("/upload", files=files).json()["document_id"]
+
+    payload = {"question": "¿Cuál es el plazo?", "document_id": document_id}
+    response = client.post("/ask", json=payload)
+
+    stages = [
+        part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")
+    ]
+    assert "search" in stages and "pack" in stages and stages[-1] == "total"
+    assert int(response.headers["X-Context-Tokens-Saved"]) >= 0
+    metrics_text = client.get("/metrics").text
+    assert 'rag_context_tokens_total{kind="packed"}' in metrics_text
+    assert 'rag_stage_seconds_count{stage="search"}' in metrics_text
+    assert "# TYPE rag_llm_requests_total counter" in metrics_text
+
+
+def test_upload_deduplicates_content_and_limits_size(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("USE_EMBEDDINGS", "false")
+    content = b"Los reembolsos se procesan en 10 dias habiles."
+    first = client.post("/upload", files={"file": ("a.txt", content, "text/plain")})
+    second = client.post("/upload", files={"file": ("b.txt", content, "text/plain")})
+
+    assert first.json()["document_id"] == second.json()["document_id"]
+    assert second.json()["duplicate"] is True
+
+    monkeypatch.setenv("UPLOAD_MAX_MB", "0.001")
+    big = client.post("/upload", files={"file": ("c.txt", b"x" * 2048, "text/plain")})
+    assert big.status_code == 413
+
+
+def test_ask_with_session_keeps_conversation(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("USE_EMBEDDINGS", "false")
+    monkeypatch.setenv("DISABLE_LLM", "true")
+    files = {
+        "file": ("sesion.txt", b"La tarjeta se bloquea por telefono.", "text/plain")
+    }
+    client.post("/upload", files=files)
+
+    payload = {"question": "¿Cómo bloqueo la tarjeta?", "filename": "sesion.txt"}
+    first = client.post("/ask", json={**payload, "session_id": "api-1"}).json()
+    second = client.post(
+        "/ask", json={**payload, "question": "¿y por teléfono?", "session_id": "api-1"}
+    )
+
+    assert first["session_id"] == "api-1" and first["context_reused"] is False
+    assert second.json()["context_reused"] is True
+    assert second.headers["X-Cache"] == "BYPASS"
+    assert client.delete("/sessions/api-1").json()["status"] == "deleted"
+
+
+def test_session_without_document_chats_with_history(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DISABLE_LLM", "false")
+    llm = AsyncMock(return_value="Hola, Ana.")
+    # Los turnos de sesión usan el cliente asíncrono
+    with patch("src.assistant.rag_pipeline.acall_llm_openai", llm):
+        client.post("/ask", json={"question": "Me llamo Ana", "session_id": "chat-1"})
+        second = client.post(
+            "/ask", json={"question": "¿Cómo me llamo?", "session_id": "chat-1"}
+        )
+
+    assert second.status_code == 200 and second.json()["answer"] == "Hola, Ana."
+    # Conversación general (sin aviso de cargar documento) con el turno anterior
+    assert "Me llamo Ana" in llm.call_args_list[1].args[0]
+    client.delete("/sessions/chat-1")
+
+    for path, body in [
+        ("/ask/stream", {"question": "hola", "session_id": "chat-1"}),
+        ("/ask/batch", {"questions": ["hola"], "session_id": "chat-1"}),
+    ]:
+        assert client.post(path, json=body).status_code == 400
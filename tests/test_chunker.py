@@ -0,0 +1,123 @@
+import random
+import time
+
+import pytest
+from unittest.mock import patch
+
+from src.assistant import context_packing
+from src.assistant.chunker import SEPARATORS, chunk_text, scan_hints, split_spans
+from src.assistant.index_registry import DocumentIndex
+from src.assistant.langchain_agent import build_splits, detect_chunk_params
+from src.assistant.loader import PageSpan
+from src.assistant.rag_pipeline import RAGConfig, build_index, reorder
+
+PIECES = ["a", "bb", "crédito", " ", "  ", "\n", "\n\n", ". ", "x" * 40, "\t"]
+
+
+def test_matches_recursive_character_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    rnd = random.Random(3)
+    for _ in range(500):
+        text = "".join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 120)))
+        size = rnd.randint(2, 60)
+        overlap = rnd.randint(0, size)
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=size, chunk_overlap=overlap, separators=list(SEPARATORS)
+        )
+
+        spans = split_spans(text, size, overlap)
+
+        assert [text[s:e] for s, e in spans] == splitter.split_text(text)
+
+
+def test_records_share_text_and_carry_pages():
+    pages_text = ["Primera página con el plazo.", "Segunda página con la póliza."]
+    text = "\n\n".join(pages_text)
+    pages = [
+        PageSpan(1, 0, len(pages_text[0])),
+        PageSpan(2, len(pages_text[0]), len(text)),
+    ]
+
+    records = chunk_text(text, chunk_size=30, chunk_overlap=0, pages=pages)
+
+    assert records.texts() == pages_text
+    assert records.pages.tolist() == [1, 2]
+    assert records.span(1) == (text.index("Segunda"), len(text))
+    assert records[1] == pages_text[1] and records[:1] == pages_text[:1]
+    assert records.text is text
+
+
+def test_token_mode_windows_overlap():
+    text = "token " + " ".join(f"w{i}" for i in range(20))
+    with patch.object(context_packing, "get_encoding", return_value=None):
+        chunks = build_splits(text, chunk_size=8, chunk_overlap=3)
+
+    assert chunks[0] == "token w0 w1 w2 w3 w4 w5 w6"
+    # Cada ventana avanza 5 tokens y repite los 3 últimos de la anterior
+    assert chunks[1] == "w4 w5 w6 w7 w8 w9 w10 w11"
+    assert chunks[-1].endswith("w19")
+
+
+class CharEncoding:
+    # Un token por carácter
+    def encode(self, text, disallowed_special=()):
+        return list(range(len(text)))
+
+    def decode_with_offsets(self, tokens):
+        return "", list(tokens)
+
+
+def test_token_mode_waits_for_the_tokenizer(monkeypatch):
+    import tiktoken
+
+    def slow_get_encoding(name):
+        time.sleep(0.2)
+        return CharEncoding()
+
+    monkeypatch.setenv("TOKENIZER_ENCODING", "lento")
+    monkeypatch.setenv("TOKENIZER_LOAD_TIMEOUT", "0.01")
+    context_packing.clear_encodings()
+    try:
+        with patch.object(tiktoken, "get_encoding", side_effect=slow_get_encoding):
+            chunks = build_splits("token " * 6, chunk_size=12, chunk_overlap=0)
+    finally:
+        context_packing.clear_encodings()
+
+    # Cortado con la codificación (12 caracteres), no con la aproximación
+    assert chunks == ["token token", "token token", "token token"]
+
+
+def test_detects_hints_and_validates_overlap():
+    text = "Usar CHUNK SIZE 500 y Solapamiento 60; se cuentan los Tokens."
+
+    assert scan_hints(text) == (500, 60, True)
+    assert scan_hints(text, sizes=False) == (None, None, True)
+    assert detect_chunk_params("sin pistas") == (800, 100)
+    with pytest.raises(ValueError):
+        split_spans("texto", 10, 20)
+
+
+def test_index_keeps_records_for_packing_and_pages():
+    pages_text = ["Primera página con el plazo.", "Segunda página con la póliza."]
+    text = "\n\n".join(pages_text)
+    pages = [
+        PageSpan(1, 0, len(pages_text[0])),
+        PageSpan(2, len(pages_text[0]) + 2, len(text)),
+    ]
+    cfg = RAGConfig(use_embeddings=False, chunk_size=30, chunk_overlap=0)
+
+    index = build_index(text, cfg, pages=pages)
+
+    assert index.records.texts() == index.chunks
+    assert index.chunk_records().pages.tolist() == [1, 2]
+    assert index.spans_of([pages_text[1], "otro"]) == [
+        (text.index("Segunda"), len(text)),
+        None,
+    ]
+    # Tras una actualización incremental los registros siguen las filas del índice
+    moved = index.records.take(reorder(index.chunks, index.chunks[::-1]))
+    assert moved.texts() == index.chunks[::-1] and moved.pages.tolist() == [2, 1]
+    # Un índice sin registros los calcula ubicando los chunks
+    bare = DocumentIndex(key=None, text=text, chunks=index.chunks, pages=pages)
+    assert bare.chunk_records().pages.tolist() == [1, 2]
@@ -0,0 +1,92 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+from src.assistant import context_packing
+from src.assistant.context_packing import count_tokens, pack_contexts
+from src.assistant.index_registry import DocumentIndex
+from src.assistant.langchain_agent import build_splits
+from src.assistant.rag_pipeline import RAGConfig, answer_question
+
+# Sin puntos: el splitter corta por espacios y los chunks se solapan
+TEXT = (
+    "El crédito se aprueba en cinco días hábiles tras revisar la solicitud, "
+    "la garantía exige una póliza de seguro vigente a nombre del banco, "
+    "el comité de riesgo audita cada operación mayor a diez mil dólares y "
+    "los reclamos se atienden por escrito en un plazo de quince días"
+)
+
+
+@pytest.fixture(autouse=True)
+def approx_tokens():
+    # Conteo determinista y sin red: la aproximación por palabras y signos
+    with patch.object(context_packing, "get_encoding", return_value=None):
+        yield
+
+
+def test_merges_overlapping_chunks_into_one_span():
+    chunks = build_splits(TEXT, chunk_size=120, chunk_overlap=40)
+    assert len(chunks) >= 3
+    # Relevancia: el segundo chunk primero
+    contexts = [chunks[1], chunks[0], chunks[2]]
+
+    packed = pack_contexts(contexts, TEXT)
+
+    assert len(packed.spans) == 1
+    assert packed.spans[0].text in TEXT
+    assert sorted(packed.spans[0].members) == [0, 1, 2]
+    assert packed.saved_tokens > 0
+    assert packed.packed_tokens == count_tokens(packed.spans[0].text)
+
+
+def test_drops_near_duplicates_and_keeps_relevance_order():
+    contexts = [
+        "Los reclamos se atienden por escrito en un plazo de quince días.",
+        "La garantía exige una póliza de seguro vigente a nombre del banco.",
+        "los reclamos se atienden, por escrito, en un plazo de quince días",
+    ]
+
+    packed = pack_contexts(contexts)
+
+    assert packed.texts == contexts[:2]
+
+
+def test_fills_budget_in_relevance_order():
+    contexts = [" ".join(f"palabra{i}_{j}" for j in range(40)) for i in range(4)]
+
+    packed = pack_contexts(contexts, budget=115)
+
+    assert packed.packed_tokens == 115
+    assert [s.rank for s in packed.spans] == [0, 1, 2]
+    # El tercero no cabe entero y se recorta al espacio libre
+    assert packed.spans[2].text != contexts[2]
+    assert packed.to_dict()["saved"] == packed.retrieved_tokens - 115
+
+
+def test_overlap_merge_only_within_same_group():
+    a = "El comité de riesgo audita cada operación mayor a diez mil dólares."
+    b = "cada operación mayor a diez mil dólares. Luego informa al directorio."
+
+    same = pack_contexts([a, b], groups=["x.pdf", "x.pdf"])
+    other = pack_contexts([a, b], groups=["x.pdf", "y.pdf"])
+
+    assert same.texts == [
+        "El comité de riesgo audita cada operación mayor a diez mil dólares."
+        " Luego informa al directorio."
+    ]
+    assert len(other.spans) == 2
+
+
+def test_answer_question_sends_packed_context():
+    chunks = build_splits(TEXT, chunk_size=120, chunk_overlap=40)
+    index = DocumentIndex(key=None, text=TEXT, chunks=chunks)
+    llm = MagicMock(return_value="Respuesta")
+    cfg = RAGConfig(use_embeddings=False, k=2)
+
+    with patch("src.assistant.rag_pipeline.load_index", return_value=index), patch(
+        "src.assistant.rag_pipeline.search_index", return_value=chunks[:2]
+    ):
+        result = answer_question("crédito garantía", cfg, llm=llm)
+
+    assert len(result["context_used"]) == 1
+    assert result["context_used"][0] in llm.call_args[0][0]
+    assert result["context_tokens"]["saved"] > 0
@@ -0,0 +1,86 @@
+from unittest.mock import patch
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.assistant import rag_pipeline
+from src.assistant.corpus import CorpusCache, chunk_pages
+from src.assistant.index_registry import IndexRegistry
+from src.assistant.loader import PageSpan
+from src.assistant.rag_pipeline import RAGConfig, answer_question, load_corpus
+
+DOCS = {
+    "router.txt": "El router se reinicia manteniendo pulsado el botón diez segundos.",
+    "facturas.txt": "Las facturas se envían por correo electrónico cada mes.",
+    "wifi.txt": "La contraseña del wifi se cambia desde el panel del router.",
+}
+
+
+def make_corpus(tmp_path):
+    for name, text in DOCS.items():
+        (tmp_path / name).write_text(text, encoding="utf-8")
+    (tmp_path / "notas.md").write_text("ignorado", encoding="utf-8")
+    return RAGConfig(corpus_dir=str(tmp_path), persist_index=False, k=2)
+
+
+def patched():
+    embedder = DeterministicFakeEmbedding(size=16)
+    return [
+        patch.object(rag_pipeline, "registry", IndexRegistry(1 << 30)),
+        patch.object(rag_pipeline, "corpus_cache", CorpusCache()),
+        patch("src.assistant.langchain_agent.get_embedder", return_value=embedder),
+        patch("src.assistant.rag_pipeline.get_embedder", return_value=embedder),
+    ]
+
+
+def test_chunk_pages():
+    text = "uno dos\n\ntres cuatro\n\ncinco"
+    pages = [PageSpan(1, 0, 7), PageSpan(2, 9, 20), PageSpan(3, 22, 27)]
+    assert chunk_pages(text, ["uno", "tres cuatro", "cinco", "???"], pages) == [
+        1,
+        2,
+        3,
+        3,
+    ]
+
+
+def test_corpus_search_with_sources_and_filter(tmp_path):
+    cfg = make_corpus(tmp_path)
+    patches = patched()
+    for p in patches:
+        p.start()
+    try:
+        corpus = load_corpus(cfg)
+        assert sorted(corpus.filenames) == sorted(DOCS)
+        assert corpus.index is not None and corpus.index.ntotal == len(corpus)
+
+        text, source = corpus.search("facturas correo", 1)[0]
+        assert text == DOCS["facturas.txt"]
+        assert (source.filename, source.page) == ("facturas.txt", 1)
+
+        hits = corpus.search("router", 3, filenames=["wifi.txt"])
+        assert [s.filename for _, s in hits] == ["wifi.txt"]
+        assert corpus.search("router", 3, filenames=["otro.pdf"]) == []
+
+        # Sin cambios en los archivos se reutiliza el mismo índice
+        assert load_corpus(cfg) is corpus
+        (tmp_path / "nuevo.txt").write_text("Horario de atención.", encoding="utf-8")
+        assert load_corpus(cfg) is not corpus
+    finally:
+        for p in patches:
+            p.stop()
+
+
+def test_answer_question_corpus_returns_sources(tmp_path):
+    cfg = make_corpus(tmp_path)
+    cfg.filenames = ["facturas.txt"]
+    patches = patched()
+    for p in patches:
+        p.start()
+    try:
+        result = answer_question(
+            "¿Cuándo llegan las facturas?", cfg, llm=lambda p: "ok"
+        )
+    finally:
+        for p in patches:
+            p.stop()
+    assert result["answer"] == "ok"
+    assert result["context_used"] == [DOCS["facturas.txt"]]
+    assert result["sources"][0]["filename"] == "facturas.txt"
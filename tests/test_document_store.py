@@ -0,0 +1,91 @@
+import hashlib
+import io
+import os
+import threading
+import pytest
+from unittest.mock import patch
+from src.assistant.document_store import DocumentStore, UploadTooLarge
+
+
+def test_same_content_is_stored_once(tmp_path):
+    store = DocumentStore(str(tmp_path))
+    first = store.save("manual.pdf", io.BytesIO(b"%PDF contenido"))
+    second = store.save("copia.pdf", io.BytesIO(b"%PDF contenido"))
+
+    assert first.digest == hashlib.sha256(b"%PDF contenido").hexdigest()
+    assert second.digest == first.digest and second.duplicate
+    assert not first.duplicate
+    assert list(store.blobs.iterdir()) == [first.path]
+    assert store.resolve("copia.pdf") == first.path
+    assert store.path_for_digest(first.digest) == first.path
+    assert [name for name, _ in store.documents()] == ["copia.pdf", "manual.pdf"]
+
+
+def test_max_size_is_enforced_while_copying(tmp_path):
+    store = DocumentStore(str(tmp_path))
+    with pytest.raises(UploadTooLarge):
+        store.save("grande.txt", io.BytesIO(b"x" * 5000), max_bytes=4096)
+
+    assert list(store.blobs.iterdir()) == []
+    assert store.resolve("grande.txt") is None
+
+
+def test_new_version_reports_previous_and_drops_old_blob(tmp_path):
+    store = DocumentStore(str(tmp_path))
+    old = store.save("faq.txt", io.BytesIO(b"version 1"))
+    new = store.save("faq.txt", io.BytesIO(b"version 2"))
+
+    assert new.previous == old.digest
+    assert not old.path.exists()
+    assert store.digest_of("faq.txt") == new.digest
+
+
+def test_legacy_upload_is_replaced_by_blob(tmp_path):
+    (tmp_path / "viejo.txt").write_bytes(b"antes")
+    store = DocumentStore(str(tmp_path))
+    assert store.resolve("viejo.txt") == tmp_path / "viejo.txt"
+
+    stored = store.save("viejo.txt", io.BytesIO(b"despues"))
+
+    assert stored.previous == hashlib.sha256(b"antes").hexdigest()
+    assert not (tmp_path / "viejo.txt").exists()
+    assert store.resolve("viejo.txt") == stored.path
+
+
+def test_old_blob_outlives_its_name_for_grace_period(tmp_path):
+    store = DocumentStore(str(tmp_path), gc_grace=60)
+    with patch("src.assistant.document_store.time.time", return_value=1000.0):
+        old = store.save("faq.txt", io.BytesIO(b"version 1"))
+        store.save("faq.txt", io.BytesIO(b"version 2"))
+    # Una petición en curso con el document_id anterior aún lo encuentra
+    assert store.path_for_digest(old.digest) == old.path
+
+    with patch("src.assistant.document_store.time.time", return_value=1100.0):
+        store.save("otro.txt", io.BytesIO(b"otro"))
+    assert not old.path.exists()
+    assert [name for name, _ in store.documents()] == ["faq.txt", "otro.txt"]
+
+
+def test_duplicate_blob_is_not_collected_by_a_concurrent_reupload(tmp_path):
+    store = DocumentStore(str(tmp_path))
+    store.save("a.txt", io.BytesIO(b"X"))
+    unlink = os.unlink
+    threads = []
+
+    def racing_unlink(path):
+        # "b.txt" ya vio que X existe: justo entonces "a.txt" pasa a Y
+        if not threads:
+            threads.append(
+                threading.Thread(target=store.save, args=("a.txt", io.BytesIO(b"Y")))
+            )
+            threads[0].start()
+            threads[0].join(0.5)
+        unlink(path)
+
+    with patch("src.assistant.document_store.os.unlink", side_effect=racing_unlink):
+        stored = store.save("b.txt", io.BytesIO(b"X"))
+        threads[0].join()
+
+    assert stored.duplicate and stored.path.exists()
+    assert store.resolve("b.txt").read_bytes() == b"X"
+    assert store.resolve("a.txt").read_bytes() == b"Y"
@@ -0,0 +1,72 @@
+from unittest.mock import patch
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.assistant import rag_pipeline
+from src.assistant.embedding_cache import EmbeddingCache
+from src.assistant.index_registry import IndexRegistry, file_sha256
+from src.assistant.index_store import IndexStore
+from src.assistant.rag_pipeline import RAGConfig, load_index
+
+PARAGRAPHS = [f"Párrafo {i}: procedimiento de ejemplo número {i}." for i in range(12)]
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_cache_reuses_vectors_across_instances(tmp_path):
+    embedder = CountingEmbeddings(size=8)
+    texts = ["uno", "dos", "uno", "tres"]
+    vectors, reused, embedded = EmbeddingCache(str(tmp_path)).embed(
+        "m", texts, embedder.embed_documents, batch_size=2
+    )
+    assert (reused, embedded, embedder.calls) == (0, 3, 3)
+    np.testing.assert_allclose(vectors[0], vectors[2])
+
+    # Otra instancia (otro proceso o reinicio) lee los vectores del disco
+    again, reused, embedded = EmbeddingCache(str(tmp_path)).embed(
+        "m", texts + ["cuatro"], embedder.embed_documents
+    )
+    assert (reused, embedded, embedder.calls) == (4, 1, 4)
+    np.testing.assert_allclose(again[:4], vectors)
+
+
+def test_changed_document_updates_index_incrementally(tmp_path):
+    doc = tmp_path / "manual.txt"
+    doc.write_text("\n\n".join(PARAGRAPHS), encoding="utf-8")
+    cfg = RAGConfig(text_path=str(doc), chunk_size=60, chunk_overlap=0)
+    embedder = CountingEmbeddings(size=16)
+
+    with patch.object(
+        rag_pipeline, "store", IndexStore(str(tmp_path / "idx"))
+    ), patch.object(rag_pipeline, "registry", IndexRegistry(1 << 20)), patch(
+        "src.assistant.rag_pipeline.get_embedder", return_value=embedder
+    ), patch(
+        "src.assistant.langchain_agent.get_embedder", return_value=embedder
+    ):
+        first = load_index(cfg)
+        assert (first.reused, first.embedded) == (0, len(first.chunks))
+
+        old_hash = file_sha256(str(doc))
+        changed = PARAGRAPHS[:5] + ["Párrafo nuevo sobre garantías."] + PARAGRAPHS[6:]
+        doc.write_text("\n\n".join(changed), encoding="utf-8")
+        calls = embedder.calls
+        # Registro vacío: la versión anterior se toma del disco (mmap, solo lectura)
+        with patch.object(rag_pipeline, "registry", IndexRegistry(1 << 20)):
+            second = load_index(cfg, previous_hash=old_hash)
+
+    assert second.embedded == 1 and embedder.calls == calls + 1
+    assert second.reused == len(second.chunks) - 1
+    vs = second.retriever.vectorstore
+    assert vs.index.ntotal == len(second.chunks)
+    assert "Párrafo nuevo sobre garantías." in second.chunks
+    assert PARAGRAPHS[5] not in second.chunks
+    # Cada fila del índice corresponde al chunk en la misma posición
+    for i, chunk in enumerate(second.chunks):
+        np.testing.assert_allclose(
+            vs.index.reconstruct(i), embedder.embed_query(chunk), rtol=1e-5
+        )
@@ -0,0 +1,29 @@
+import threading
+from unittest.mock import patch
+from src.assistant import embeddings
+
+
+def test_get_embedder_loads_model_once():
+    embeddings.clear_embedders()
+    with patch("langchain_community.embeddings.HuggingFaceEmbeddings") as hf:
+        threads = [
+            threading.Thread(target=embeddings.get_embedder, args=("modelo",))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert hf.call_count == 1
+        assert embeddings.is_loaded("modelo")
+        assert embeddings.get_embedder("modelo") is hf.return_value
+    embeddings.clear_embedders()
+
+
+def test_warm_up_encodes_dummy_text():
+    embeddings.clear_embedders()
+    with patch("langchain_community.embeddings.HuggingFaceEmbeddings") as hf:
+        embeddings.warm_up("modelo")
+        hf.return_value.embed_query.assert_called_once()
+    embeddings.clear_embedders()
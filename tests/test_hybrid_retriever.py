@@ -0,0 +1,69 @@
+from unittest.mock import patch
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.assistant.hybrid_retriever import (
+    HybridRetriever,
+    SparseBM25,
+    reciprocal_rank_fusion,
+)
+from src.assistant.langchain_agent import RetrievalConfig, build_retriever
+
+CHUNKS = [
+    "Para reiniciar el router mantenga pulsado el botón durante diez segundos.",
+    "La contraseña del wifi se cambia desde el panel de administración.",
+    "El router dispone de cuatro puertos ethernet y un puerto USB.",
+    "Las facturas se envían por correo electrónico cada mes.",
+]
+
+
+def test_bm25_ranks_rare_term_first():
+    bm25 = SparseBM25(CHUNKS)
+    assert bm25.top("¿Cómo cambio la contraseña?", 2)[0] == 1
+    assert bm25.top("facturas", 4) == [3]
+    assert bm25.top("término inexistente", 4) == []
+
+
+def test_bm25_batch_matches_single_queries():
+    bm25 = SparseBM25(CHUNKS)
+    queries = ["router puertos", "reiniciar router", "correo"]
+    batch = bm25.scores(queries)
+    for i, q in enumerate(queries):
+        np.testing.assert_allclose(batch[i], bm25.scores([q])[0])
+
+
+def test_reciprocal_rank_fusion():
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 1]], k=60) == [1, 3, 2]
+
+
+def test_build_retriever_hybrid():
+    embedder = DeterministicFakeEmbedding(size=16)
+    cfg = RetrievalConfig(use_embeddings=True, hybrid=True, k=2)
+    with patch("src.assistant.langchain_agent.get_embedder", return_value=embedder):
+        retriever = build_retriever(CHUNKS, cfg)
+    assert isinstance(retriever, HybridRetriever)
+    assert retriever.vectorstore is not None
+    # El texto exacto de un chunk es el vecino más cercano y también gana en BM25
+    assert retriever.search(CHUNKS[2], 1) == [CHUNKS[2]]
+    docs = retriever.invoke("facturas por correo")
+    assert len(docs) == 2 and docs[0].page_content == CHUNKS[3]
+
+
+def test_hybrid_without_embeddings_uses_bm25():
+    cfg = RetrievalConfig(use_embeddings=True, hybrid=True)
+    with patch(
+        "src.assistant.langchain_agent.get_embedder", side_effect=RuntimeError("x")
+    ):
+        retriever = build_retriever(CHUNKS, cfg)
+    assert retriever.vectorstore is None
+    assert retriever.search("contraseña wifi", 1) == [CHUNKS[1]]
+
+
+def test_search_batch_matches_single_queries():
+    embedder = DeterministicFakeEmbedding(size=16)
+    cfg = RetrievalConfig(use_embeddings=True, hybrid=True, k=2)
+    with patch("src.assistant.langchain_agent.get_embedder", return_value=embedder):
+        retriever = build_retriever(CHUNKS, cfg)
+    queries = ["contraseña wifi", CHUNKS[0], "facturas por correo"]
+    assert retriever.search_batch(queries, 3) == [
+        retriever.search_ids(q, 3) for q in queries
+    ]
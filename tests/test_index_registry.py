@@ -0,0 +1,62 @@
+from unittest.mock import patch
+from src.assistant.index_registry import DocumentIndex, IndexKey, IndexRegistry
+from src.assistant.rag_pipeline import RAGConfig, load_index
+from src.assistant import rag_pipeline
+
+
+def make_entry(name: str, nbytes: int) -> DocumentIndex:
+    key = IndexKey(
+        doc_hash=name, chunk_size=400, chunk_overlap=80, embeddings_model="m"
+    )
+    return DocumentIndex(key=key, text=name, chunks=[name], nbytes=nbytes)
+
+
+def test_registry_evicts_least_recently_used():
+    reg = IndexRegistry(max_bytes=100)
+    a, b, c = make_entry("a", 40), make_entry("b", 40), make_entry("c", 40)
+    reg.put(a)
+    reg.put(b)
+    # "a" pasa a ser el más reciente, así que se expulsa "b"
+    assert reg.get(a.key) is a
+    reg.put(c)
+
+    assert reg.get(b.key) is None
+    assert reg.get(a.key) is a
+    stats = reg.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == 80
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+
+def test_registry_skips_entries_over_budget():
+    reg = IndexRegistry(max_bytes=10)
+    reg.put(make_entry("big", 50))
+    assert reg.stats()["entries"] == 0
+
+
+def test_load_index_builds_once_per_document(tmp_path):
+    doc = tmp_path / "manual.txt"
+    doc.write_text("El sol es una estrella. La luna es un satélite.", encoding="utf-8")
+    cfg = RAGConfig(
+        text_path=str(doc), use_embeddings=False, chunk_size=50, chunk_overlap=10
+    )
+    reg = IndexRegistry(max_bytes=1024 * 1024)
+
+    with patch.object(rag_pipeline, "registry", reg), patch.object(
+        rag_pipeline, "chunk_text", wraps=rag_pipeline.chunk_text
+    ) as splits:
+        first = load_index(cfg)
+        second = load_index(cfg)
+        assert first is second
+        assert splits.call_count == 1
+
+        # Un cambio en el contenido genera una clave nueva
+        doc.write_text("Marte es rojo.", encoding="utf-8")
+        third = load_index(cfg)
+        assert third is not first
+        assert splits.call_count == 2
+
+    assert reg.stats()["hits"] == 1
+    assert reg.stats()["misses"] == 2
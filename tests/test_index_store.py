@@ -0,0 +1,93 @@
+import json
+from unittest.mock import patch
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.assistant import rag_pipeline
+from src.assistant.index_registry import IndexKey, IndexRegistry
+from src.assistant.chunker import chunk_text
+from src.assistant.index_store import IndexStore
+from src.assistant.loader import PageSpan
+from src.assistant.rag_pipeline import RAGConfig, load_index
+
+KEY = IndexKey(doc_hash="abc", chunk_size=400, chunk_overlap=80, embeddings_model="m")
+
+
+def build_vectorstore(chunks, embedder):
+    return FAISS.from_texts(chunks, embedder)
+
+
+def test_store_roundtrip(tmp_path):
+    embedder = DeterministicFakeEmbedding(size=16)
+    chunks = ["El sol es una estrella.", "La luna es un satélite.", "Marte es rojo."]
+    index_store = IndexStore(str(tmp_path))
+    index_store.save(KEY, " ".join(chunks), chunks, build_vectorstore(chunks, embedder))
+
+    text, loaded_chunks, vs, _ = index_store.load(KEY, embedder)
+    assert loaded_chunks == chunks
+    assert text == " ".join(chunks)
+    assert vs.similarity_search("La luna es un satélite.", k=1)[0].page_content == (
+        "La luna es un satélite."
+    )
+
+
+def test_store_keeps_chunk_offsets(tmp_path):
+    embedder = DeterministicFakeEmbedding(size=16)
+    text = "Primera parte del manual.\n\nSegunda parte del manual."
+    records = chunk_text(text, 30, 0, [PageSpan(1, 0, 25), PageSpan(2, 27, 52)])
+    chunks = records.texts()
+    index_store = IndexStore(str(tmp_path))
+    vs = build_vectorstore(chunks, embedder)
+    index_store.save(KEY, text, chunks, vs, records=records)
+
+    *_, loaded = index_store.load(KEY, embedder, with_records=True)
+    assert loaded.texts() == chunks
+    assert loaded.pages.tolist() == [1, 2]
+    # Sin offsets guardados (índices anteriores) no hay registros
+    index_store.save(KEY, text, chunks, vs)
+    assert index_store.load(KEY, embedder, with_records=True)[-1] is None
+
+
+def test_store_ignores_stale_format(tmp_path):
+    embedder = DeterministicFakeEmbedding(size=16)
+    index_store = IndexStore(str(tmp_path))
+    path = index_store.save(KEY, "a", ["a"], build_vectorstore(["a"], embedder))
+    meta = json.loads((path / "meta.json").read_text())
+    meta["format_version"] = 0
+    (path / "meta.json").write_text(json.dumps(meta))
+
+    assert not index_store.exists(KEY)
+    assert index_store.load(KEY, embedder) is None
+
+
+def test_load_index_reuses_persisted_index(tmp_path):
+    doc = tmp_path / "manual.txt"
+    doc.write_text("El sol es una estrella. La luna es un satélite.", encoding="utf-8")
+    cfg = RAGConfig(text_path=str(doc), chunk_size=30, chunk_overlap=5)
+    embedder = DeterministicFakeEmbedding(size=16)
+
+    with patch.object(rag_pipeline, "store", IndexStore(str(tmp_path / "idx"))), patch(
+        "src.assistant.rag_pipeline.get_embedder", return_value=embedder
+    ), patch("src.assistant.langchain_agent.get_embedder", return_value=embedder):
+        with patch.object(rag_pipeline, "registry", IndexRegistry(1 << 20)):
+            first = load_index(cfg)
+        # Registro vacío (otro worker o reinicio): se carga desde disco
+        with patch.object(rag_pipeline, "registry", IndexRegistry(1 << 20)), patch(
+            "src.assistant.rag_pipeline.load_document"
+        ) as load_text:
+            second = load_index(cfg)
+            load_text.assert_not_called()
+
+    assert second.chunks == first.chunks
+    assert second.retriever.vectorstore.index.ntotal == len(first.chunks)
+
+
+def test_tokenizer_is_part_of_the_key(tmp_path, monkeypatch):
+    index_store = IndexStore(str(tmp_path))
+    cfg = RAGConfig(chunk_size=400, chunk_overlap=80)
+    default = rag_pipeline.index_key(cfg, "abc")
+    monkeypatch.setenv("TOKENIZER_ENCODING", "cl100k_base")
+    other = rag_pipeline.index_key(cfg, "abc")
+
+    assert default.tokenizer == "o200k_base" and other.tokenizer == "cl100k_base"
+    assert default != other
+    assert index_store.path_for(default) != index_store.path_for(other)
@@ -0,0 +1,47 @@
+import threading
+from unittest.mock import patch
+
+from src.assistant.index_registry import DocumentIndex
+from src.assistant.indexer import READY, IndexingService
+from src.assistant.rag_pipeline import RAGConfig
+
+
+def index_all(service, document_ids):
+    for document_id in document_ids:
+        service.submit(document_id, f"{document_id}.txt", RAGConfig())
+        service.wait(document_id, timeout=10)
+
+
+def test_finished_jobs_are_pruned_by_count_and_ttl():
+    index = DocumentIndex(key=None, text="texto", chunks=["texto"])
+    service = IndexingService(max_workers=1, max_jobs=2, ttl=60)
+    with patch("src.assistant.indexer.load_index", return_value=index):
+        index_all(service, ["a", "b", "c"])
+
+        # Solo se conservan los `max_jobs` más recientes
+        assert service.get("a") is None
+        assert service.get("c").status == READY
+
+        with patch("src.assistant.indexer.time.monotonic", return_value=1e9):
+            assert service.get("b") is None and service.get("c") is None
+    service.shutdown()
+
+
+def test_running_jobs_are_never_pruned():
+    release = threading.Event()
+    index = DocumentIndex(key=None, text="texto", chunks=["texto"])
+
+    def slow_load(*args, **kwargs):
+        release.wait(10)
+        return index
+
+    service = IndexingService(max_workers=2, max_jobs=1, ttl=60)
+    with patch("src.assistant.indexer.load_index", side_effect=slow_load):
+        for document_id in ["a", "b"]:
+            service.submit(document_id, f"{document_id}.txt", RAGConfig())
+        assert service.get("a") is not None and service.get("b") is not None
+        release.set()
+        service.wait("a", timeout=10)
+        service.wait("b", timeout=10)
+    assert service.get("a") is None and service.get("b").status == READY
+    service.shutdown()
@@ -0,0 +1,58 @@
+from unittest.mock import patch
+from src.assistant import loader
+from src.assistant.loader import PageSpan, join_pages, load_document, read_pdf_pages
+
+
+def test_join_pages_keeps_page_spans():
+    text, spans = join_pages(["uno", "dos dos", "tres"])
+    assert text == "uno\n\ndos dos\n\ntres"
+    assert [text[s.start : s.end] for s in spans] == ["uno", "dos dos", "tres"]
+    assert [s.page for s in spans] == [1, 2, 3]
+
+
+def test_load_document_pdf_spans(synthetic_pdf):
+    pdf = synthetic_pdf(3)
+    text, spans = load_document(pdf_path=str(pdf))
+    assert len(spans) == 3
+    for span in spans:
+        assert f"Pagina {span.page}" in text[span.start : span.end]
+
+
+def test_pdfminer_only_for_empty_pages(synthetic_pdf):
+    pdf = synthetic_pdf(3)
+    from PyPDF2._page import PageObject
+
+    original = PageObject.extract_text
+    calls = {"n": 0}
+
+    def flaky(self, *args, **kwargs):
+        calls["n"] += 1
+        return "" if calls["n"] == 2 else original(self, *args, **kwargs)
+
+    with patch.object(PageObject, "extract_text", flaky), patch.object(
+        loader, "_pdfminer_page", return_value="ocr"
+    ) as pdfminer:
+        pages = read_pdf_pages(str(pdf), workers=1)
+    assert pdfminer.call_count == 1
+    assert pdfminer.call_args.args[1] == 1
+    assert pages[1] == "ocr"
+
+
+def test_parallel_extraction_matches_sequential(synthetic_pdf):
+    pdf = synthetic_pdf(40)
+    try:
+        first = read_pdf_pages(str(pdf), workers=2)
+        # El pool (spawn) se crea una vez y lo reutilizan los PDFs siguientes
+        pool = loader.get_pdf_pool()
+        assert pool._mp_context.get_start_method() == "spawn"
+        assert read_pdf_pages(str(pdf), workers=2) == first
+        assert loader.get_pdf_pool() is pool
+        assert first == read_pdf_pages(str(pdf), workers=1)
+    finally:
+        loader.shutdown_pdf_pool()
+
+
+def test_text_file_is_single_page(tmp_path):
+    txt = tmp_path / "manual.txt"
+    txt.write_text("hola mundo", encoding="utf-8")
+    assert load_document(text_path=str(txt))[1] == [PageSpan(page=1, start=0, end=10)]
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+from src.assistant import metrics
+from src.assistant.rag_pipeline import call_llm_openai
+
+
+def test_histogram_renders_prometheus_text():
+    registry = metrics.MetricsRegistry()
+    hist = registry.histogram("demo_seconds", "Demo", ("stage",), buckets=(0.1, 1))
+    hist.observe(0.05, stage="search")
+    hist.observe(0.5, stage="search")
+    text = registry.render()
+
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{stage="search",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="search",le="1"} 2' in text
+    assert 'demo_seconds_bucket{stage="search",le="+Inf"} 2' in text
+    assert 'demo_seconds_count{stage="search"} 2' in text
+
+
+def test_timings_follow_work_into_executor_threads():
+    def work():
+        with metrics.stage("search"):
+            pass
+        metrics.record("search", 0.002)
+
+    with metrics.collect_timings() as timings:
+        with ThreadPoolExecutor(1) as pool:
+            pool.submit(metrics.in_context(work)).result()
+        metrics.record("llm", 0.25)
+
+    assert [name for name, _ in timings] == ["search", "search", "llm"]
+    header = metrics.server_timing(
+        [("search", 0.001), ("llm", 0.25), ("search", 0.002)]
+    )
+    assert header == "search;dur=3.0, llm;dur=250.0"
+    # Fuera del bloque no se recolecta nada
+    metrics.record("llm", 0.1)
+    assert len(timings) == 3
+
+
+def test_call_llm_counts_fallback_and_tokens(monkeypatch):
+    monkeypatch.setenv("OPENAI_MODEL", "principal-m")
+    monkeypatch.setenv("OPENAI_FALLBACK_MODEL", "respaldo-m")
+    res = MagicMock()
+    res.choices[0].message.content = "hola"
+    res.usage = MagicMock(prompt_tokens=12, completion_tokens=3)
+    client = MagicMock()
+    client.chat.completions.create.side_effect = [RuntimeError("caído"), res]
+    before = metrics.STAGE_SECONDS.count(stage="llm")
+
+    with patch("src.assistant.rag_pipeline.get_client", return_value=client):
+        assert call_llm_openai("prompt") == "hola"
+
+    requests = metrics.LLM_REQUESTS
+    assert requests.value(model="principal-m", fallback="false", outcome="error") == 1
+    assert requests.value(model="respaldo-m", fallback="true", outcome="ok") == 1
+    assert metrics.LLM_TOKENS.value(model="respaldo-m", kind="prompt") == 12
+    assert metrics.LLM_TOKENS.value(model="respaldo-m", kind="completion") == 3
+    assert metrics.STAGE_SECONDS.count(stage="llm") == before + 1
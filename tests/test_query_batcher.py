@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from unittest.mock import patch
+
+from src.assistant import embeddings
+from src.assistant.query_batcher import QueryBatcher
+
+
+class SlowEmbeddings(DeterministicFakeEmbedding):
+    batches: list = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        time.sleep(0.05)
+        return super().embed_documents(texts)
+
+
+def test_concurrent_queries_share_one_encode():
+    model = SlowEmbeddings(size=8, batches=[])
+    batcher = QueryBatcher(model, max_batch=16, max_wait=0.2)
+    queries = [f"pregunta {i % 6}" for i in range(12)]
+    results = [None] * len(queries)
+
+    def ask(i):
+        results[i] = batcher.embed_query(queries[i])
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(queries))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # Un solo lote con las 6 preguntas distintas
+    assert len(model.batches) == 1 and sorted(model.batches[0]) == sorted(set(queries))
+    assert results == [model.embed_query(q) for q in queries]
+
+
+def test_lru_cache_serves_recent_queries():
+    model = SlowEmbeddings(size=8, batches=[])
+    batcher = QueryBatcher(model, max_wait=0, cache_size=2)
+
+    for q in ["a", "b", "a", "c", "b"]:
+        batcher.embed_query(q)
+
+    # "a" se reutiliza; al entrar "c" sale "b", que se vuelve a codificar
+    assert model.batches == [["a"], ["b"], ["c"], ["b"]]
+    assert batcher.stats()["cache_hits"] == 1
+    assert batcher.embed_documents(["x", "y"]) == model.embed_documents(["x", "y"])
+
+
+def test_errors_reach_every_caller_and_wrapper_is_shared():
+    model = SlowEmbeddings(size=8, batches=[])
+    batcher = QueryBatcher(model, max_wait=0)
+    with patch.object(SlowEmbeddings, "embed_documents", side_effect=RuntimeError):
+        with pytest.raises(RuntimeError):
+            batcher.embed_query("falla")
+    assert batcher.embed_query("falla") == model.embed_query("falla")
+
+    embeddings.clear_embedders()
+    wrapped = embeddings.query_embedder(model)
+    assert embeddings.query_embedder(model) is wrapped
+    assert embeddings.query_embedder(wrapped) is wrapped
+    raw = SlowEmbeddings(size=8)
+    with patch.dict("os.environ", {"EMBED_QUERY_BATCH": "0"}):
+        assert embeddings.query_embedder(raw) is raw
+    embeddings.clear_embedders()
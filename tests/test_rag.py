@@ -1,11 +1,17 @@
 import pytest
 from unittest.mock import MagicMock, patch
+import asyncio
 from src.assistant.rag_pipeline import (
     answer_question,
+    answer_question_async,
+    answer_questions_stream,
+    prepare_answers,
+    astream_llm_openai,
     RAGConfig,
     retrieve,
     score_signal,
 )
+from src.assistant.index_registry import DocumentIndex
 
 
 @pytest.fixture
@@ -39,10 +45,12 @@ def test_retrieve(mock_text, rag_config):
     assert any("luna" in c.lower() for c in chunks)
 
 
-@patch("src.assistant.rag_pipeline.load_procedures_text")
-@patch("src.assistant.rag_pipeline.retrieve")
+@patch("src.assistant.rag_pipeline.load_index")
+@patch("src.assistant.rag_pipeline.search_index")
 def test_answer_question_success(mock_retrieve, mock_load, rag_config):
-    mock_load.return_value = "Contenido del documento"
+    mock_load.return_value = DocumentIndex(
+        key=None, text="Contenido del documento", chunks=[]
+    )
     mock_retrieve.return_value = ["Contenido relevante 1", "Contenido relevante 2"]
 
     # Simular LLM
@@ -55,13 +63,100 @@ def test_answer_question_success(mock_retrieve, mock_load, rag_config):
     assert len(result["context_used"]) == 2
 
 
-@patch("src.assistant.rag_pipeline.load_procedures_text")
-@patch("src.assistant.rag_pipeline.retrieve")
+@patch("src.assistant.rag_pipeline.load_index")
+@patch("src.assistant.rag_pipeline.search_index")
 def test_answer_question_fallback(mock_retrieve, mock_load, rag_config):
-    mock_load.return_value = "Contenido"
+    mock_load.return_value = DocumentIndex(key=None, text="Contenido", chunks=[])
     # Retornar contexto vacío o irrelevante
     mock_retrieve.return_value = []
 
     result = answer_question("pregunta dificil", rag_config)
 
     assert "No encontré información relevante en el documento" in result["answer"]
+
+
+@patch("src.assistant.rag_pipeline.load_index")
+@patch("src.assistant.rag_pipeline.search_index")
+def test_answer_question_async(mock_retrieve, mock_load, rag_config):
+    mock_load.return_value = DocumentIndex(key=None, text="Contenido", chunks=[])
+    mock_retrieve.return_value = ["Contenido relevante"]
+
+    async def fake_llm(prompt):
+        return "Respuesta async"
+
+    result = asyncio.run(answer_question_async("relevante", rag_config, llm=fake_llm))
+
+    assert result["answer"] == "Respuesta async"
+    assert result["context_used"] == ["Contenido relevante"]
+
+
+def test_stream_uses_fallback_before_first_token(monkeypatch):
+    monkeypatch.setenv("OPENAI_MODEL", "principal")
+    monkeypatch.setenv("OPENAI_FALLBACK_MODEL", "respaldo")
+
+    def chunk(text):
+        return MagicMock(choices=[MagicMock(delta=MagicMock(content=text))])
+
+    async def tokens():
+        for t in ["Hola", " mundo"]:
+            yield chunk(t)
+
+    async def create(model, **kwargs):
+        if model == "principal":
+            raise RuntimeError("modelo caído")
+        return tokens()
+
+    client = MagicMock()
+    client.chat.completions.create = create
+
+    async def collect():
+        return [t async for t in astream_llm_openai("prompt")]
+
+    with patch("src.assistant.rag_pipeline.get_async_client", return_value=client):
+        assert asyncio.run(collect()) == ["Hola", " mundo"]
+
+
+def test_prepare_answers_embeds_questions_once(rag_config):
+    index = DocumentIndex(
+        key=None, text="Contenido", chunks=["a", "b", "c"], retriever=MagicMock()
+    )
+    vs = index.retriever.vectorstore
+    vs.embeddings.embed_documents.return_value = [[0.0, 1.0], [1.0, 0.0]]
+    vs.index.search.return_value = (None, [[2, 0], [1, -1]])
+    cfg = RAGConfig(use_embeddings=True, k=2)
+
+    with patch("src.assistant.rag_pipeline.load_index", return_value=index):
+        prepared = prepare_answers(["p1", "p2"], cfg)
+
+    vs.embeddings.embed_documents.assert_called_once_with(["p1", "p2"])
+    assert vs.index.search.call_count == 1
+    assert [p["context_used"] for p in prepared] == [["c", "a"], ["b"]]
+
+
+def test_answer_questions_stream_limits_concurrency():
+    questions = [f"pregunta {i}" for i in range(6)]
+    prepared = [{"prompt": q, "context_used": [], "cache": "BYPASS"} for q in questions]
+    running = 0
+    peak = 0
+
+    async def fake_llm(prompt):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # Las primeras preguntas tardan más: terminan después
+        await asyncio.sleep(0.01 * (6 - int(prompt.split()[-1])))
+        running -= 1
+        return prompt.upper()
+
+    async def collect():
+        stream = answer_questions_stream(
+            questions, llm=fake_llm, concurrency=2, prepared=prepared
+        )
+        return [r async for r in stream]
+
+    results = asyncio.run(collect())
+
+    assert peak == 2
+    assert sorted(r["index"] for r in results) == list(range(6))
+    assert results[0]["index"] != 0
+    assert all(r["answer"] == r["question"].upper() for r in results)
@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import pytest
+from unittest.mock import patch
+
+from benchmarks.stub_openai import create_app, running_stub
+from src.assistant import metrics, resilience
+from src.assistant.rag_pipeline import acall_llm_openai, call_llm_openai
+from src.assistant.resilience import OPEN, CircuitBreaker
+
+MODELS = {
+    "lento": {"delay": 5.0},
+    "medio": {"delay": 0.6},
+    "rapido": {"delay": 0.02},
+    "roto": {"delay": 0.0, "fail": -1},
+}
+
+
+@pytest.fixture(scope="module")
+def stub():
+    app = create_app(delay=0.02, tokens=3, models=MODELS)
+    with running_stub(app) as base_url:
+        yield app, base_url
+
+
+@pytest.fixture(autouse=True)
+def llm_env(stub, monkeypatch):
+    _, base_url = stub
+    monkeypatch.setenv("OPENAI_FALLBACK_MODEL", "rapido")
+    monkeypatch.setenv("LLM_ATTEMPT_TIMEOUT", "2")
+    monkeypatch.setenv("LLM_LATENCY_BUDGET", "3")
+    monkeypatch.setenv("LLM_RETRIES", "0")
+    resilience.reset()
+    yield base_url
+    resilience.reset()
+
+
+def ask_async(base_url, model):
+    from openai import AsyncOpenAI
+
+    async def run():
+        client = AsyncOpenAI(api_key="x", base_url=base_url, max_retries=0)
+        with patch("src.assistant.rag_pipeline.get_async_client", return_value=client):
+            start = time.perf_counter()
+            answer = await acall_llm_openai("prompt", model=model)
+            return answer, time.perf_counter() - start
+
+    return asyncio.run(run())
+
+
+def test_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(failures=2, reset_after=10)
+    with patch("src.assistant.resilience.time.monotonic", return_value=100.0):
+        breaker.failure()
+        assert breaker.allow()
+        breaker.failure()
+        assert breaker.state == OPEN and not breaker.allow()
+    with patch("src.assistant.resilience.time.monotonic", return_value=111.0):
+        # Una sola llamada de prueba; si falla se vuelve a abrir
+        assert breaker.allow() and not breaker.allow()
+        breaker.failure()
+        assert not breaker.allow()
+
+
+def test_attempt_deadline_falls_back_when_primary_hangs(llm_env, monkeypatch):
+    monkeypatch.setenv("OPENAI_MODEL", "lento")
+    monkeypatch.setenv("LLM_ATTEMPT_TIMEOUT", "0.3")
+
+    answer, elapsed = ask_async(llm_env, "lento")
+
+    assert answer.startswith("tok0")
+    assert elapsed < 1.5
+    requests = metrics.LLM_REQUESTS
+    assert requests.value(model="lento", fallback="false", outcome="timeout") >= 1
+
+
+def test_hedging_races_fallback_after_delay(llm_env, monkeypatch):
+    monkeypatch.setenv("OPENAI_MODEL", "medio")
+    monkeypatch.setenv("LLM_HEDGE", "true")
+    monkeypatch.setenv("LLM_HEDGE_MIN_DELAY", "0.05")
+    monkeypatch.setenv("LLM_HEDGE_INITIAL_DELAY", "0.1")
+    cancelled = metrics.LLM_REQUESTS.value(
+        model="medio", fallback="false", outcome="cancelled"
+    )
+
+    answer, elapsed = ask_async(llm_env, "medio")
+
+    assert answer.startswith("tok0")
+    assert elapsed < 0.5
+    assert (
+        metrics.LLM_REQUESTS.value(model="medio", fallback="false", outcome="cancelled")
+        == cancelled + 1
+    )
+    # El principal cancelado cuenta para su p95 con lo que llevaba esperando
+    tracker = resilience.latency_for("medio")
+    assert len(tracker) == 1 and tracker.percentile(0.95) >= 0.05
+
+
+def test_open_breaker_routes_straight_to_fallback(stub, llm_env, monkeypatch):
+    app, base_url = stub
+    monkeypatch.setenv("OPENAI_MODEL", "roto")
+    monkeypatch.setenv("LLM_BREAKER_FAILURES", "2")
+    from openai import OpenAI
+
+    client = OpenAI(api_key="x", base_url=base_url, max_retries=0)
+    before = app.state.calls_by_model.get("roto", 0)
+    with patch("src.assistant.rag_pipeline.get_client", return_value=client):
+        answers = [call_llm_openai("prompt", model="roto") for _ in range(4)]
+
+    assert all(a.startswith("tok0") for a in answers)
+    # Tras dos fallos el principal ya no se llama
+    assert app.state.calls_by_model["roto"] - before == 2
+
+
+def test_total_budget_bounds_retries(llm_env, monkeypatch):
+    monkeypatch.setenv("OPENAI_MODEL", "lento")
+    monkeypatch.setenv("OPENAI_FALLBACK_MODEL", "lento")
+    monkeypatch.setenv("LLM_RETRIES", "5")
+    monkeypatch.setenv("LLM_LATENCY_BUDGET", "0.5")
+
+    answer, elapsed = ask_async(llm_env, "lento")
+
+    assert answer.startswith("Error al llamar al modelo")
+    assert elapsed < 1.2
+
+
+def test_cancelled_probe_reopens_breaker(llm_env, monkeypatch):
+    monkeypatch.setenv("OPENAI_MODEL", "medio")
+    monkeypatch.setenv("LLM_HEDGE", "true")
+    monkeypatch.setenv("LLM_HEDGE_MIN_DELAY", "0.05")
+    monkeypatch.setenv("LLM_HEDGE_INITIAL_DELAY", "0.1")
+    monkeypatch.setenv("LLM_BREAKER_RESET", "0.2")
+    breaker = resilience.breaker_for("medio", resilience.LLMPolicy.from_env())
+    for _ in range(breaker.failures):
+        breaker.failure()
+    time.sleep(0.25)
+
+    # La prueba (half-open) pierde el hedging contra el respaldo y se cancela
+    answer, _ = ask_async(llm_env, "medio")
+
+    assert answer.startswith("tok0")
+    assert breaker.state == OPEN and not breaker.allow()
+    time.sleep(0.25)
+    assert breaker.allow()
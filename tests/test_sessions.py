@@ -0,0 +1,198 @@
+import asyncio
+import threading
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from langchain_core.messages import HumanMessage
+
+from src.assistant import context_packing
+from src.assistant.graph import build_graph
+from src.assistant.index_registry import DocumentIndex
+from src.assistant.rag_pipeline import RAGConfig
+from src.assistant.sessions import SessionCheckpointer
+
+CHUNKS = ["El crédito se aprueba en cinco días.", "La garantía exige una póliza."]
+
+
+@pytest.fixture(autouse=True)
+def document():
+    index = DocumentIndex(key=None, text=" ".join(CHUNKS), chunks=CHUNKS)
+    with patch("src.assistant.rag_pipeline.load_index", return_value=index), patch(
+        "src.assistant.rag_pipeline.search_index", return_value=CHUNKS
+    ), patch.object(context_packing, "get_encoding", return_value=None):
+        yield
+
+
+def ask(graph, session, question, llm=None, history_tokens=1000):
+    config = {
+        "configurable": {
+            "thread_id": session,
+            "rag_config": RAGConfig(use_embeddings=False),
+            "llm": llm or MagicMock(return_value="Respuesta"),
+            "history_tokens": history_tokens,
+        }
+    }
+    return graph.invoke(
+        {"messages": [HumanMessage(content=question)], "current_doc_path": "doc.txt"},
+        config,
+    )
+
+
+def messages(graph, session):
+    state = graph.get_state({"configurable": {"thread_id": session}})
+    return state.values.get("messages", [])
+
+
+def test_follow_up_uses_history_and_reuses_context():
+    graph = build_graph(SessionCheckpointer())
+    llm = MagicMock(return_value="En cinco días.")
+
+    first = ask(graph, "s1", "¿Cuándo se aprueba el crédito?", llm)
+    second = ask(graph, "s1", "¿Y la garantía?", llm)
+
+    assert first["result"]["context_reused"] is False
+    assert second["result"]["context_reused"] is True
+    assert second["result"]["context_used"] == first["result"]["context_used"]
+    prompt = llm.call_args[0][0]
+    assert "Conversación previa" in prompt
+    assert "Usuario: ¿Cuándo se aprueba el crédito?" in prompt
+    assert len(messages(graph, "s1")) == 4
+
+
+def test_keeps_only_latest_checkpoint_per_session():
+    saver = SessionCheckpointer()
+    graph = build_graph(saver)
+    for question in ["uno", "dos", "tres"]:
+        ask(graph, "s1", question)
+
+    assert len(saver.storage["s1"][""]) == 1
+    assert len(saver.writes) <= 1
+
+
+def test_evicts_least_recently_used_and_expired_sessions():
+    saver = SessionCheckpointer(max_sessions=2, ttl=60)
+    graph = build_graph(saver)
+    with patch("src.assistant.sessions.time.time", return_value=1000.0):
+        for session in ["a", "b", "c"]:
+            ask(graph, session, "hola")
+    assert saver.sessions == 2
+    assert messages(graph, "a") == []
+
+    with patch("src.assistant.sessions.time.time", return_value=1100.0):
+        assert messages(graph, "b") == []
+    assert saver.sessions == 0
+
+
+def test_sqlite_restores_session_after_restart(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    ask(build_graph(SessionCheckpointer(path=path)), "s1", "¿Cuándo se aprueba?")
+
+    restored = build_graph(SessionCheckpointer(path=path))
+
+    assert [m.content for m in messages(restored, "s1")] == [
+        "¿Cuándo se aprueba?",
+        "Respuesta",
+    ]
+
+
+def test_history_is_trimmed_into_summary():
+    graph = build_graph(SessionCheckpointer())
+    for i in range(6):
+        state = ask(graph, "s1", f"pregunta número {i} sobre el crédito", None, 30)
+
+    assert len(state["messages"]) < 12
+    assert state["messages"][-2].content == "pregunta número 5 sobre el crédito"
+    # Las preguntas recortadas pasan al resumen (acotado a las más recientes)
+    assert state["summary"].startswith("- pregunta número")
+    assert all("número 0" not in m.content for m in state["messages"])
+
+
+def test_async_turn_uses_async_llm_and_retrieval_executor():
+    from concurrent.futures import ThreadPoolExecutor
+    from unittest.mock import AsyncMock
+
+    from src.assistant import rag_pipeline
+
+    threads = []
+    prepare = rag_pipeline.prepare_session_answer
+
+    def spy(*args):
+        threads.append(threading.current_thread().name)
+        return prepare(*args)
+
+    executor = ThreadPoolExecutor(1, thread_name_prefix="retrieval")
+    config = {
+        "configurable": {
+            "thread_id": "s1",
+            "rag_config": RAGConfig(use_embeddings=False),
+            "executor": executor,
+        }
+    }
+    inputs = {"messages": [HumanMessage(content="hola")], "current_doc_path": "doc.txt"}
+    with patch.object(rag_pipeline, "prepare_session_answer", spy), patch.object(
+        rag_pipeline, "acall_llm_openai", AsyncMock(return_value="Async")
+    ) as acall, patch.object(rag_pipeline, "call_llm_openai") as call:
+        state = asyncio.run(build_graph(SessionCheckpointer()).ainvoke(inputs, config))
+    executor.shutdown()
+
+    assert state["messages"][-1].content == "Async"
+    acall.assert_awaited_once()
+    call.assert_not_called()
+    assert threads[0].startswith("retrieval")
+
+
+def test_concurrent_turns_of_a_session_are_serialized(monkeypatch):
+    from src.assistant import graph as graph_module
+
+    graph = build_graph(SessionCheckpointer())
+    monkeypatch.setattr(graph_module, "get_session_graph", lambda: graph)
+
+    async def llm(prompt):
+        await asyncio.sleep(0.05)
+        return "Respuesta"
+
+    def turn(question):
+        config = {
+            "configurable": {
+                "thread_id": "s1",
+                "rag_config": RAGConfig(use_embeddings=False),
+                "llm": llm,
+            }
+        }
+        inputs = {
+            "messages": [HumanMessage(content=question)],
+            "current_doc_path": "doc.txt",
+        }
+        return graph_module.ainvoke_session(inputs, config)
+
+    async def run():
+        await asyncio.gather(turn("uno"), turn("dos"))
+
+    asyncio.run(run())
+
+    # Sin serializar, el segundo turno pisaría el checkpoint del primero
+    assert [m.content for m in messages(graph, "s1")][::2] == ["uno", "dos"]
+
+
+def test_sqlite_writes_run_off_the_event_loop(tmp_path):
+    saver = SessionCheckpointer(path=str(tmp_path / "sessions.db"))
+    threads = []
+    persist = saver._persist
+
+    def spy(*args):
+        threads.append(threading.current_thread())
+        return persist(*args)
+
+    saver._persist = spy
+    config = {
+        "configurable": {
+            "thread_id": "s1",
+            "rag_config": RAGConfig(use_embeddings=False),
+            "llm": MagicMock(return_value="Respuesta"),
+        }
+    }
+    inputs = {"messages": [HumanMessage(content="hola")], "current_doc_path": "doc.txt"}
+    asyncio.run(build_graph(saver).ainvoke(inputs, config))
+
+    assert threads and threading.main_thread() not in threads
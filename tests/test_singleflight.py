@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from unittest.mock import patch
+
+from src.assistant import context_packing, rag_pipeline
+from src.assistant.index_registry import IndexRegistry
+from src.assistant.rag_pipeline import RAGConfig, answer_question_async
+from src.assistant.singleflight import AsyncSingleFlight, SingleFlight
+
+N = 8
+
+
+@pytest.fixture
+def cfg(tmp_path):
+    doc = tmp_path / "manual.txt"
+    doc.write_text(
+        "El crédito se aprueba en cinco días. La garantía exige una póliza.",
+        encoding="utf-8",
+    )
+    reg = IndexRegistry(max_bytes=1024 * 1024)
+    with patch.object(rag_pipeline, "registry", reg), patch.object(
+        context_packing, "get_encoding", return_value=None
+    ):
+        yield RAGConfig(
+            text_path=str(doc), use_embeddings=False, persist_index=False, k=1
+        )
+
+
+def slow_builds():
+    real = rag_pipeline.build_index
+
+    def build(*args, **kwargs):
+        time.sleep(0.2)
+        return real(*args, **kwargs)
+
+    return patch.object(rag_pipeline, "build_index", side_effect=build)
+
+
+def ask_all(questions, cfg, llm):
+    async def run():
+        with ThreadPoolExecutor(max_workers=len(questions)) as executor:
+            return await asyncio.gather(
+                *(
+                    answer_question_async(q, cfg, llm=llm, executor=executor)
+                    for q in questions
+                )
+            )
+
+    return asyncio.run(run())
+
+
+def test_parallel_requests_share_one_build_and_one_llm_call(cfg):
+    calls = []
+
+    async def llm(prompt):
+        calls.append(prompt)
+        await asyncio.sleep(0.2)
+        return "En cinco días."
+
+    # Misma pregunta salvo mayúsculas, tildes y signos
+    questions = ["¿Cuándo se aprueba el crédito?"] * (N - 1)
+    questions.append("cuando se aprueba el credito")
+    with slow_builds() as build:
+        results = ask_all(questions, cfg, llm)
+
+    assert build.call_count == 1
+    assert len(calls) == 1
+    assert all(r["answer"] == "En cinco días." for r in results)
+    assert rag_pipeline.registry.stats()["coalesced"] == N - 1
+
+
+def test_different_questions_do_not_share_llm_call(cfg):
+    calls = []
+
+    async def llm(prompt):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return prompt[-20:]
+
+    with slow_builds() as build:
+        results = ask_all(["¿Cuándo se aprueba?", "¿Qué exige la garantía?"], cfg, llm)
+
+    assert build.call_count == 1
+    assert len(calls) == 2
+    assert results[0]["answer"] != results[1]["answer"]
+
+
+def test_failed_build_is_shared_and_not_remembered():
+    flights = SingleFlight()
+    started = threading.Event()
+    attempts = []
+
+    def fail():
+        attempts.append(1)
+        started.set()
+        time.sleep(0.1)
+        raise OSError("disco")
+
+    def follower():
+        started.wait()
+        return flights.do("k", lambda: "no debería ejecutarse")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(flights.do, "k", fail)
+        other = executor.submit(follower)
+        for future in (leader, other):
+            with pytest.raises(OSError):
+                future.result()
+
+    assert len(attempts) == 1
+    assert flights.in_flight() == 0
+    # Terminada la ejecución, la siguiente llamada vuelve a intentarlo
+    assert flights.do("k", lambda: "ok") == ("ok", False)
+
+
+def test_async_flight_is_cancelled_with_its_last_waiter():
+    flights = AsyncSingleFlight()
+    started = []
+    cancelled = []
+
+    async def work():
+        started.append(1)
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return "ok"
+
+    async def run():
+        first = asyncio.ensure_future(flights.do("k", work))
+        second = asyncio.ensure_future(flights.do("k", work))
+        await asyncio.sleep(0.01)
+        # Aún queda otro interesado: la ejecución sigue
+        first.cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled and flights.in_flight() == 1
+        second.cancel()
+        await asyncio.sleep(0.01)
+        assert cancelled and flights.in_flight() == 0
+        with pytest.raises(asyncio.CancelledError):
+            await second
+
+    asyncio.run(run())
+    assert len(started) == 1
+
+
+def test_stream_disconnect_cancels_llm_calls(cfg):
+    pending = []
+    cancelled = []
+
+    async def llm(prompt):
+        if "¿cinco días?" not in prompt:
+            pending.append(prompt)
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(prompt)
+                raise
+        return "respuesta"
+
+    async def run():
+        stream = rag_pipeline.answer_questions_stream(
+            ["¿cinco días?", "¿póliza?", "¿garantía?"], cfg, llm=llm
+        )
+        first = await stream.__anext__()
+        await asyncio.sleep(0.05)
+        # El cliente se va antes de las otras respuestas
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        # Antes de que asyncio.run cancele lo que quede al cerrar el loop
+        return first, list(cancelled)
+
+    first, cancelled_before_exit = asyncio.run(run())
+    assert first["answer"] == "respuesta"
+    assert pending and sorted(cancelled_before_exit) == sorted(pending)
@@ -0,0 +1,45 @@
+import subprocess
+import sys
+import time
+from fastapi.testclient import TestClient
+from src.api import main
+from src.assistant.index_registry import registry
+
+HEAVY = (
+    "langchain_community",
+    "langchain_text_splitters",
+    "langgraph",
+    "faiss",
+    "scipy",
+)
+
+
+def test_api_import_does_not_load_heavy_modules():
+    code = "import sys, src.api.main; print(','.join(sorted(sys.modules)))"
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    loaded = set(out.stdout.strip().split(","))
+    assert not loaded & set(HEAVY)
+
+
+def test_ready_flips_after_warmup(tmp_path, monkeypatch):
+    doc = tmp_path / "procedimientos.txt"
+    doc.write_text("Para abrir una cuenta se requiere el documento.", "utf-8")
+    monkeypatch.setenv("USE_EMBEDDINGS", "false")
+    monkeypatch.setenv("TOKENIZER_WARMUP", "false")
+    monkeypatch.setenv("PROCEDURES_TEXT_PATH", str(doc))
+    monkeypatch.setitem(main.readiness, "ready", False)
+    monkeypatch.setitem(main.readiness, "warmup", {})
+    registry.clear()
+
+    with TestClient(main.app) as client:
+        deadline = time.time() + 10
+        response = client.get("/ready")
+        while response.status_code == 503 and time.time() < deadline:
+            time.sleep(0.05)
+            response = client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready", "warmup": {"index": "ok"}}
+    assert registry.stats()["entries"] == 1
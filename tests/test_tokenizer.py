@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+from unittest.mock import patch
+
+from src.assistant import context_packing, metrics
+from src.assistant.context_packing import count_tokens, truncate_tokens
+
+tiktoken = pytest.importorskip("tiktoken")
+
+
+@pytest.fixture(autouse=True)
+def fresh_encodings():
+    context_packing.clear_encodings()
+    yield
+    context_packing.clear_encodings()
+
+
+def real_encoding(name="o200k_base"):
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        pytest.skip(f"{name} no disponible (sin red ni TIKTOKEN_CACHE_DIR)")
+
+
+def test_counts_with_real_tiktoken_after_warm_up(monkeypatch):
+    encoding = real_encoding()
+    monkeypatch.setenv("TOKENIZER_ENCODING", "o200k_base")
+    text = "¿Cuántos días tarda la aprobación del crédito vehicular?"
+    before = metrics.TOKEN_COUNTS.value(method="tiktoken")
+
+    context_packing.warm_up()
+
+    assert count_tokens(text) == len(encoding.encode(text))
+    assert truncate_tokens(text, 3) == encoding.decode(encoding.encode(text)[:3])
+    assert metrics.TOKEN_COUNTS.value(method="tiktoken") == before + 2
+
+
+def test_slow_download_falls_back_to_approximation(monkeypatch):
+    release = threading.Event()
+    encoding = object()
+
+    def slow_get_encoding(name):
+        release.wait(10)
+        return encoding
+
+    monkeypatch.setenv("TOKENIZER_ENCODING", "lento")
+    monkeypatch.setenv("TOKENIZER_LOAD_TIMEOUT", "0.05")
+    before = metrics.TOKEN_COUNTS.value(method="approx")
+    with patch.object(tiktoken, "get_encoding", side_effect=slow_get_encoding):
+        start = time.perf_counter()
+        assert count_tokens("hola, mundo") == 3
+        with pytest.raises(RuntimeError, match="aproximación"):
+            context_packing.warm_up()
+        # Pasado el plazo ya no se espera a la descarga
+        assert count_tokens("otra pregunta") == 2
+        assert time.perf_counter() - start < 1
+        assert metrics.TOKEN_COUNTS.value(method="approx") == before + 2
+
+        release.set()
+        thread, _ = context_packing._loads["lento"]
+        thread.join(5)
+    assert context_packing.get_encoding() is encoding
+
+
+def test_failed_load_is_reported_once(monkeypatch):
+    monkeypatch.setenv("TOKENIZER_ENCODING", "rota")
+    with patch.object(
+        tiktoken, "get_encoding", side_effect=ValueError("sin red")
+    ) as get_encoding:
+        with pytest.raises(RuntimeError, match="sin red"):
+            context_packing.warm_up()
+        assert count_tokens("hola mundo") == 2
+    assert get_encoding.call_count == 1
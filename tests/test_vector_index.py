@@ -0,0 +1,107 @@
+from unittest.mock import patch
+import faiss
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from src.assistant.langchain_agent import (
+    RetrievalConfig,
+    build_retriever,
+    update_retriever,
+)
+from src.assistant.vector_index import (
+    build_vector_index,
+    drop_rows,
+    index_nbytes,
+    index_type_of,
+    resolve_index_type,
+    search_params,
+)
+
+
+def test_resolve_auto_by_chunk_count():
+    assert resolve_index_type("auto", 500) == "flat"
+    assert resolve_index_type("auto", 50_000) == "hnsw"
+    assert resolve_index_type("auto", 500_000) == "ivfpq"
+    # Sin datos suficientes para entrenar PQ se usa cuantización escalar
+    assert resolve_index_type("ivfpq", 100) == "sq8"
+    with pytest.raises(ValueError):
+        resolve_index_type("lsh", 10)
+
+
+@pytest.mark.parametrize("kind", ["flat", "hnsw", "ivfpq", "fp16", "sq8"])
+def test_index_types_find_the_query_vector(kind):
+    rng = np.random.default_rng(0)
+    vectors = rng.random((10_000, 16), dtype=np.float32)
+    index = build_vector_index(vectors, kind)
+    assert index_type_of(index) == kind
+    _, ids = index.search(vectors[:20], 1)
+    assert (ids[:, 0] == np.arange(20)).mean() >= 0.9
+    if kind in ("ivfpq", "fp16", "sq8"):
+        flat = build_vector_index(vectors, "flat")
+        assert index_nbytes(index) < index_nbytes(flat)
+
+    # Filtro por ids dentro de la búsqueda
+    params = search_params(index, faiss.IDSelectorBatch(np.arange(100, 200)))
+    _, ids = index.search(vectors[:5], 3, params=params)
+    assert all(100 <= i < 200 for i in ids.ravel() if i >= 0)
+
+
+def test_build_retriever_with_compact_storage():
+    embedder = DeterministicFakeEmbedding(size=16)
+    chunks = [f"chunk número {i}" for i in range(50)]
+    cfg = RetrievalConfig(use_embeddings=True, index_type="fp16")
+    with patch("src.assistant.langchain_agent.get_embedder", return_value=embedder):
+        retriever = build_retriever(chunks, cfg)
+    vs = retriever.vectorstore
+    assert index_type_of(vs.index) == "fp16"
+    assert vs.similarity_search(chunks[7], k=1)[0].page_content == chunks[7]
+
+
+@pytest.mark.parametrize("kind", ["flat", "hnsw", "ivfpq", "fp16", "sq8"])
+def test_drop_rows_renumbers_remaining_vectors(kind):
+    rng = np.random.default_rng(1)
+    vectors = rng.random((10_000, 16), dtype=np.float32)
+    index = build_vector_index(vectors, kind)
+    before = index.reconstruct_n(0, index.ntotal)
+    removed = [0, 3, 4, 9_999]
+    kept = [i for i in range(len(vectors)) if i not in removed]
+
+    index = drop_rows(index, removed)
+
+    assert index_type_of(index) == kind and index.ntotal == len(kept)
+    np.testing.assert_allclose(index.reconstruct_n(0, index.ntotal), before[kept])
+    index.add(vectors[:1])
+    _, ids = index.search(vectors[:1], 1)
+    assert ids[0, 0] in (0, len(kept))
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_update_retriever_with_hnsw_embeds_only_new_chunks():
+    embedder = CountingEmbeddings(size=16)
+    chunks = [f"chunk número {i}" for i in range(200)]
+    changed = chunks[:50] + ["chunk reescrito"] + chunks[60:]
+    cfg = RetrievalConfig(use_embeddings=True, index_type="hnsw")
+    with patch("src.assistant.langchain_agent.get_embedder", return_value=embedder):
+        previous = build_retriever(chunks, cfg).vectorstore
+        calls = embedder.calls
+        retriever, order = update_retriever(chunks, previous, changed, cfg)
+
+    # HNSW no admite remove_ids: se re-indexan los vectores sin volver a embeberlos
+    assert embedder.calls == calls + 1
+    vs = retriever.vectorstore
+    assert index_type_of(vs.index) == "hnsw"
+    assert sorted(order) == sorted(changed) and vs.index.ntotal == len(changed)
+    for i in (0, 49, 50, len(order) - 1):
+        np.testing.assert_allclose(
+            vs.index.reconstruct(i), embedder.embed_query(order[i]), rtol=1e-5
+        )
+    assert vs.similarity_search("chunk reescrito", k=1)[0].page_content == (
+        "chunk reescrito"
+    )